@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class FlushPolicy:
+    """
+    When BufferedWriter writes the rows waiting, read from config.json
+    """
+    max_rows: int = 1024 # rows waiting before they are written
+    max_seconds: float = 1.0 # a row waits at most this long before it is written
+    fsync: bool = False # also ask the OS to write the file to disk after each batch
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "FlushPolicy":
+        """
+        Param: config is the parsed config.json, missing keys keep their default
+        """
+        default = cls()
+        return cls(
+            max_rows=int(config.get("MetricsFlushRows", default.max_rows)),
+            max_seconds=float(config.get("MetricsFlushSeconds", default.max_seconds)),
+            fsync=bool(config.get("MetricsFsync", default.fsync)),
+        )
+
+
+@dataclass
+class WriterStats:
+    num_rows: int = 0
+    num_batches: int = 0
+    bytes_written: int = 0
+    write_seconds: float = 0 # total time spent writing and flushing batches
+    max_write_seconds: float = 0
+
+    def describe(self) -> str:
+        mean_write_milliseconds = 1000*self.write_seconds/self.num_batches if self.num_batches > 0 else 0
+        return (f"{self.num_rows} rows, {self.bytes_written} bytes in {self.num_batches} batches, "
+                f"write latency mean {mean_write_milliseconds:.2f}ms max {1000*self.max_write_seconds:.2f}ms")
+
+
+class BufferedWriter:
+    """
+    BufferedWriter keeps the rows of a metrics file in memory and a background
+    thread writes them in batches, once flush_policy.max_rows are waiting,
+    flush_policy.max_seconds after the oldest of them was added, and on close.
+    close writes every row added before it, so closing when zoom_meeting_check
+    clears loses nothing.
+    """
+    def __init__(self, file, writer, flush_policy: "FlushPolicy" = FlushPolicy(), name: str = "BufferedWriter") -> None:
+        """
+        Param: file is the file written to, flushed after each batch, closed by close
+        Param: writer has writerows (csv.writer, ColumnarWriter), and write_columns if columns are added
+        Param: name is the name of the background thread
+        """
+        self.__file = file
+        self.__writer = writer
+        self.__flush_policy = flush_policy
+        self.stats = WriterStats()
+        # lists of rows and chunks of columns, in the order they were added
+        self.__batch: List[Tuple[bool, Any]] = []
+        self.__num_rows_waiting = 0
+        self.__oldest_time: Optional[float] = None
+        self.__is_closed = False
+        self.__error: Optional[BaseException] = None
+        self.__condition = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run, name=name, daemon=True)
+        self.__thread.start()
+
+    def __enter__(self) -> "BufferedWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __add(self, is_columns: bool, item: Any, num_rows: int) -> None:
+        with self.__condition:
+            if self.__is_closed:
+                raise ValueError("write to a closed BufferedWriter")
+            if self.__error != None:
+                raise self.__error
+            if self.__oldest_time == None:
+                self.__oldest_time = time.monotonic()
+            self.__batch.append((is_columns, item))
+            self.__num_rows_waiting += num_rows
+            if self.__num_rows_waiting >= self.__flush_policy.max_rows or len(self.__batch) == 1:
+                # the thread waits for a first row, then for max_rows or max_seconds
+                self.__condition.notify()
+
+    def writerow(self, row: Sequence[Any]) -> None:
+        self.__add(False, [row], 1)
+
+    def writerows(self, rows: Sequence[Sequence[Any]]) -> None:
+        rows = list(rows)
+        if len(rows) > 0:
+            self.__add(False, rows, len(rows))
+
+    def write_columns(self, columns: Dict[str, Any]) -> None:
+        """
+        Param: columns is handed to writer.write_columns as is, it must not change afterwards
+        """
+        num_rows = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        self.__add(True, columns, num_rows)
+
+    def __take_batch(self) -> Tuple[List[Tuple[bool, Any]], int, bool]:
+        """
+        Waits until the flush policy says to write and returns the batch, its number of rows and whether the writer is closed
+        """
+        with self.__condition:
+            while not self.__is_closed:
+                if self.__oldest_time == None:
+                    self.__condition.wait()
+                    continue
+                if self.__num_rows_waiting >= self.__flush_policy.max_rows:
+                    break
+                wait_seconds = self.__oldest_time + self.__flush_policy.max_seconds - time.monotonic()
+                if wait_seconds <= 0:
+                    break
+                self.__condition.wait(wait_seconds)
+            batch, num_rows = self.__batch, self.__num_rows_waiting
+            self.__batch, self.__num_rows_waiting, self.__oldest_time = [], 0, None
+            return batch, num_rows, self.__is_closed
+
+    def __write_batch(self, batch: List[Tuple[bool, Any]], num_rows: int) -> None:
+        start_time = time.perf_counter()
+        rows: List[Any] = []
+        for is_columns, item in batch:
+            if not is_columns:
+                rows += item
+                continue
+            if len(rows) > 0:
+                self.__writer.writerows(rows)
+                rows = []
+            self.__writer.write_columns(item)
+        if len(rows) > 0:
+            self.__writer.writerows(rows)
+        self.__file.flush()
+        if self.__flush_policy.fsync:
+            os.fsync(self.__file.fileno())
+        write_seconds = time.perf_counter() - start_time
+
+        self.stats.num_rows += num_rows
+        self.stats.num_batches += 1
+        self.stats.bytes_written = self.__file.tell()
+        self.stats.write_seconds += write_seconds
+        self.stats.max_write_seconds = max(self.stats.max_write_seconds, write_seconds)
+
+    def __run(self) -> None:
+        is_closed = False
+        while not is_closed:
+            batch, num_rows, is_closed = self.__take_batch()
+            if len(batch) == 0:
+                continue
+            try:
+                self.__write_batch(batch, num_rows)
+            except BaseException as e:
+                # raised in the threads adding rows, the rows after it are not written
+                with self.__condition:
+                    self.__error = e
+                return
+
+    def close(self) -> None:
+        """
+        Writes the rows waiting, stops the thread and closes the file, raises
+        the exception of the thread if writing failed
+        """
+        with self.__condition:
+            if self.__is_closed:
+                return
+            self.__is_closed = True
+            self.__condition.notify()
+        self.__thread.join()
+        self.__file.close()
+        if self.__error != None:
+            raise self.__error
@@ -0,0 +1,244 @@
+import argparse
+import csv
+import json
+import struct
+
+from datetime import datetime
+
+import numpy as np
+
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.common.buffered_writer import BufferedWriter, FlushPolicy
+from app.common.constants import OutputFormat, TIME_FORMAT
+
+"""
+Binary columnar format of the metric files, the alternative to CSV. The file
+describes itself: it starts with COLUMNAR_MAGIC and a JSON header with the name
+and numpy dtype of every column and the metadata of the file. Chunks of rows
+follow, each one the number of rows (little endian uint32) and then every
+column's values one after the other, little endian. Chunks are only appended,
+so a file cut short by a crash is still readable up to its last whole chunk.
+"""
+
+COLUMNAR_MAGIC = b"SEZMACOL"
+COLUMNAR_VERSION = 1
+CHUNK_HEADER = struct.Struct("<I")
+
+
+def to_file_dtype(dtype) -> np.dtype:
+    return np.dtype(dtype).newbyteorder("<")
+
+
+def is_columnar_file(filename: str) -> bool:
+    with open(filename, "rb") as file:
+        return file.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+
+
+class ColumnarWriter:
+    """
+    ColumnarWriter writes a columnar file. Rows written with writerow are kept
+    until chunk_size of them are waiting, columns written with write_columns
+    are written as a chunk at once.
+    """
+    def __init__(self, filename: str, columns: Sequence[Tuple[str, Any]], metadata: Optional[Dict[str, Any]] = None, chunk_size: int = 1024) -> None:
+        """
+        Param: filename is the name of the file, overwritten
+        Param: columns is the name and numpy dtype of every column, in order
+        Param: metadata is written in the header, JSON serializable
+        Param: chunk_size is the number of rows kept before they are written
+        """
+        self.column_names: List[str] = [name for name, _ in columns]
+        self.__dtypes: List[np.dtype] = [to_file_dtype(dtype) for _, dtype in columns]
+        self.__chunk_size = chunk_size
+        self.__rows: List[Sequence[Any]] = []
+        self.num_rows = 0
+        self.bytes_written = 0
+
+        header = json.dumps({
+            "version": COLUMNAR_VERSION,
+            "columns": [{"name": name, "dtype": dtype.str} for name, dtype in zip(self.column_names, self.__dtypes)],
+            "metadata": metadata or {},
+        }).encode()
+        self.__file = open(filename, "wb")
+        self.__write(COLUMNAR_MAGIC + CHUNK_HEADER.pack(len(header)) + header)
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __write(self, data: bytes) -> None:
+        self.__file.write(data)
+        self.bytes_written += len(data)
+
+    def writerow(self, row: Sequence[Any]) -> None:
+        """
+        Param: row has a value per column, None is NaN in float columns
+        """
+        self.__rows.append(row)
+        if len(self.__rows) >= self.__chunk_size:
+            self.__write_rows()
+
+    def writerows(self, rows: Sequence[Sequence[Any]]) -> None:
+        for row in rows:
+            self.writerow(row)
+
+    def write_columns(self, columns: Dict[str, np.ndarray]) -> None:
+        """
+        Param: columns has an NDArray of the same length per column name
+        """
+        self.__write_rows()
+        self.__write_chunk([columns[name] for name in self.column_names])
+
+    def __write_rows(self) -> None:
+        if len(self.__rows) == 0:
+            return
+        rows, self.__rows = self.__rows, []
+        self.__write_chunk([np.array(values, dtype=dtype) for values, dtype in zip(zip(*rows), self.__dtypes)])
+
+    def __write_chunk(self, values: List[np.ndarray]) -> None:
+        num_rows = len(values[0])
+        if num_rows == 0:
+            return
+        chunk = [CHUNK_HEADER.pack(num_rows)]
+        for column, dtype in zip(values, self.__dtypes):
+            if len(column) != num_rows:
+                raise ValueError(f"columns of {num_rows} and {len(column)} rows in the same chunk")
+            chunk.append(np.ascontiguousarray(column, dtype=dtype).tobytes())
+        self.__write(b"".join(chunk))
+        self.num_rows += num_rows
+
+    def tell(self) -> int:
+        return self.bytes_written
+
+    def fileno(self) -> int:
+        return self.__file.fileno()
+
+    def flush(self) -> None:
+        """
+        Writes the rows waiting and flushes the file
+        """
+        self.__write_rows()
+        self.__file.flush()
+
+    def close(self) -> None:
+        if self.__file.closed:
+            return
+        self.flush()
+        self.__file.close()
+
+
+def open_metrics_file(filename: str, output_format: "OutputFormat", columns: Sequence[Tuple[str, Any]], metadata: Optional[Dict[str, Any]] = None, flush_policy: "FlushPolicy" = FlushPolicy()) -> "BufferedWriter":
+    """
+    Param: columns is the name and numpy dtype of every column, the dtype is only used by OutputFormat.BINARY
+    Param: metadata is written in the header of OutputFormat.BINARY, CSV keeps the column names on its first line
+    Param: flush_policy is when the rows are written
+
+    Returns the writer of the rows of the file, with times as given by format_time
+    """
+    if output_format == OutputFormat.BINARY:
+        columnar_writer = ColumnarWriter(filename, columns, metadata)
+        return BufferedWriter(columnar_writer, columnar_writer, flush_policy, filename)
+    csv_file = open(filename, mode="w")
+    csv_writer = csv.writer(csv_file)
+    csv_writer.writerow([name for name, _ in columns])
+    return BufferedWriter(csv_file, csv_writer, flush_policy, filename)
+
+
+def format_time(time: datetime, output_format: "OutputFormat") -> Any:
+    """
+    Returns the value of time in a row of a metrics file (see open_metrics_file)
+    """
+    return time if output_format == OutputFormat.BINARY else time.strftime(TIME_FORMAT)
+
+
+class ColumnarFile(NamedTuple):
+    columns: Dict[str, np.ndarray] # in the order of the file
+    metadata: Dict[str, Any]
+
+
+def read_header(data: bytes) -> Tuple[List[Tuple[str, np.dtype]], Dict[str, Any], int]:
+    """
+    Returns the name and dtype of every column, the metadata and where the first chunk starts
+    """
+    if data[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+        raise ValueError("not a columnar file")
+    offset = len(COLUMNAR_MAGIC)
+    header_length, = CHUNK_HEADER.unpack_from(data, offset)
+    offset += CHUNK_HEADER.size
+    header = json.loads(bytes(data[offset:offset + header_length]))
+    if header["version"] > COLUMNAR_VERSION:
+        raise ValueError(f"columnar file version {header['version']} is newer than {COLUMNAR_VERSION}")
+    columns = [(column["name"], np.dtype(column["dtype"])) for column in header["columns"]]
+    return columns, header["metadata"], offset + header_length
+
+
+def read_chunks(data: bytes, columns: List[Tuple[str, np.dtype]], offset: int) -> Iterator[Dict[str, np.ndarray]]:
+    row_size = sum(dtype.itemsize for _, dtype in columns)
+    while offset + CHUNK_HEADER.size <= len(data):
+        num_rows, = CHUNK_HEADER.unpack_from(data, offset)
+        offset += CHUNK_HEADER.size
+        if offset + num_rows*row_size > len(data):
+            break
+        chunk = {}
+        for name, dtype in columns:
+            chunk[name] = np.frombuffer(data, dtype=dtype, count=num_rows, offset=offset)
+            offset += num_rows*dtype.itemsize
+        yield chunk
+
+
+def iter_chunks(filename: str) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Yields the chunks of the file, an NDArray per column name. A chunk cut
+    short at the end of the file is left out.
+    """
+    with open(filename, "rb") as file:
+        data = file.read()
+    columns, _, offset = read_header(data)
+    yield from read_chunks(data, columns, offset)
+
+
+def read_columnar(filename: str) -> "ColumnarFile":
+    """
+    Returns every column of the file in a single NDArray and the metadata of the file
+    """
+    with open(filename, "rb") as file:
+        data = file.read()
+    columns, metadata, offset = read_header(data)
+    chunks = list(read_chunks(data, columns, offset))
+    return ColumnarFile(
+        columns={name: np.concatenate([chunk[name] for chunk in chunks]) if len(chunks) > 0 else np.empty(0, dtype=dtype) for name, dtype in columns},
+        metadata=metadata,
+    )
+
+
+def format_column(values: np.ndarray) -> List[Any]:
+    """
+    Returns the values as written in CSV: times as TIME_FORMAT and NaN left empty
+    """
+    if values.dtype.kind == "M":
+        return [time.strftime(TIME_FORMAT) for time in values.astype("datetime64[us]").tolist()]
+    if values.dtype.kind == "f":
+        return [None if value != value else value for value in values.tolist()]
+    return values.tolist()
+
+
+def export_csv(filename: str, csv_filename: str) -> None:
+    """
+    Writes the columnar file as CSV, without the metadata
+    """
+    columnar_file = read_columnar(filename)
+    with open(csv_filename, "w") as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(list(columnar_file.columns))
+        csv_writer.writerows(zip(*[format_column(values) for values in columnar_file.columns.values()]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes a columnar metrics file as CSV")
+    parser.add_argument("filename")
+    parser.add_argument("csv_filename")
+    args = parser.parse_args()
+    export_csv(args.filename, args.csv_filename)
@@ -1,9 +1,30 @@
+from datetime import datetime
 from enum import Enum
 
 class SpecialQueueValues(Enum):
     FINISH = 1
-    NON_ZOOM_PACKET = 2
+
+class TimeFormat(Enum):
+    DATETIME = "DATETIME" # local time, as TIME_FORMAT
+    EPOCH = "EPOCH" # seconds since the epoch
+
+class OutputFormat(Enum):
+    CSV = "CSV"
+    BINARY = "BINARY" # typed columns, see app.common.columnar
+
+OUTPUT_EXTENSIONS = {
+    OutputFormat.CSV: ".csv",
+    OutputFormat.BINARY: ".bin",
+}
 
 TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 def get_timeformat(time_str: str) -> str:
-    return '%Y-%m-%d %H:%M:%S.%f' if "." in time_str else '%Y-%m-%d %H:%M:%S'
\ No newline at end of file
+    return '%Y-%m-%d %H:%M:%S.%f' if "." in time_str else '%Y-%m-%d %H:%M:%S'
+
+def parse_time(time_str: str) -> datetime:
+    """
+    Param: time_str is a time written as TimeFormat.DATETIME or TimeFormat.EPOCH
+    """
+    if "-" in time_str:
+        return datetime.strptime(time_str, get_timeformat(time_str))
+    return datetime.fromtimestamp(float(time_str))
\ No newline at end of file
@@ -2,33 +2,46 @@ import time
 
 from abc import ABC, abstractmethod
 from datetime import datetime
+from typing import Optional
+
+NANOSECONDS_PER_SECOND = 10**9
 
 
 class DataTime(ABC):
+    """
+    DataTime is a time as integer nanoseconds since the epoch. The local time
+    conversions are only done, once, when a human readable value is needed.
+    """
+    def __init__(self) -> None:
+        self.__second_precision: Optional[time.struct_time] = None
+        self.__datetime: Optional[datetime] = None
+
     @property
     @abstractmethod
-    def second_precision(self) -> time.struct_time:
+    def nanoseconds(self) -> int:
         pass
 
     @property
-    @abstractmethod
+    def second_precision(self) -> time.struct_time:
+        if self.__second_precision == None:
+            self.__second_precision = time.localtime(self.nanoseconds // NANOSECONDS_PER_SECOND)
+        return self.__second_precision
+
+    @property
     def microseconds(self) -> int:
-        pass
+        return (self.nanoseconds // 1000) % 10**6
 
     def subtract(self, other: "DataTime") -> float:
         """
         Returns the difference in seconds
         """
-        sec_second_precision: float = time.mktime(self.second_precision) - time.mktime(
-            other.second_precision
-        )
-        sec_microseconds: float = (self.microseconds - other.microseconds) / 10**6
-        return sec_second_precision + sec_microseconds
+        return (self.nanoseconds - other.nanoseconds) / NANOSECONDS_PER_SECOND
     
     def get_unix_time(self) -> float:
-        return time.mktime(self.second_precision) + self.microseconds / 10**6
+        return self.nanoseconds / NANOSECONDS_PER_SECOND
     
     def get_datetime(self) -> datetime:
-        tm = self.second_precision
-        microseconds = self.microseconds
-        return datetime(tm.tm_year, tm.tm_mon, tm.tm_mday, tm.tm_hour, tm.tm_min, tm.tm_sec, microseconds)
\ No newline at end of file
+        if self.__datetime == None:
+            # the float is within half a microsecond, fromtimestamp rounds it back to the exact microsecond
+            self.__datetime = datetime.fromtimestamp((self.nanoseconds // 1000) / 10**6)
+        return self.__datetime
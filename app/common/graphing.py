@@ -0,0 +1,213 @@
+import html
+import io
+import multiprocessing as mp
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+
+import numpy as np
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+"""
+Fast rendering of the graphs of long sessions. Every series is decimated to
+the pixel width of the figure before it is drawn, so the time to draw a
+figure does not grow with the length of the call, and the figures are drawn
+with the non-interactive Agg backend, in parallel processes.
+"""
+
+
+class GraphRenderMode(Enum):
+    DECIMATED = "DECIMATED" # every series decimated to the pixel width, figures of figure_width by figure_height pixels
+    FULL = "FULL" # every point drawn, on the original 200 by 80 inch figures
+
+
+class DecimationMethod(Enum):
+    MINMAX = "MINMAX" # the lowest and highest point of each pixel column, keeps every spike
+    LTTB = "LTTB" # largest triangle three buckets, keeps the shape with fewer points
+
+
+class ReportFormat(Enum):
+    HTML = "HTML" # report.html with the figures inline as SVG
+    SVG = "SVG" # an .svg next to each .png
+
+
+@dataclass
+class GraphConfig:
+    """
+    How the graphs are rendered
+    """
+    render_mode: "GraphRenderMode" = GraphRenderMode.DECIMATED
+    decimation: "DecimationMethod" = DecimationMethod.MINMAX
+    figure_width: int = 1600 # pixels
+    figure_height: int = 600 # pixels
+    dpi: int = 100
+    num_processes: int = min(6, os.cpu_count() or 1) # figures drawn at once, 1 draws them in this process
+    report_format: Optional["ReportFormat"] = None
+
+
+class Series(NamedTuple):
+    label: str
+    x: np.ndarray # numbers or datetime64
+    y: np.ndarray
+
+
+class FigureSpec(NamedTuple):
+    """
+    What render_figure draws, picklable so it can be drawn in another process
+    """
+    image_name: str # without extension
+    title: str
+    xlabel: str
+    ylabel: str
+    series: List["Series"]
+    grid: bool = False
+
+
+def minmax_decimate(x: np.ndarray, y: np.ndarray, num_buckets: int) -> np.ndarray:
+    """
+    Param: x and y are the points, in any order
+    Param: num_buckets is the number of columns the range of x is split into, the pixel width
+
+    Returns the indices of the lowest and highest point of each column, in the order of x
+    """
+    if len(x) <= 2*num_buckets:
+        return np.arange(len(x))
+    x = np.asarray(x, dtype=np.float64)
+    x_range = x.max() - x.min()
+    bucket = np.zeros(len(x), dtype=np.int64) if x_range == 0 else ((x - x.min()) * (num_buckets / x_range)).astype(np.int64)
+    np.minimum(bucket, num_buckets - 1, out=bucket)
+    order = np.lexsort((y, bucket))
+    sorted_bucket = bucket[order]
+    is_start = np.ones(len(order), dtype=np.bool_)
+    is_start[1:] = sorted_bucket[1:] != sorted_bucket[:-1]
+    starts = np.flatnonzero(is_start)
+    ends = np.append(starts[1:], len(order)) - 1
+    # a column with a single value keeps a single point
+    ends = ends[y[order[ends]] != y[order[starts]]]
+    kept = np.unique(np.concatenate([order[starts], order[ends]]))
+    return kept[np.argsort(x[kept], kind="stable")]
+
+
+def lttb_decimate(x: np.ndarray, y: np.ndarray, num_points: int) -> np.ndarray:
+    """
+    Param: x and y are the points, in any order
+    Param: num_points is the number of points kept, at least 3
+
+    Returns the indices of the points kept by largest triangle three buckets
+    (Steinarsson 2013), in the order of x
+    """
+    num_all_points = len(x)
+    if num_all_points <= num_points or num_points < 3:
+        return np.arange(num_all_points)
+    order = np.argsort(x, kind="stable")
+    x = np.asarray(x, dtype=np.float64)[order]
+    y = np.asarray(y, dtype=np.float64)[order]
+    # the first and last point are kept, the points between are split in num_points - 2 buckets
+    edges = np.linspace(1, num_all_points - 1, num_points - 1).astype(np.int64)
+    kept = np.empty(num_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, num_all_points - 1
+    previous = 0
+    for bucket in range(num_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket == num_points - 3:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_x, next_y = x[end:edges[bucket + 2]].mean(), y[end:edges[bucket + 2]].mean()
+        # twice the area of the triangle of the point kept before, each point of the bucket and the mean of the next bucket
+        areas = np.abs((x[previous] - next_x)*(y[start:end] - y[previous]) - (x[previous] - x[start:end])*(next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return order[kept]
+
+
+def decimate(x: np.ndarray, y: np.ndarray, num_pixels: int, method: "DecimationMethod" = DecimationMethod.MINMAX) -> np.ndarray:
+    """
+    Param: num_pixels is the width the series is drawn on
+
+    Returns the indices of the points drawn
+    """
+    if method == DecimationMethod.LTTB:
+        return lttb_decimate(x, y, 2*num_pixels)
+    return minmax_decimate(x, y, num_pixels)
+
+
+def render_figure(figure_spec: "FigureSpec", graph_dir: str, graph_config: "GraphConfig" = GraphConfig(), max_legend_entries: int = 24) -> Optional[str]:
+    """
+    Param: graph_dir is where the .png (and .svg with ReportFormat.SVG) is written
+
+    Returns the figure as SVG with ReportFormat.HTML, otherwise None
+    """
+    figure = Figure(figsize=(graph_config.figure_width/graph_config.dpi, graph_config.figure_height/graph_config.dpi), dpi=graph_config.dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    for series in figure_spec.series:
+        # drawn as an image in SVG, so the report stays small however many points there are
+        ax.plot(series.x, series.y, ".", ms=2, label=series.label, rasterized=True)
+    if figure_spec.grid:
+        ax.grid(True, color='r', alpha=0.3)
+    ax.set_title(figure_spec.title)
+    ax.set_xlabel(figure_spec.xlabel)
+    ax.set_ylabel(figure_spec.ylabel)
+    # past a few dozen series the legend would hide the graph
+    if 0 < len(figure_spec.series) <= max_legend_entries:
+        ax.legend(fontsize="small", markerscale=4)
+    figure.autofmt_xdate()
+    figure.tight_layout()
+
+    figure.savefig(os.path.join(graph_dir, figure_spec.image_name + ".png"))
+    if graph_config.report_format == ReportFormat.SVG:
+        figure.savefig(os.path.join(graph_dir, figure_spec.image_name + ".svg"))
+    if graph_config.report_format != ReportFormat.HTML:
+        return None
+    svg = io.StringIO()
+    figure.savefig(svg, format="svg")
+    return svg.getvalue()
+
+
+def render_figures(figure_specs: Sequence["FigureSpec"], graph_dir: str, graph_config: "GraphConfig" = GraphConfig()) -> List[Optional[str]]:
+    """
+    Returns what render_figure returns for each figure, drawn in
+    graph_config.num_processes processes
+    """
+    if graph_config.num_processes <= 1 or len(figure_specs) <= 1:
+        return [render_figure(figure_spec, graph_dir, graph_config) for figure_spec in figure_specs]
+    # spawned like the processes of sezma, so the workers do not inherit the state of matplotlib
+    with ProcessPoolExecutor(max_workers=min(graph_config.num_processes, len(figure_specs)), mp_context=mp.get_context("spawn")) as executor:
+        return list(executor.map(render_figure, figure_specs, [graph_dir]*len(figure_specs), [graph_config]*len(figure_specs)))
+
+
+def write_html_report(filename: str, title: str, svgs: Sequence[str], table: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+    """
+    Param: svgs is the figures, inline in the report
+    Param: table is the rows of a table shown before the figures, with the keys of its first row as columns
+    """
+    parts = [
+        "<!DOCTYPE html>",
+        f"<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>",
+        "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;font-size:small}"
+        "td,th{border:1px solid #ccc;padding:2px 6px;text-align:right}svg{max-width:100%;height:auto}</style>",
+        f"</head><body><h1>{html.escape(title)}</h1>",
+    ]
+    if table != None and len(table) > 0:
+        columns = list(table[0])
+        parts.append("<table><tr>" + "".join(f"<th>{html.escape(column)}</th>" for column in columns) + "</tr>")
+        for row in table:
+            parts.append("<tr>" + "".join(f"<td>{html.escape(format_cell(row.get(column)))}</td>" for column in columns) + "</tr>")
+        parts.append("</table>")
+    for svg in svgs:
+        # without the XML declaration, which is not allowed inside HTML
+        parts.append("<div>" + svg[svg.find("<svg"):] + "</div>")
+    parts.append("</body></html>")
+    with open(filename, "w") as file:
+        file.write("\n".join(parts))
+
+
+def format_cell(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return "" if value == None else str(value)
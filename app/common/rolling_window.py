@@ -0,0 +1,144 @@
+import math
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from typing import Any, Dict, List, Optional, Sequence
+
+"""
+Sliding sums over the last seconds of a call, so the metrics of a long call
+can be followed while it happens without keeping every row.
+"""
+
+
+@dataclass
+class RollingWindowConfig:
+    """
+    The live metrics written next to the metric files, read from config.json
+    """
+    enabled: bool = False
+    window_seconds: float = 10 # the statistics of a row are over the last window_seconds
+    interval_seconds: float = 1 # a row every interval_seconds
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "RollingWindowConfig":
+        """
+        Param: config is the parsed config.json, missing keys keep their default
+        """
+        default = cls()
+        return cls(
+            enabled=bool(config.get("LiveMetrics", default.enabled)),
+            window_seconds=float(config.get("LiveMetricsWindowSeconds", default.window_seconds)),
+            interval_seconds=float(config.get("LiveMetricsIntervalSeconds", default.interval_seconds)),
+        )
+
+
+class RollingWindow:
+    """
+    RollingWindow keeps the sums of some values over the last window_seconds.
+    The window is a ring of num_slots slots of window_seconds/num_slots each
+    with the running total of every slot, so adding a value and moving the
+    window on are O(1) and the memory used does not grow with the call. The
+    window moves in whole slots, so it is window_seconds long to within a slot.
+    Values older than the window when they are added are left out.
+    """
+    def __init__(self, field_names: Sequence[str], window_seconds: float, num_slots: int = 100) -> None:
+        """
+        Param: field_names is the name of each value summed
+        Param: window_seconds is how far back the sums go
+        Param: num_slots is the number of steps the window moves in
+        """
+        self.field_names: List[str] = list(field_names)
+        self.window_seconds = window_seconds
+        self.__slot_seconds = window_seconds/num_slots
+        self.__slots = np.zeros((num_slots, len(self.field_names)))
+        self.__totals = np.zeros(len(self.field_names))
+        self.__current_slot: Optional[int] = None
+        self.__first_time: Optional[float] = None
+        self.__time: Optional[float] = None
+
+    def __get_slot(self, time: float) -> int:
+        return int(math.floor(time/self.__slot_seconds))
+
+    def advance(self, time: float) -> None:
+        """
+        Param: time is seconds since the epoch, the window ends at the latest time given
+        """
+        slot = self.__get_slot(time)
+        if self.__current_slot == None:
+            self.__current_slot, self.__first_time, self.__time = slot, time, time
+            return
+        self.__time = max(self.__time, time)
+        if slot <= self.__current_slot:
+            return
+        num_slots = len(self.__slots)
+        # at most every slot is emptied, however long since the window last moved
+        expired = np.arange(self.__current_slot + 1, min(slot, self.__current_slot + num_slots) + 1) % num_slots
+        self.__totals -= self.__slots[expired].sum(axis=0)
+        self.__slots[expired] = 0
+        self.__current_slot = slot
+
+    def add(self, time: float, values: Sequence[float]) -> None:
+        """
+        Param: values has a value per field name
+        """
+        self.advance(time)
+        slot = self.__get_slot(time)
+        if slot <= self.__current_slot - len(self.__slots):
+            return
+        self.__slots[slot % len(self.__slots)] += values
+        self.__totals += values
+
+    def add_many(self, times: np.ndarray, values: np.ndarray) -> None:
+        """
+        Param: times is the time of each row of values
+        Param: values has a row per time and a column per field name
+        """
+        if len(times) == 0:
+            return
+        # from the earliest time, so the window starts there on the first call
+        self.advance(float(np.min(times)))
+        self.advance(float(np.max(times)))
+        slots = np.floor(np.asarray(times, dtype=np.float64)/self.__slot_seconds).astype(np.int64)
+        is_in_window = slots > self.__current_slot - len(self.__slots)
+        np.add.at(self.__slots, slots[is_in_window] % len(self.__slots), values[is_in_window])
+        self.__totals += values[is_in_window].sum(axis=0)
+
+    @property
+    def totals(self) -> Dict[str, float]:
+        return dict(zip(self.field_names, self.__totals.tolist()))
+
+    @property
+    def covered_seconds(self) -> float:
+        """
+        Returns the seconds the sums are over, from the start of the oldest slot,
+        shorter than window_seconds at the start of the call
+        """
+        if self.__time == None:
+            return 0.0
+        window_start = (self.__current_slot + 1 - len(self.__slots))*self.__slot_seconds
+        return self.__time - max(window_start, self.__first_time)
+
+
+class IntervalClock:
+    """
+    IntervalClock says when a row is due, every interval_seconds on the multiples of interval_seconds
+    """
+    def __init__(self, interval_seconds: float) -> None:
+        self.__interval_seconds = interval_seconds
+        self.__next_time: Optional[float] = None
+
+    def due(self, time: float) -> List[float]:
+        """
+        Param: time is seconds since the epoch, not before the times given before
+
+        Returns the times a row was due since the last call, up to time
+        """
+        if self.__next_time == None:
+            self.__next_time = (math.floor(time/self.__interval_seconds) + 1)*self.__interval_seconds
+        due_times: List[float] = []
+        while self.__next_time <= time:
+            due_times.append(self.__next_time)
+            self.__next_time += self.__interval_seconds
+        return due_times
@@ -0,0 +1,293 @@
+import numpy as np
+
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from app.network.packet_store import PacketColumns
+
+"""
+Groups the packets into frames while they arrive, instead of after the call.
+The frame sequence of Zoom packets is 16 bits and wraps around, so it is
+compared with serial number arithmetic (RFC 1982).
+"""
+
+SEQUENCE_MODULO = 1 << 16
+
+
+def sequence_distance(sequence: int, other: int) -> int:
+    """
+    Returns how many frames sequence is after other, negative if it's before, wrapping around at 2**16
+    """
+    return ((sequence - other + SEQUENCE_MODULO//2) % SEQUENCE_MODULO) - SEQUENCE_MODULO//2
+
+
+class FrameRow(NamedTuple):
+    """
+    A frame once no more of its packets are expected
+    """
+    ssrc_identifier: int
+    frame_sequence: int
+    first_time: float # seconds since the epoch of the first packet received
+    last_time: float # seconds since the epoch of the last packet received
+    num_packets: int
+    expected_number_of_packets: int
+    num_fec_packets: int
+    num_bytes: int
+
+# the type of each column of FrameRow, for open_metrics_file
+FRAME_COLUMNS = [
+    ("ssrc_identifier", np.uint32),
+    ("frame_sequence", np.uint16),
+    ("first_time", np.float64),
+    ("last_time", np.float64),
+    ("num_packets", np.uint32),
+    ("expected_number_of_packets", np.uint8),
+    ("num_fec_packets", np.uint32),
+    ("num_bytes", np.uint64),
+]
+
+
+class StreamSummary(NamedTuple):
+    """
+    The packets and frames of a stream (SSRC)
+    """
+    ssrc_identifier: int
+    first_time: float # seconds since the epoch of the first packet received
+    last_time: float # seconds since the epoch of the last packet received
+    num_packets: int
+    num_bytes: int
+    num_frames: int
+    num_missing_frames: int # frame sequences skipped
+    num_missing_packets: int # packets expected in the frames received but not received
+    num_late_packets: int # received after their frame was finished
+    num_fec_packets: int
+    loss_ratio: float # missing packets over the packets expected
+    fec_ratio: float # FEC packets over the packets received
+    mean_frame_gap: float # mean seconds between the last packet of a frame and the first of the next
+    max_frame_gap: float
+
+# the type of each column of StreamSummary, for open_metrics_file
+STREAM_COLUMNS = [
+    ("ssrc_identifier", np.uint32),
+    ("first_time", np.float64),
+    ("last_time", np.float64),
+    ("num_packets", np.uint64),
+    ("num_bytes", np.uint64),
+    ("num_frames", np.uint64),
+    ("num_missing_frames", np.uint64),
+    ("num_missing_packets", np.uint64),
+    ("num_late_packets", np.uint64),
+    ("num_fec_packets", np.uint64),
+    ("loss_ratio", np.float64),
+    ("fec_ratio", np.float64),
+    ("mean_frame_gap", np.float64),
+    ("max_frame_gap", np.float64),
+]
+
+
+class StreamState:
+    """
+    StreamState is what is kept of a stream: its frames in flight and counters
+    """
+    __slots__ = (
+        "ssrc_identifier", "frames", "finished_sequences", "latest_sequence", "first_time", "last_time",
+        "num_packets", "num_bytes", "num_frames", "num_missing_frames", "num_missing_packets", "num_expected_packets",
+        "num_late_packets", "num_fec_packets", "previous_frame_end", "frame_gap_sum", "num_frame_gaps", "max_frame_gap",
+    )
+
+    def __init__(self, ssrc_identifier: int, frame_sequence: int, timestamp: float) -> None:
+        self.ssrc_identifier = ssrc_identifier
+        # the frames in flight by frame sequence, as FrameRow fields in a list
+        self.frames: Dict[int, list] = {}
+        # the frames finished within the reorder window of latest_sequence, by timeout or flush
+        self.finished_sequences: Set[int] = set()
+        self.latest_sequence = frame_sequence
+        self.first_time = timestamp
+        self.last_time = timestamp
+        self.num_packets = 0
+        self.num_bytes = 0
+        self.num_frames = 0
+        self.num_missing_frames = 0
+        self.num_missing_packets = 0
+        self.num_expected_packets = 0
+        self.num_late_packets = 0
+        self.num_fec_packets = 0
+        self.previous_frame_end: Optional[float] = None
+        self.frame_gap_sum = 0.0
+        self.num_frame_gaps = 0
+        self.max_frame_gap = 0.0
+
+    def finish(self, frame_sequence: int) -> "FrameRow":
+        """
+        Removes the frame from the frames in flight and counts it
+        """
+        frame = FrameRow(*self.frames.pop(frame_sequence))
+        self.finished_sequences.add(frame_sequence)
+        self.num_frames += 1
+        self.num_expected_packets += max(frame.expected_number_of_packets, frame.num_packets)
+        self.num_missing_packets += max(0, frame.expected_number_of_packets - frame.num_packets)
+        if self.previous_frame_end != None:
+            frame_gap = frame.first_time - self.previous_frame_end
+            self.frame_gap_sum += frame_gap
+            self.num_frame_gaps += 1
+            self.max_frame_gap = max(self.max_frame_gap, frame_gap)
+        self.previous_frame_end = frame.last_time
+        return frame
+
+    def summarize(self) -> "StreamSummary":
+        missing_packets = self.num_missing_packets + self.num_missing_frames
+        return StreamSummary(
+            ssrc_identifier=self.ssrc_identifier,
+            first_time=self.first_time,
+            last_time=self.last_time,
+            num_packets=self.num_packets,
+            num_bytes=self.num_bytes,
+            num_frames=self.num_frames,
+            num_missing_frames=self.num_missing_frames,
+            num_missing_packets=self.num_missing_packets,
+            num_late_packets=self.num_late_packets,
+            num_fec_packets=self.num_fec_packets,
+            # a skipped frame is counted as at least one packet lost
+            loss_ratio=missing_packets/(self.num_expected_packets + self.num_missing_frames) if self.num_expected_packets + self.num_missing_frames > 0 else 0.0,
+            fec_ratio=self.num_fec_packets/self.num_packets if self.num_packets > 0 else 0.0,
+            mean_frame_gap=self.frame_gap_sum/self.num_frame_gaps if self.num_frame_gaps > 0 else 0.0,
+            max_frame_gap=self.max_frame_gap,
+        )
+
+
+class FrameAggregator:
+    """
+    FrameAggregator demultiplexes the packets by SSRC into a StreamState per
+    stream, so the participants' frames and statistics never mix. A stream's
+    frames in flight are keyed by frame sequence, and a frame is returned once
+    it's finished: when the stream is reorder_window frames past it or
+    frame_timeout seconds (of packet time) went by since its last packet.
+    Packets of a finished frame, by sequence or by timeout, are counted as
+    late and dropped, unless they are so far behind that the stream must have
+    restarted (as RTP's MAX_MISORDER). Streams silent for stream_timeout are
+    evicted. The memory
+    used follows the frames in flight and the streams heard recently, not the
+    length of the call.
+    """
+    def __init__(self, frame_timeout: float = 1.0, reorder_window: int = 4, max_misorder: int = 100, stream_timeout: float = 60) -> None:
+        """
+        Param: frame_timeout is the seconds without packets after which a frame is finished
+        Param: reorder_window is how many frames a packet may arrive late
+        Param: max_misorder is how many frames behind a packet restarts the stream's sequence
+        Param: stream_timeout is the seconds without packets after which a stream is evicted (see evict_silent_streams)
+        """
+        self.__frame_timeout = frame_timeout
+        self.__reorder_window = reorder_window
+        self.__max_misorder = max_misorder
+        self.__stream_timeout = stream_timeout
+        self.streams: Dict[int, "StreamState"] = {}
+        self.__latest_time: Optional[float] = None
+        # counted once evicted, the streams still there are counted in num_late_packets
+        self.__num_evicted_late_packets = 0
+
+    @property
+    def num_frames_in_flight(self) -> int:
+        return sum(len(stream.frames) for stream in self.streams.values())
+
+    @property
+    def num_late_packets(self) -> int:
+        return self.__num_evicted_late_packets + sum(stream.num_late_packets for stream in self.streams.values())
+
+    def add_packet(self, timestamp: float, ssrc_identifier: int, frame_sequence: int, packet_size: int, expected_number_of_packets: int, is_fec: bool, finished: List["FrameRow"]) -> None:
+        """
+        Param: finished gets the frames finished by the packet sequence advancing
+        """
+        if self.__latest_time == None or timestamp > self.__latest_time:
+            self.__latest_time = timestamp
+        stream = self.streams.get(ssrc_identifier)
+        if stream == None:
+            stream = self.streams[ssrc_identifier] = StreamState(ssrc_identifier, frame_sequence, timestamp)
+        stream.last_time = timestamp
+        stream.num_packets += 1
+        stream.num_bytes += packet_size
+        stream.num_fec_packets += is_fec
+
+        frames = stream.frames
+        frame = frames.get(frame_sequence)
+        if frame == None:
+            distance = sequence_distance(frame_sequence, stream.latest_sequence)
+            if -self.__max_misorder < distance <= -self.__reorder_window or frame_sequence in stream.finished_sequences:
+                stream.num_late_packets += 1
+                return
+            frame = frames[frame_sequence] = [ssrc_identifier, frame_sequence, timestamp, timestamp, 0, expected_number_of_packets, 0, 0]
+            if distance > 0 or distance <= -self.__max_misorder:
+                if 1 < distance < self.__max_misorder:
+                    stream.num_missing_frames += distance - 1
+                stream.latest_sequence = frame_sequence
+                for sequence in [sequence for sequence in frames if sequence_distance(frame_sequence, sequence) >= self.__reorder_window]:
+                    finished.append(stream.finish(sequence))
+                self.__forget_finished_sequences(stream)
+        elif frame_sequence != stream.latest_sequence and sequence_distance(frame_sequence, stream.latest_sequence) > 0:
+            stream.latest_sequence = frame_sequence
+            self.__forget_finished_sequences(stream)
+        frame[3] = timestamp
+        frame[4] += 1
+        frame[6] += is_fec
+        frame[7] += packet_size
+
+    def __forget_finished_sequences(self, stream: "StreamState") -> None:
+        # the packets of frames further behind are late by their distance alone
+        stream.finished_sequences = {sequence for sequence in stream.finished_sequences if 0 <= sequence_distance(stream.latest_sequence, sequence) < self.__reorder_window}
+
+    def add_columns(self, columns: "PacketColumns") -> List["FrameRow"]:
+        """
+        Returns the frames finished by the packets of the chunk, by sequence advance or timeout
+        """
+        finished: List["FrameRow"] = []
+        for packet in zip(
+                columns.timestamp.tolist(),
+                columns.ssrc_identifier.tolist(),
+                columns.frame_sequence.tolist(),
+                columns.packet_size.tolist(),
+                columns.expected_number_of_packets.tolist(),
+                columns.is_fec.tolist()):
+            self.add_packet(*packet, finished)
+        if self.__latest_time != None:
+            finished += self.expire(self.__latest_time)
+        return finished
+
+    def expire(self, now: float) -> List["FrameRow"]:
+        """
+        Param: now is the current packet time in seconds since the epoch
+
+        Returns the frames without packets for more than frame_timeout
+        """
+        finished: List["FrameRow"] = []
+        for stream in self.streams.values():
+            for sequence in [sequence for sequence, frame in stream.frames.items() if now - frame[3] > self.__frame_timeout]:
+                finished.append(stream.finish(sequence))
+        return finished
+
+    def evict_silent_streams(self, finished: List["FrameRow"]) -> List["StreamSummary"]:
+        """
+        Param: finished gets the frames still in flight of the evicted streams
+
+        Removes the streams without packets for more than stream_timeout and returns their summary
+        """
+        if self.__latest_time == None:
+            return []
+        silent_streams = [stream for stream in self.streams.values() if self.__latest_time - stream.last_time > self.__stream_timeout]
+        return [self.__evict(stream, finished) for stream in silent_streams]
+
+    def __evict(self, stream: "StreamState", finished: List["FrameRow"]) -> "StreamSummary":
+        for sequence in list(stream.frames):
+            finished.append(stream.finish(sequence))
+        self.__num_evicted_late_packets += stream.num_late_packets
+        del self.streams[stream.ssrc_identifier]
+        return stream.summarize()
+
+    def flush(self) -> List["FrameRow"]:
+        """
+        Returns every frame in flight, once no more packets will come, the streams are kept
+        """
+        return [stream.finish(sequence) for stream in self.streams.values() for sequence in list(stream.frames)]
+
+    def summarize(self) -> List["StreamSummary"]:
+        """
+        Returns the summary of the streams not evicted
+        """
+        return [stream.summarize() for stream in self.streams.values()]
@@ -0,0 +1,130 @@
+import bisect
+import math
+
+import numpy as np
+
+from typing import Dict, List, Optional
+
+from app.common.rolling_window import IntervalClock, RollingWindow, RollingWindowConfig
+from app.network.frame_aggregator import FrameAggregator, FrameRow
+from app.network.packet_store import PacketColumns
+
+"""
+Rolling statistics of the network while the call happens, a row every
+interval in network_live.csv (see network_run.write_metrics).
+"""
+
+# the type of each column of a row of LiveNetworkMetrics, for open_metrics_file
+LIVE_NETWORK_COLUMNS = [
+    ("time", np.float64), # seconds since the epoch of the end of the window
+    ("window_seconds", np.float64), # shorter at the start of the call
+    ("num_streams", np.uint32), # SSRCs with packets in the window
+    ("packets_per_second", np.float64),
+    ("bitrate", np.float64), # bits per second of the UDP loads
+    ("fec_ratio", np.float64), # FEC packets over packets
+    ("num_frames", np.uint32), # finished in the window, by their first packet
+    ("frame_completion_rate", np.float64), # frames with every packet expected over frames
+    ("mean_frame_gap", np.float64), # mean seconds between the last packet of a frame and the first of the next, within a stream
+    ("frame_jitter", np.float64), # standard deviation of the seconds between frames
+]
+
+
+class LiveNetworkMetrics:
+    """
+    LiveNetworkMetrics keeps sliding sums of the packets and frames of the
+    last rolling_config.window_seconds and returns a row every
+    rolling_config.interval_seconds of packet time. Rows are only due once a
+    packet after them arrives, a silent interval gets its rows with the next
+    packet.
+    """
+    def __init__(self, rolling_config: "RollingWindowConfig", frame_timeout: float = 1.0) -> None:
+        """
+        Param: rolling_config is the window and the interval of the rows
+        Param: frame_timeout is the frame_timeout of the FrameAggregator of the frames not given to add_columns
+        """
+        self.__window_seconds = rolling_config.window_seconds
+        self.__packets = RollingWindow(["packets", "bytes", "fec_packets"], rolling_config.window_seconds)
+        self.__frames = RollingWindow(["frames", "complete_frames", "frame_gaps", "frame_gap_sum", "frame_gap_square_sum"], rolling_config.window_seconds)
+        self.__clock = IntervalClock(rolling_config.interval_seconds)
+        self.__frame_timeout = frame_timeout
+        self.__frame_aggregator: Optional["FrameAggregator"] = None
+        # of each stream heard in the window: its last packet time and the last packet time of its last frame
+        self.__streams: Dict[int, List[Optional[float]]] = {}
+
+    def add_columns(self, columns: "PacketColumns", frames: Optional[List["FrameRow"]] = None) -> List[list]:
+        """
+        Param: columns is a chunk of packets, in capture order
+        Param: frames is the frames finished by the chunk (see FrameAggregator.add_columns), None to group the packets here
+
+        Returns the rows due, with the columns of LIVE_NETWORK_COLUMNS
+        """
+        if len(columns.timestamp) == 0:
+            return []
+        if frames == None:
+            if self.__frame_aggregator == None:
+                self.__frame_aggregator = FrameAggregator(self.__frame_timeout)
+            frames = self.__frame_aggregator.add_columns(columns)
+        frames = sorted(frames, key=lambda frame: frame.last_time)
+        frame_times = [frame.last_time for frame in frames]
+        rows = []
+        start = 0
+        frame_start = 0
+        # the rows start at the first packet, the rows of a chunk spanning several intervals are not skipped
+        due_times = self.__clock.due(float(columns.timestamp[0])) + self.__clock.due(float(columns.timestamp[-1]))
+        # the packets and frames of the chunk up to each row are in it, the ones after in the next
+        for due_time in due_times:
+            end = start + int(np.searchsorted(columns.timestamp[start:], due_time))
+            self.__add_packets(PacketColumns(*[values[start:end] for values in columns]))
+            start = end
+            frame_end = bisect.bisect_left(frame_times, due_time, frame_start)
+            self.__add_frames(frames[frame_start:frame_end])
+            frame_start = frame_end
+            rows.append(self.__get_row(due_time))
+        self.__add_packets(PacketColumns(*[values[start:] for values in columns]))
+        self.__add_frames(frames[frame_start:])
+        return rows
+
+    def __add_packets(self, columns: "PacketColumns") -> None:
+        if len(columns.timestamp) == 0:
+            return
+        self.__packets.add_many(columns.timestamp, np.column_stack((
+            np.ones(len(columns.timestamp)),
+            columns.packet_size.astype(np.float64),
+            columns.is_fec.astype(np.float64),
+        )))
+        ssrc_identifiers, last_indices = np.unique(columns.ssrc_identifier[::-1], return_index=True)
+        for ssrc_identifier, last_time in zip(ssrc_identifiers.tolist(), columns.timestamp[::-1][last_indices].tolist()):
+            stream = self.__streams.setdefault(ssrc_identifier, [last_time, None])
+            stream[0] = max(stream[0], last_time)
+
+    def __add_frames(self, frames: List["FrameRow"]) -> None:
+        for frame in frames:
+            stream = self.__streams.setdefault(frame.ssrc_identifier, [frame.last_time, None])
+            frame_gap = 0.0 if stream[1] == None else frame.first_time - stream[1]
+            has_gap = 0.0 if stream[1] == None else 1.0
+            stream[1] = frame.last_time if stream[1] == None else max(stream[1], frame.last_time)
+            self.__frames.add(frame.first_time, (1.0, 1.0 if frame.num_packets >= frame.expected_number_of_packets else 0.0, has_gap, frame_gap, frame_gap*frame_gap))
+
+    def __get_row(self, time: float) -> list:
+        self.__packets.advance(time)
+        self.__frames.advance(time)
+        # the streams not heard in the window are forgotten
+        for ssrc_identifier in [ssrc_identifier for ssrc_identifier, stream in self.__streams.items() if stream[0] <= time - self.__window_seconds]:
+            del self.__streams[ssrc_identifier]
+        packets = self.__packets.totals
+        frames = self.__frames.totals
+        window_seconds = self.__packets.covered_seconds
+        # statistics of nothing are left empty
+        mean_frame_gap = frames["frame_gap_sum"]/frames["frame_gaps"] if frames["frame_gaps"] > 0 else None
+        return [
+            time,
+            window_seconds,
+            len(self.__streams),
+            packets["packets"]/window_seconds if window_seconds > 0 else None,
+            8*packets["bytes"]/window_seconds if window_seconds > 0 else None,
+            packets["fec_packets"]/packets["packets"] if packets["packets"] > 0 else None,
+            round(frames["frames"]),
+            frames["complete_frames"]/frames["frames"] if frames["frames"] > 0 else None,
+            mean_frame_gap,
+            math.sqrt(max(0.0, frames["frame_gap_square_sum"]/frames["frame_gaps"] - mean_frame_gap*mean_frame_gap)) if mean_frame_gap != None else None,
+        ]
@@ -0,0 +1,54 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.common.buffered_writer import FlushPolicy
+from app.common.constants import OutputFormat, TimeFormat
+from app.common.rolling_window import RollingWindowConfig
+
+
+def _optional_list(value) -> Optional[List[int]]:
+    return None if value == None else [int(x) for x in value]
+
+
+def _optional_float(value) -> Optional[float]:
+    return None if value == None else float(value)
+
+
+@dataclass
+class NetworkPipelineConfig:
+    """
+    Optional settings of network.pipeline_run, read from config.json
+    """
+    p2p_ports: Optional[List[int]] = None
+    filter_media_type: bool = True
+    pcap_files: Optional[List[str]] = None # replay these captures instead of sniffing
+    replay_speed: Optional[float] = None # 1 is real time, None is as fast as possible
+    local_ip_address: Optional[str] = None # inferred from the captures if None
+    time_format: TimeFormat = TimeFormat.DATETIME # of the time column of network.csv
+    output_format: OutputFormat = OutputFormat.CSV
+    flush_policy: FlushPolicy = field(default_factory=FlushPolicy)
+    frame_metrics: bool = False # also write a row per frame to network_frames.csv
+    frame_timeout: float = 1.0 # seconds without packets after which a frame is written
+    stream_timeout: float = 60 # seconds without packets after which a stream's row is written and it's forgotten
+    rolling_window: RollingWindowConfig = field(default_factory=RollingWindowConfig) # rows of network_live.csv
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "NetworkPipelineConfig":
+        """
+        Param: config is the parsed config.json, missing keys keep their default
+        """
+        default = cls()
+        return cls(
+            p2p_ports=_optional_list(config.get("ZoomP2PPorts", default.p2p_ports)),
+            filter_media_type=bool(config.get("FilterZoomMediaType", default.filter_media_type)),
+            pcap_files=config.get("NetworkPcapFiles", default.pcap_files),
+            replay_speed=_optional_float(config.get("NetworkReplaySpeed", default.replay_speed)),
+            local_ip_address=config.get("NetworkLocalIPAddress", default.local_ip_address),
+            time_format=TimeFormat(config.get("NetworkTimeFormat", default.time_format.value)),
+            output_format=OutputFormat(config.get("MetricsOutputFormat", default.output_format.value)),
+            flush_policy=FlushPolicy.from_config(config),
+            frame_metrics=bool(config.get("NetworkFrameMetrics", default.frame_metrics)),
+            frame_timeout=float(config.get("NetworkFrameTimeout", default.frame_timeout)),
+            stream_timeout=float(config.get("NetworkStreamTimeout", default.stream_timeout)),
+            rolling_window=RollingWindowConfig.from_config(config),
+        )
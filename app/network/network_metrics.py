@@ -1,6 +1,8 @@
-from dataclasses import dataclass
+import numpy as np
+
+from dataclasses import dataclass, fields
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List
 
 from app.network.parsing.zoom_packet import ZoomPacket
 from app.network.parsing.packet_constants import RTPWrapper
@@ -16,3 +18,50 @@ class NetworkMetrics:
     is_fec: bool
     ssrc_identifier: int
 
+@dataclass
+class FrameStatistics:
+    """
+    Per frame statistics of the packets received, in the order of the frames,
+    an NDArray each (see network_statistics.get_stream_statistics)
+    """
+    times: np.ndarray # float64 seconds since the epoch of every packet
+    sizes: np.ndarray # of every packet
+    time_withinpacket: np.ndarray # seconds between the first and last packet of the frame
+    time_betweenpacket: np.ndarray # seconds between the last packet of the frame before and the first packet of the frame
+    num_packets_per_frame: np.ndarray
+    time_packet_end: np.ndarray # float64 seconds since the epoch of the last packet of the frame
+    num_fecs: np.ndarray
+    num_compared_to_expected: np.ndarray # expected number of packets minus number received
+
+    @classmethod
+    def merge(cls, statistics: Iterable["FrameStatistics"]) -> "FrameStatistics":
+        """
+        Returns the statistics of the streams together, one stream after the
+        other, the time between frames is still within each stream
+        """
+        statistics = list(statistics)
+        return cls(**{
+            field.name: np.concatenate([getattr(stream_statistics, field.name) for stream_statistics in statistics]) if len(statistics) > 0 else np.empty(0)
+            for field in fields(cls)
+        })
+
+    def summarize(self) -> Dict[str, float]:
+        """
+        Returns the totals and the mean and 95th percentile of each statistic
+        """
+        summary: Dict[str, float] = {
+            "num_packets": len(self.times),
+            "num_frames": len(self.num_packets_per_frame),
+            "duration_seconds": float(np.max(self.times) - np.min(self.times)) if len(self.times) > 0 else 0,
+            "num_fec_packets": int(np.sum(self.num_fecs)),
+            "num_missing_packets": int(np.sum(np.maximum(self.num_compared_to_expected, 0))),
+            "num_incomplete_frames": int(np.count_nonzero(self.num_compared_to_expected > 0)),
+        }
+        for name, values in [
+                ("packet_size", self.sizes),
+                ("time_within_frame", self.time_withinpacket),
+                ("time_between_frames", self.time_betweenpacket),
+                ("packets_per_frame", self.num_packets_per_frame)]:
+            summary[f"mean_{name}"] = float(np.mean(values)) if len(values) > 0 else float("nan")
+            summary[f"p95_{name}"] = float(np.percentile(values, 95)) if len(values) > 0 else float("nan")
+        return summary
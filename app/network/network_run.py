@@ -1,8 +1,15 @@
+import ast
 import csv
 import logging
 import multiprocessing as mp
+import numpy as np
+import os
 import select
-from collections import defaultdict
+import threading
+import time
+import traceback
+from contextlib import ExitStack
+from dataclasses import fields
 from datetime import datetime
 from enum import Enum
 from matplotlib import pyplot as plt
@@ -17,13 +24,25 @@ warnings.filterwarnings("ignore", category=CryptographyDeprecationWarning)
 from scapy.all import *
 from scapy.layers.inet import *
 
-from typing import Dict, List, Union
+from typing import Dict, Iterator, List, Optional
 
-from app.common.constants import SpecialQueueValues, get_timeformat
+from app.common.buffered_writer import BufferedWriter, FlushPolicy, WriterStats
+from app.common.columnar import ColumnarWriter, is_columnar_file, iter_chunks, open_metrics_file, read_columnar
+from app.common.constants import OUTPUT_EXTENSIONS, OutputFormat, SpecialQueueValues, TimeFormat, parse_time
+from app.common.graphing import FigureSpec, GraphConfig, GraphRenderMode, ReportFormat, Series, decimate, render_figures, write_html_report
+from app.network.frame_aggregator import FRAME_COLUMNS, STREAM_COLUMNS, FrameAggregator, FrameRow, StreamSummary
+from app.network.live_metrics import LIVE_NETWORK_COLUMNS, LiveNetworkMetrics
+from app.network.network_config import NetworkPipelineConfig
 from app.network.network_metrics import NetworkMetrics
+from app.network.network_statistics import NetworkStatistics, compute_network_statistics, to_local_datetimes
+from app.network.packet_store import PACKET_COLUMN_DTYPES, PacketColumns, PacketStore, concatenate_packet_columns
+from app.network.pcap_reader import PcapRecord
+from app.network.pcap_replay import infer_local_ip_address, parse_record, read_records
 from app.network.parsing.exceptions import PacketException
-from app.network.parsing.packet_constants import RTPWrapper
+from app.network.parsing.packet_constants import ExceptionCodes, RTPWrapper
+from app.network.parsing.raw_packet import ZoomPacketRecord, get_ip_offset, ip_address_to_bytes, parse_raw_packet
 from app.network.parsing.zoom_packet import ZoomPacket
+from app.network.zoom_filter import get_sniff_filter
 
 log = logging.getLogger(__name__)
 
@@ -43,63 +62,302 @@ def network_socket() -> None:
         queue_sink.push(s.recv())
     queue_sink.stop()
 
-def pipeline_run(filename: str, log_queue, zoom_meeting_check: mp.Event) -> None:
+def pipeline_run(filename: str, log_queue, zoom_meeting_check: mp.Event, pipeline_config: "NetworkPipelineConfig" = NetworkPipelineConfig()) -> None:
     """
     Param: filename is the name of the file to write the network metrics into
     Param: log_queue is mp.Queue that contains a string with log information
     Param: zoom_meeting_on_check determines whether Zoom Meeting is still in progress on the user's laptop
+    Param: pipeline_config sets the BPF filter of the sniffer, or the captures to replay instead of sniffing
+
+    With pipeline_config.pcap_files, the captures are replayed through the
+    same parsing and writing as the sniffed packets, without waiting on Zoom
+    Meeting, and pipeline_run returns once they are written
     """
-    local_machine_ip_addr = get_if_addr(conf.iface)
     conf.use_pcap = True
-    # Enable filtering: only Ether, IP and UDP will be dissected
-    conf.layers.filter([Ether, IP, UDP])
+    # Enable filtering: only Ether will be dissected, parse_zoom_packet reads IP and UDP from the raw bytes
+    conf.layers.filter([Ether])
     # Disable filtering: restore everything to normal
     # conf.layers.unfilter()
-    source = SniffSource(iface=conf.iface,
-                         filter=f"udp and dst host {local_machine_ip_addr}")
-    filterTransform = TransformDrain(get_zoom_packet)
-    sink = QueueSink()
-    source > filterTransform > sink
+    if pipeline_config.pcap_files != None:
+        replay_run(filename, log_queue, pipeline_config)
+        return
+
+    local_machine_ip_addr = pipeline_config.local_ip_address if pipeline_config.local_ip_address != None else get_if_addr(conf.iface)
+    local_machine_ip_bytes = ip_address_to_bytes(local_machine_ip_addr)
+    # packets that can not be Zoom media are dropped in the kernel
+    bpf_filter, error = get_sniff_filter(local_machine_ip_addr, pipeline_config.p2p_ports, pipeline_config.filter_media_type, conf.iface)
+    if error != None:
+        log_queue.put(f"in {__name__}.{pipeline_run.__name__}, could not compile the Zoom filter, {error}")
+    log_queue.put(f"in {__name__}.{pipeline_run.__name__}, sniffing with filter: {bpf_filter}")
+    source = SniffSource(iface=conf.iface, filter=bpf_filter)
+    zoom_packet_filter = ZoomPacketFilterDrain(local_machine_ip_bytes, log_queue)
+    packet_store = PacketStore()
+    sink = PacketStoreSink(packet_store)
+    source > zoom_packet_filter > sink
     p = PipeEngine(source)
     zoom_meeting_check.wait() # wait until it's on
     p.start()
     log_queue.put(f"started {__name__}.{pipeline_run.__name__}")
-    write_metrics(filename, sink, zoom_meeting_check)
+    frame_aggregator = FrameAggregator(pipeline_config.frame_timeout, stream_timeout=pipeline_config.stream_timeout) if pipeline_config.frame_metrics else None
+    live_metrics = LiveNetworkMetrics(pipeline_config.rolling_window, pipeline_config.frame_timeout) if pipeline_config.rolling_window.enabled else None
+    writer_stats = write_metrics(filename, packet_store, zoom_meeting_check, time_format=pipeline_config.time_format, output_format=pipeline_config.output_format, flush_policy=pipeline_config.flush_policy, frame_aggregator=frame_aggregator, live_metrics=live_metrics)
     p.stop()   
+    log_queue.put(f"in {__name__}.{pipeline_run.__name__}, wrote {os.path.basename(filename)}: {writer_stats.describe()}")
+    if frame_aggregator != None:
+        log_queue.put(f"in {__name__}.{pipeline_run.__name__}, {frame_aggregator.num_late_packets} packets arrived after their frame was written")
+    zoom_packet_filter.log_counts()
     log_queue.put(f"finished {__name__}.{pipeline_run.__name__}")
 
-def write_metrics(filename: str, sink: QueueSink, zoom_meeting_check) -> None:
+def replay_run(filename: str, log_queue, pipeline_config: "NetworkPipelineConfig", max_packets_waiting: int = 100000) -> None:
     """
     Param: filename is the name of the file to write the network metrics into
-    Param: sink contains the network metrics processed
-    Param: zoom_meeting_on_check determines whether Zoom Meeting is still in progress on the user's laptop
+    Param: log_queue is mp.Queue that contains a string with log information
+    Param: pipeline_config has the captures to replay, the replay speed and the local IP address
+    Param: max_packets_waiting is the most parsed packets waiting to be written before reading pauses
+    """
+    log_queue.put(f"started {__name__}.{replay_run.__name__}")
+    local_ip_address = pipeline_config.local_ip_address
+    if local_ip_address == None:
+        local_ip_address = infer_local_ip_address(pipeline_config.pcap_files)
+        log_queue.put(f"in {__name__}.{replay_run.__name__}, inferred local IP address {local_ip_address}")
+    local_ip_bytes = None if local_ip_address == None else ip_address_to_bytes(local_ip_address)
+
+    zoom_packet_filter = ZoomPacketFilterDrain(local_ip_bytes, log_queue)
+    packet_store = PacketStore()
+    zoom_packet_filter > PacketStoreSink(packet_store)
+    # cleared once every packet has been parsed, in place of the Zoom Meeting check
+    replay_on = threading.Event()
+    replay_on.set()
+
+    def replay() -> None:
+        try:
+            # the packets are parsed straight from the memory mapped captures, without scapy
+            for record in read_records(pipeline_config.pcap_files, pipeline_config.replay_speed):
+                zoom_packet_filter.push_record(record)
+                while len(packet_store) > max_packets_waiting:
+                    time.sleep(0.01)
+        except Exception as e:
+            log_queue.put(f"exception in {__name__}.{replay_run.__name__}: {type(e)}, {e}, {traceback.format_exc()}")
+        replay_on.clear()
+
+    replay_thread = threading.Thread(target=replay)
+    replay_thread.start()
+    frame_aggregator = FrameAggregator(pipeline_config.frame_timeout, stream_timeout=pipeline_config.stream_timeout) if pipeline_config.frame_metrics else None
+    live_metrics = LiveNetworkMetrics(pipeline_config.rolling_window, pipeline_config.frame_timeout) if pipeline_config.rolling_window.enabled else None
+    writer_stats = write_metrics(filename, packet_store, replay_on, timeout=0.1, time_format=pipeline_config.time_format, output_format=pipeline_config.output_format, flush_policy=pipeline_config.flush_policy, frame_aggregator=frame_aggregator, live_metrics=live_metrics)
+    replay_thread.join()
+    log_queue.put(f"in {__name__}.{replay_run.__name__}, wrote {os.path.basename(filename)}: {writer_stats.describe()}")
+    if frame_aggregator != None:
+        log_queue.put(f"in {__name__}.{replay_run.__name__}, {frame_aggregator.num_late_packets} packets arrived after their frame was written")
+    zoom_packet_filter.log_counts()
+    log_queue.put(f"finished {__name__}.{replay_run.__name__}")
+
+class ZoomPacketFilterDrain(Drain):
     """
-    start_time = None
+    Parses the sniffed packets and only passes on the Zoom packets as
+    ZoomPacketRecord. Rejected packets are counted by ExceptionCodes and the
+    counts are written to the log every log_every_seconds.
+    """
+    def __init__(self, local_ip_address: Optional[bytes], log_queue, log_every_seconds: float = 60, name=None) -> None:
+        """
+        Param: local_ip_address is the IPv4 address the packets must be sent to (see ip_address_to_bytes), None to accept any
+        Param: log_queue is mp.Queue that contains a string with log information
+        Param: log_every_seconds is how often the counts are logged
+        """
+        Drain.__init__(self, name=name)
+        self.local_ip_address = local_ip_address
+        self.log_queue = log_queue
+        self.log_every_seconds = log_every_seconds
+        self.num_zoom_packets = 0
+        self.num_rejected: Dict[ExceptionCodes, int] = {code: 0 for code in ExceptionCodes}
+        self.__next_log_time = time.monotonic() + log_every_seconds
+
+    def push(self, msg) -> None:
+        try:
+            record = parse_zoom_packet(msg, self.local_ip_address)
+            self.num_zoom_packets += 1
+            self._send(record)
+        except PacketException as e:
+            self.num_rejected[e.code] += 1
+        self.__log_periodically()
+
+    def push_record(self, pcap_record: "PcapRecord") -> None:
+        """
+        Param: pcap_record is a packet of MmapPcapReader instead of a scapy.Packet
+        """
+        try:
+            record = parse_record(pcap_record, self.local_ip_address)
+            self.num_zoom_packets += 1
+            self._send(record)
+        except PacketException as e:
+            self.num_rejected[e.code] += 1
+        self.__log_periodically()
+
+    def __log_periodically(self) -> None:
+        if time.monotonic() >= self.__next_log_time:
+            self.__next_log_time = time.monotonic() + self.log_every_seconds
+            self.log_counts()
+
+    def high_push(self, msg) -> None:
+        self.push(msg)
+
+    def log_counts(self) -> None:
+        rejected = ", ".join(f"{code.name} {count}" for code, count in self.num_rejected.items() if count > 0)
+        self.log_queue.put(f"in {__name__}.{ZoomPacketFilterDrain.__name__}, {self.num_zoom_packets} Zoom packets, rejected: {rejected if rejected != '' else 'none'}")
+
+class PacketStoreSink(Sink):
+    """
+    Stores the parsed packets in a PacketStore
+    """
+    def __init__(self, packet_store: "PacketStore", name=None) -> None:
+        Sink.__init__(self, name=name)
+        self.packet_store = packet_store
 
-    with open(filename, "w") as csv_file:
-        csv_writer = csv.writer(csv_file)
-        while zoom_meeting_check.is_set():
-            received_object = sink.recv(timeout=5) # 5 second timeout this means there is only 1 person on call
-            if received_object == None: # timeout reached 5 seconds
-                continue
-            if type(received_object) == SpecialQueueValues and received_object == SpecialQueueValues.NON_ZOOM_PACKET:
-                # check the get_zoom_packet logic --> but received a packet that is not Zoom
+    def push(self, msg) -> None:
+        self.packet_store.append(msg)
+
+def format_packet_times(timestamps: np.ndarray, time_format: "TimeFormat" = TimeFormat.DATETIME) -> list:
+    """
+    Param: timestamps is seconds since the epoch
+
+    Returns the times as written in network.csv, datetime for TimeFormat.DATETIME
+    """
+    # microseconds truncated like PacketTime, for the whole chunk at once
+    microseconds = np.floor(np.asarray(timestamps, dtype=np.float64) * 10**6).astype(np.int64)
+    if time_format == TimeFormat.EPOCH:
+        seconds, fraction = np.divmod(microseconds, 10**6)
+        return ["%d.%06d" % time_parts for time_parts in zip(seconds.tolist(), fraction.tolist())]
+    return [datetime.fromtimestamp(timestamp / 10**6) for timestamp in microseconds.tolist()]
+
+def get_metric_rows(columns: "PacketColumns", time_format: "TimeFormat" = TimeFormat.DATETIME) -> List[list]:
+    """
+    Returns the rows of network.csv of a chunk of packets, with the fields of NetworkMetrics
+    """
+    times = format_packet_times(columns.timestamp, time_format)
+    return [
+        [frame_sequence.to_bytes(2, byteorder='big'), packet_time, packet_size, expected_number_of_packets, is_fec, ssrc_identifier]
+        for packet_time, frame_sequence, packet_size, expected_number_of_packets, is_fec, ssrc_identifier in zip(
+            times, 
+            columns.frame_sequence.tolist(), 
+            columns.packet_size.tolist(), 
+            columns.expected_number_of_packets.tolist(), 
+            columns.is_fec.tolist(), 
+            columns.ssrc_identifier.tolist())
+    ]
+
+def get_frame_rows(frames: List["FrameRow"], time_format: "TimeFormat" = TimeFormat.DATETIME) -> List[list]:
+    """
+    Returns the rows of network_frames.csv, with the fields of FrameRow
+    """
+    if len(frames) == 0:
+        return []
+    first_times = format_packet_times([frame.first_time for frame in frames], time_format)
+    last_times = format_packet_times([frame.last_time for frame in frames], time_format)
+    return [[frame.ssrc_identifier, frame.frame_sequence, first_time, last_time] + list(frame[4:]) for frame, first_time, last_time in zip(frames, first_times, last_times)]
+
+def get_stream_rows(streams: List["StreamSummary"], time_format: "TimeFormat" = TimeFormat.DATETIME) -> List[list]:
+    """
+    Returns the rows of network_streams.csv, with the fields of StreamSummary
+    """
+    if len(streams) == 0:
+        return []
+    first_times = format_packet_times([stream.first_time for stream in streams], time_format)
+    last_times = format_packet_times([stream.last_time for stream in streams], time_format)
+    return [[stream.ssrc_identifier, first_time, last_time] + list(stream[3:]) for stream, first_time, last_time in zip(streams, first_times, last_times)]
+
+def get_live_rows(rows: List[list], time_format: "TimeFormat" = TimeFormat.DATETIME) -> List[list]:
+    """
+    Returns the rows of network_live.csv, from the rows of LiveNetworkMetrics
+    """
+    if len(rows) == 0:
+        return []
+    times = format_packet_times([row[0] for row in rows], time_format)
+    return [[live_time] + row[1:] for live_time, row in zip(times, rows)]
+
+def drain_chunks(packet_store: "PacketStore", zoom_meeting_check, chunk_size: int, timeout: float) -> Iterator["PacketColumns"]:
+    """
+    Yields the packets of packet_store in chunks of at most chunk_size until
+    zoom_meeting_check is cleared, and then the packets left in a last chunk
+    """
+    is_last_chunk = False
+    while not is_last_chunk:
+        if zoom_meeting_check.is_set():
+            columns = packet_store.drain(chunk_size, timeout=timeout) # 5 second timeout this means there is only 1 person on call
+        else:
+            columns = packet_store.drain()
+            is_last_chunk = True
+        if len(columns.timestamp) == 0: # timeout reached 5 seconds
+            continue
+        yield columns
+
+def write_metrics(filename: str, packet_store: "PacketStore", zoom_meeting_check, chunk_size: int = 1024, timeout: float = 5, time_format: "TimeFormat" = TimeFormat.DATETIME, output_format: "OutputFormat" = OutputFormat.CSV, flush_policy: "FlushPolicy" = FlushPolicy(), frame_aggregator: Optional["FrameAggregator"] = None, live_metrics: Optional["LiveNetworkMetrics"] = None) -> "WriterStats":
+    """
+    Param: filename is the name of the file to write the network metrics into
+    Param: packet_store contains the packets processed
+    Param: zoom_meeting_on_check determines whether Zoom Meeting is still in progress on the user's laptop
+    Param: chunk_size is the most packets written at once
+    Param: timeout is how long to wait for packets in seconds before checking zoom_meeting_check again
+    Param: time_format is how the time column is written in CSV
+    Param: output_format is CSV, with the fields of NetworkMetrics, or BINARY, with the columns of PacketColumns
+    Param: flush_policy is when the packets are written, by a background thread
+    Param: frame_aggregator groups the packets into frames while they arrive, written to network_frames.csv
+        (network_frames.bin in OutputFormat.BINARY) next to filename, None to not group them. A row per
+        stream (SSRC) is written to network_streams.csv once the stream is evicted or the call is over.
+    Param: live_metrics gives a row of rolling statistics every interval, written to network_live.csv
+        (network_live.bin in OutputFormat.BINARY) next to filename, None to not write them
+
+    The packets still in packet_store once zoom_meeting_check is cleared are
+    written too. Returns the statistics of the writes of filename.
+    """
+    if output_format == OutputFormat.BINARY:
+        columnar_writer = ColumnarWriter(filename, list(PACKET_COLUMN_DTYPES.items()))
+        metrics_writer = BufferedWriter(columnar_writer, columnar_writer, flush_policy, filename)
+    else:
+        csv_file = open(filename, "w")
+        metrics_writer = BufferedWriter(csv_file, csv.writer(csv_file), flush_policy, filename)
+
+    def write_frames(frames: List["FrameRow"]) -> None:
+        # the binary format keeps the times in seconds since the epoch
+        frame_writer.writerows(frames if output_format == OutputFormat.BINARY else get_frame_rows(frames, time_format))
+
+    def write_streams(streams: List["StreamSummary"]) -> None:
+        stream_writer.writerows(streams if output_format == OutputFormat.BINARY else get_stream_rows(streams, time_format))
+
+    has_header = False
+    # closing writes the rows still waiting, every file is closed even if writing fails
+    with ExitStack() as writers:
+        writers.enter_context(metrics_writer)
+        frame_writer: Optional["BufferedWriter"] = None
+        stream_writer: Optional["BufferedWriter"] = None
+        if frame_aggregator != None:
+            frame_writer = writers.enter_context(open_metrics_file(os.path.join(os.path.dirname(filename), "network_frames" + OUTPUT_EXTENSIONS[output_format]), output_format, FRAME_COLUMNS, flush_policy=flush_policy))
+            stream_writer = writers.enter_context(open_metrics_file(os.path.join(os.path.dirname(filename), "network_streams" + OUTPUT_EXTENSIONS[output_format]), output_format, STREAM_COLUMNS, flush_policy=flush_policy))
+        live_writer: Optional["BufferedWriter"] = None
+        if live_metrics != None:
+            live_writer = writers.enter_context(open_metrics_file(os.path.join(os.path.dirname(filename), "network_live" + OUTPUT_EXTENSIONS[output_format]), output_format, LIVE_NETWORK_COLUMNS, flush_policy=flush_policy))
+
+        for columns in drain_chunks(packet_store, zoom_meeting_check, chunk_size, timeout):
+            frames: Optional[List["FrameRow"]] = None
+            if frame_writer != None:
+                frames = frame_aggregator.add_columns(columns)
+                evicted_streams = frame_aggregator.evict_silent_streams(frames)
+                write_frames(frames)
+                write_streams(evicted_streams)
+            if live_writer != None:
+                live_rows = live_metrics.add_columns(columns, frames)
+                # the binary format keeps the times in seconds since the epoch
+                live_writer.writerows(live_rows if output_format == OutputFormat.BINARY else get_live_rows(live_rows, time_format))
+            if output_format == OutputFormat.BINARY:
+                metrics_writer.write_columns(columns._asdict())
                 continue
-            packet: "ZoomPacket" = received_object
-            # print(packet.time)
-            metrics = NetworkMetrics(
-                    frame_sequence_number = packet.frame_sequence,
-                    packet_time = packet.time.get_datetime(),
-                    packet_size = packet.size,
-                    expected_number_of_packets= packet.number_of_packets_per_frame,
-                    is_fec = packet.video_packet_type == RTPWrapper.FEC,
-                    ssrc_identifier=packet.ssrc_identifier,
-            )
-
-            if start_time == None:
-                start_time = packet.time.get_datetime()
-                csv_writer.writerow(metrics.__dict__.keys())
-            csv_writer.writerow(metrics.__dict__.values())
+            if not has_header:
+                has_header = True
+                metrics_writer.writerow([field.name for field in fields(NetworkMetrics)])
+            metrics_writer.writerows(get_metric_rows(columns, time_format))
+        if frame_writer != None:
+            write_frames(frame_aggregator.flush())
+            write_streams(frame_aggregator.summarize())
+    return metrics_writer.stats
 
 # def write_metrics(filename: str, sink: QueueSink, zoom_meeting_check) -> None:
 #     """
@@ -132,98 +390,157 @@ def write_metrics(filename: str, sink: QueueSink, zoom_meeting_check) -> None:
 #                 csv_writer.writerow(metrics.__dict__.keys())
 #             csv_writer.writerow(metrics.__dict__.values())
 
-def get_zoom_packet(packet: Packet) -> Union[ZoomPacket,SpecialQueueValues]:
+def parse_zoom_packet(packet: Packet, local_ip_address: Optional[bytes] = None) -> "ZoomPacketRecord":
     """
     Param packet: scapy.Packet that has been filtered through
-    Returns ZoomPacket if it's a valid ZoomPacket and SpecialQueueValues.NON_ZOOM_PACKET
+    Param local_ip_address: the IPv4 address the packet must be sent to (see ip_address_to_bytes), None to accept any
+    Returns ZoomPacketRecord, throws PacketException if it's not a valid Zoom packet
     """
-    
-    try:
-        return ZoomPacket.parse(packet)
-    except PacketException:
-        return SpecialQueueValues.NON_ZOOM_PACKET
+    data: bytes = packet.original if packet.original != None else raw(packet)
+    ip_offset = get_ip_offset(data, isinstance(packet, Ether))
+    return parse_raw_packet(data, float(packet.time), local_ip_address, ip_offset)
 
-def group_by_frames(csv_filename: str, log_queue) -> Dict[bytes, List["NetworkMetrics"]]:
+def read_packet_columns(filename: str) -> "PacketColumns":
     """
-    Param: csv_filename is the name of the file to read the metrics from
-    Param: log_queue is mp.Queue that contains a string with log information or SpecialQueueValue
+    Param: filename is a network metrics file, CSV or BINARY
+
+    Returns every packet of the file in a single PacketColumns
     """
+    if not is_columnar_file(filename):
+        return concatenate_packet_columns(list(read_packet_chunks(filename)))
+    columns = read_columnar(filename).columns
+    return PacketColumns(**{name: columns[name] for name in PacketColumns._fields})
 
-    log_queue.put(f"started {__name__}.{group_by_frames.__name__}")
-    output: Dict[bytes, List["NetworkMetrics"]] = defaultdict(list)
-    started = False
-    with open(csv_filename) as csv_file:
-        csvreader = csv.reader(csv_file)
-        for row in csvreader:
-            if not started:
-                started = True
-                continue
-            
-            # account for 0 microsecond case
-            try: 
-                network_metrics = NetworkMetrics(
-                    frame_sequence_number=bytes(row[0][2:], 'utf-8'),
-                    packet_time=datetime.strptime(row[1], get_timeformat(row[1])),
-                    packet_size=int(row[2]),
-                    expected_number_of_packets=int(row[3]),
-                    is_fec=row[4] == "True"
-                )
-                output[network_metrics.frame_sequence_number].append(network_metrics)
-            except ValueError:
+def read_packet_chunks(filename: str, chunk_size: int = 4096) -> Iterator["PacketColumns"]:
+    """
+    Param: filename is a network metrics file, CSV or BINARY
+
+    Yields the packets of the file in chunks, in the order they were written
+    """
+    if is_columnar_file(filename):
+        for chunk in iter_chunks(filename):
+            yield PacketColumns(**{name: chunk[name] for name in PacketColumns._fields})
+        return
+
+    rows: List[tuple] = []
+    with open(filename) as csv_file:
+        csv_reader = csv.reader(csv_file)
+        next(csv_reader, None) # header
+        for row in csv_reader:
+            try:
+                rows.append((
+                    # the middle of the microsecond, so truncating to microseconds gives it back
+                    parse_time(row[1]).timestamp() + 0.5e-6,
+                    int.from_bytes(ast.literal_eval(row[0]), byteorder='big'),
+                    int(row[2]),
+                    int(row[3]),
+                    row[4] == "True",
+                    # files written before the SSRC was recorded have 5 columns
+                    int(row[5]) if len(row) > 5 else 0,
+                ))
+            except (ValueError, SyntaxError, IndexError, TypeError):
                 continue
-    
-    log_queue.put(f"finsihed {__name__}.{group_by_frames.__name__}")
-    return output
+            if len(rows) >= chunk_size:
+                yield get_packet_columns(rows)
+                rows = []
+    if len(rows) > 0:
+        yield get_packet_columns(rows)
+
+def get_packet_columns(rows: List[tuple]) -> "PacketColumns":
+    """
+    Param: rows is (timestamp, frame sequence, packet size, expected number of packets, is FEC, SSRC) of each packet
+    """
+    timestamp, frame_sequence, packet_size, expected_number_of_packets, is_fec, ssrc_identifier = zip(*rows)
+    return PacketColumns(
+        timestamp=np.array(timestamp, dtype=np.float64),
+        frame_sequence=np.array(frame_sequence, dtype=np.uint16),
+        packet_size=np.array(packet_size, dtype=np.uint32),
+        expected_number_of_packets=np.array(expected_number_of_packets, dtype=np.uint8),
+        is_fec=np.array(is_fec, dtype=np.bool_),
+        ssrc_identifier=np.array(ssrc_identifier, dtype=np.uint32),
+        media_type=np.zeros(len(rows), dtype=np.uint8), # not in network.csv
+    )
 
-def graph_metrics(graph_dir: str, csv_filename: str, log_queue) -> None:
+def read_network_statistics(filename: str, log_queue) -> "NetworkStatistics":
+    """
+    Param: filename is the name of the file to read the metrics from, CSV or BINARY
+    Param: log_queue is mp.Queue that contains a string with log information or SpecialQueueValue
+
+    Returns the frames, the per frame statistics of each stream by SSRC and
+    the summary of each stream (see network_statistics)
+    """
+    log_queue.put(f"started {__name__}.{read_network_statistics.__name__}")
+    start_time = time.perf_counter()
+    columns = read_packet_columns(filename)
+    read_seconds = time.perf_counter() - start_time
+    network_statistics = compute_network_statistics(columns)
+    log_queue.put(
+        f"finished {__name__}.{read_network_statistics.__name__}, {len(network_statistics.streams)} streams, "
+        f"{len(network_statistics.frames.ssrc_identifier)} frames, {len(columns.timestamp)} packets, "
+        f"read in {read_seconds:.2f}s, computed in {time.perf_counter() - start_time - read_seconds:.2f}s"
+    )
+    return network_statistics
+
+# the figures of graph_metrics: the x and y of a stream from its FrameStatistics, title, x label, y label, image name and grid
+NETWORK_FIGURES = [
+    (lambda stats: (stats.times, stats.sizes),
+        "Timeline of Packets Sent per Frame", "Unix Time", "Packet Size (bytes)", "timeline", True),
+    (lambda stats: (stats.time_packet_end, stats.time_withinpacket),
+        "Time Difference Between First and Last Packet Per Frame", "Unix Time of First Packet Per Frame", "Duration of Time Within Packet (s)", "within_frame", False),
+    (lambda stats: (stats.time_packet_end[1:], stats.time_betweenpacket),
+        "Time Difference Between Frames", "Unix Time of First Packet Per Frame", "Duration of Time Sent Between Frames (s)", "between_frame", True),
+    (lambda stats: (stats.time_packet_end, stats.num_packets_per_frame),
+        "Number of Packets Per Frame", "Unix Time of First Packet Per Frame", "Number of Packets Per Frame", "num_packets", False),
+    (lambda stats: (stats.time_packet_end, stats.num_fecs),
+        "Number of FEC Packets Per Frame", "Time of Last Packet Per Frame", "Number of FEC Packet", "num_fecs", False),
+    (lambda stats: (stats.time_packet_end, stats.num_compared_to_expected),
+        "Difference between expected number of packets and packets received", "Time of Last Packet Per Frame", "Difference", "num_packet_difference", False),
+]
+
+def render_network_graphs(graph_dir: str, network_statistics: "NetworkStatistics", graph_config: "GraphConfig" = GraphConfig()) -> int:
+    """
+    Param: graph_dir is the directory where to store the graph outputs
+    Param: network_statistics is the statistics graphed (see read_network_statistics)
+    Param: graph_config is how the graphs are rendered, in GraphRenderMode.DECIMATED
+
+    Draws the figures of graph_metrics with each stream decimated to the pixel
+    width, in parallel processes, and report.html with ReportFormat.HTML.
+    Returns the number of points drawn.
+    """
+    figure_specs = []
+    for get_series, title, xlabel, ylabel, image_name, grid in NETWORK_FIGURES:
+        series = []
+        for ssrc_identifier, frame_statistics in network_statistics.streams.items():
+            x, y = get_series(frame_statistics)
+            kept = decimate(x, y, graph_config.figure_width, graph_config.decimation)
+            series.append(Series(f"SSRC {ssrc_identifier}", to_local_datetimes(x[kept]), y[kept]))
+        figure_specs.append(FigureSpec(image_name, title, xlabel, ylabel, series, grid))
+    svgs = render_figures(figure_specs, graph_dir, graph_config)
+    if graph_config.report_format == ReportFormat.HTML:
+        write_html_report(os.path.join(graph_dir, "report.html"), "Network metrics", svgs, [summary._asdict() for summary in network_statistics.summaries])
+    return sum(len(series.x) for figure_spec in figure_specs for series in figure_spec.series)
+
+def graph_metrics(graph_dir: str, csv_filename: str, log_queue, graph_config: "GraphConfig" = GraphConfig()) -> None:
     """
     Param: graph_dir is the directory where to store the graph outputs
     Param: csv_filename is the name of the file to read the metrics from
     Param: log_queue is mp.Queue that contains a string with log information or SpecialQueueValue
+    Param: graph_config is how the graphs are rendered, GraphRenderMode.DECIMATED draws each series
+        decimated to the pixel width, so it takes about as long for any length of call
     """
 
     log_queue.put(f"started  {__name__}.{graph_metrics.__name__}")
-    metric_output_by_frame = group_by_frames(csv_filename, log_queue)
-
-    # get the time and size
-    times: List[datetime] = []
-    sizes: List[int] = []
-
-    # get interpacket time difference
-    # get time difference between packets of different frames
-    # get the number of packets per frame
-    time_withinpacket: List[float] = []
-    time_betweenpacket: List[float] = []
-    num_packets_per_frame: List[int] = []
-    time_packet_end: List[datetime] = []
-    
-    # get the number of packets that are type FEC
-    # get the difference between the expected and actual number of packets
-    num_fecs: List[int] = []
-    num_compared_to_expected: List[int] = []
-
-    for frame in metric_output_by_frame:
-        metrics: List["NetworkMetrics"] = metric_output_by_frame[frame]
-        if len(metrics) == 0:
-            continue
-        num_packets: int = len(metrics)
-        num_packets_per_frame.append(num_packets)
-
-        # when added to metrics_output should be in chronological order
-        packet_times = [metric.packet_time for metric in metrics]
-        time_packet_end.append(packet_times[-1])
-        time_withinpacket.append((packet_times[-1] - packet_times[0]).total_seconds())
-        if len(times) > 0:
-            time_betweenpacket.append((packet_times[0] - times[-1]).total_seconds())
-        times += packet_times
-        sizes += [metric.packet_size for metric in metrics]
-
-        num_fecs.append(sum([1 if metric.is_fec else 0 for metric in metrics]))
-        compared_to_expected = metrics[0].expected_number_of_packets - num_packets
-        num_compared_to_expected.append(compared_to_expected)
-        
-        # if num_compared_to_expected[-1] >= 10:
-        #     print(frame)
+    # a series per stream (SSRC), so the frames of the participants are not mixed
+    network_statistics = read_network_statistics(csv_filename, log_queue)
+    stream_statistics = network_statistics.streams
+    start_time = time.perf_counter()
+
+    if graph_config.render_mode == GraphRenderMode.DECIMATED:
+        num_points = render_network_graphs(graph_dir, network_statistics, graph_config)
+        log_queue.put(f"in {__name__}.{graph_metrics.__name__}, rendered {len(NETWORK_FIGURES)} figures, {num_points} points drawn, in {time.perf_counter() - start_time:.2f}s")
+        log_queue.put(f"finished {__name__}.{graph_metrics.__name__}")
+        log_queue.put(SpecialQueueValues.FINISH)
+        return
 
     # start plotting
 
@@ -236,74 +553,26 @@ def graph_metrics(graph_dir: str, csv_filename: str, log_queue) -> None:
     plt.rc("ytick", labelsize=SMALL_SIZE)  # fontsize of the tick labels
 
     fig_width = 200
-    fig, ax = plt.subplots(figsize=(fig_width, 80))
-
-    ax.plot_date(times, sizes, ms=30)
-    ax.grid(True, color='r')
-    ax.set_title("Timeline of Packets Sent per Frame")
-    ax.set_xlabel("Unix Time")
-    ax.set_ylabel("Packet Size (bytes)")
-
-    image_filename = (
-        graph_dir + "/timeline.png"
-    )
-    fig.savefig(image_filename)
-
-    fig, ax = plt.subplots(figsize=(fig_width, 80))
-    ax.plot_date(time_packet_end, time_withinpacket, ms=30)
-    ax.set_title("Time Difference Between First and Last Packet Per Frame")
-    ax.set_xlabel("Unix Time of First Packet Per Frame")
-    ax.set_ylabel("Duration of Time Within Packet (s)")
-
-    image_filename = (
-        graph_dir + "/within_frame.png"
-    )
-    fig.savefig(image_filename)
-
-    fig, ax = plt.subplots(figsize=(fig_width, 80))
-    ax.grid(True, color='r')
-    ax.plot_date(time_packet_end[1:], time_betweenpacket, ms=30)
-    ax.set_title("Time Difference Between Frames")
-    ax.set_xlabel("Unix Time of First Packet Per Frame")
-    ax.set_ylabel("Duration of Time Sent Between Frames (s)")
-
-    image_filename = (
-        graph_dir + "/between_frame.png"
-    )
-    fig.savefig(image_filename)
-
-    fig, ax = plt.subplots(figsize=(fig_width, 80))
-    ax.plot_date(time_packet_end, num_packets_per_frame, ms=30)
-    ax.set_title("Number of Packets Per Frame")
-    ax.set_xlabel("Unix Time of First Packet Per Frame")
-    ax.set_ylabel("Number of Packets Per Frame")
-
-    image_filename = (
-        graph_dir + "/num_packets.png"
-    )
-    fig.savefig(image_filename)
-
-    fig, ax = plt.subplots(figsize=(fig_width, 80))
-    ax.plot_date(time_packet_end, num_fecs, ms=30)
-    ax.set_title("Number of FEC Packets Per Frame")
-    ax.set_xlabel("Time of Last Packet Per Frame")
-    ax.set_ylabel("Number of FEC Packet")
 
-    image_filename = (
-        graph_dir + "/num_fecs.png"
-    )
-    fig.savefig(image_filename)
-
-    fig, ax = plt.subplots(figsize=(fig_width, 80))
-    ax.plot_date(time_packet_end, num_compared_to_expected, ms=30)
-    ax.set_title("Difference between expected number of packets and packets received")
-    ax.set_xlabel("Time of Last Packet Per Frame")
-    ax.set_ylabel("Difference")
-
-    image_filename = (
-        graph_dir + "/num_packet_difference.png"
-    )
-    fig.savefig(image_filename)
+    for get_series, title, xlabel, ylabel, image_name, grid in NETWORK_FIGURES:
+        fig, ax = plt.subplots(figsize=(fig_width, 80))
+        for ssrc_identifier, frame_statistics in stream_statistics.items():
+            x, y = get_series(frame_statistics)
+            ax.plot_date(to_local_datetimes(x), y, ms=30, label=f"SSRC {ssrc_identifier}")
+        if grid:
+            ax.grid(True, color='r')
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        # past a few dozen streams the legend would hide the graph
+        if 0 < len(stream_statistics) <= 24:
+            ax.legend()
+
+        image_filename = (
+            graph_dir + "/" + image_name + ".png"
+        )
+        fig.savefig(image_filename)
+        plt.close(fig)
     log_queue.put(f"finished {__name__}.{graph_metrics.__name__}")
     log_queue.put(SpecialQueueValues.FINISH)
 
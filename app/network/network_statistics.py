@@ -0,0 +1,245 @@
+import numpy as np
+
+from datetime import datetime
+from typing import Dict, List, NamedTuple
+
+from app.network.frame_aggregator import SEQUENCE_MODULO, StreamSummary
+from app.network.network_metrics import FrameStatistics
+from app.network.packet_store import PacketColumns
+
+"""
+Statistics of the packets and frames of a call from the columns of its
+packets (see PacketColumns), computed with grouped NumPy reductions instead of
+a Python loop per packet or frame. The packets are sorted by stream (SSRC) and
+frame, and each frame or stream is a contiguous run reduced with
+np.add.reduceat and friends. Separate from the graphs of
+network_run.graph_metrics, so the statistics can be used on their own.
+
+Unlike FrameAggregator, which only sees the packets so far, every packet of a
+frame is counted in it however late it arrived.
+"""
+
+# frames further apart than this are a restart of the stream, not skipped frames (as FrameAggregator)
+MAX_MISORDER = 100
+
+
+class FrameColumns(NamedTuple):
+    """
+    The frames of a call, one NDArray per field of FrameRow, by stream and then first packet
+    """
+    ssrc_identifier: np.ndarray # uint32
+    frame_sequence: np.ndarray # int64 sequence without wrapping around, within the stream
+    first_time: np.ndarray # float64 seconds since the epoch of the first packet received
+    last_time: np.ndarray # float64 seconds since the epoch of the last packet received
+    num_packets: np.ndarray
+    expected_number_of_packets: np.ndarray # of the first packet received
+    num_fec_packets: np.ndarray
+    num_bytes: np.ndarray
+
+
+class NetworkStatistics(NamedTuple):
+    frames: "FrameColumns"
+    streams: Dict[int, "FrameStatistics"] # by SSRC
+    summaries: List["StreamSummary"] # in the order of streams
+
+
+def get_run_starts(*keys: np.ndarray) -> np.ndarray:
+    """
+    Param: keys are sorted together, of the same length
+
+    Returns the index where each run of equal keys starts
+    """
+    if len(keys[0]) == 0:
+        return np.empty(0, dtype=np.int64)
+    is_start = np.zeros(len(keys[0]), dtype=np.bool_)
+    is_start[0] = True
+    for key in keys:
+        is_start[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(is_start)
+
+
+def unwrap_sequences(stream_starts: np.ndarray, frame_sequence: np.ndarray) -> np.ndarray:
+    """
+    Param: stream_starts is where each stream starts (see get_run_starts), the packets of a stream in the order they arrived
+    Param: frame_sequence is the 16 bit sequence of each packet
+
+    Returns the sequences counted from the first packet of each stream without
+    wrapping around, each step from the packet before is taken as the shortest
+    one (see frame_aggregator.sequence_distance)
+    """
+    sequence = frame_sequence.astype(np.int64)
+    steps = np.empty_like(sequence)
+    steps[:1] = 0
+    steps[1:] = ((sequence[1:] - sequence[:-1] + SEQUENCE_MODULO//2) % SEQUENCE_MODULO) - SEQUENCE_MODULO//2
+    steps[stream_starts] = 0
+    unwrapped = np.cumsum(steps)
+    # back to the first sequence of each stream
+    stream_lengths = np.diff(np.append(stream_starts, len(sequence)))
+    return unwrapped - np.repeat(unwrapped[stream_starts] - sequence[stream_starts], stream_lengths)
+
+
+def group_frames(columns: "PacketColumns") -> "FrameColumns":
+    """
+    Returns the frames of the packets, the packets of a frame are the ones of
+    the same SSRC and frame sequence
+    """
+    # stable, so the packets of a stream stay in the order they arrived
+    by_stream = np.argsort(columns.ssrc_identifier, kind="stable")
+    ssrc_identifier = columns.ssrc_identifier[by_stream]
+    frame_sequence = unwrap_sequences(get_run_starts(ssrc_identifier), columns.frame_sequence[by_stream])
+    by_frame = np.lexsort((frame_sequence, ssrc_identifier))
+    order = by_stream[by_frame]
+    ssrc_identifier = ssrc_identifier[by_frame]
+    frame_sequence = frame_sequence[by_frame]
+
+    frame_starts = get_run_starts(ssrc_identifier, frame_sequence)
+    if len(frame_starts) == 0:
+        return FrameColumns(*[np.empty(0, dtype=np.int64)]*len(FrameColumns._fields))
+    timestamp = columns.timestamp[order]
+    frames = FrameColumns(
+        ssrc_identifier=ssrc_identifier[frame_starts],
+        frame_sequence=frame_sequence[frame_starts],
+        first_time=np.minimum.reduceat(timestamp, frame_starts),
+        last_time=np.maximum.reduceat(timestamp, frame_starts),
+        num_packets=np.diff(np.append(frame_starts, len(order))),
+        expected_number_of_packets=columns.expected_number_of_packets[order][frame_starts].astype(np.int64),
+        num_fec_packets=np.add.reduceat(columns.is_fec[order].astype(np.int64), frame_starts),
+        num_bytes=np.add.reduceat(columns.packet_size[order].astype(np.int64), frame_starts),
+    )
+    by_first_time = np.lexsort((frames.first_time, frames.ssrc_identifier))
+    return FrameColumns(*[values[by_first_time] for values in frames])
+
+
+def get_stream_statistics(columns: "PacketColumns", frames: "FrameColumns") -> Dict[int, "FrameStatistics"]:
+    """
+    Param: frames is the frames of columns (see group_frames)
+
+    Returns the per frame statistics graphed by graph_metrics, by SSRC
+    """
+    by_stream = np.argsort(columns.ssrc_identifier, kind="stable")
+    ssrc_identifier = columns.ssrc_identifier[by_stream]
+    packet_starts = get_run_starts(ssrc_identifier)
+    frame_starts = get_run_starts(frames.ssrc_identifier)
+
+    time_within_frame = frames.last_time - frames.first_time
+    # from the last packet of the frame before, the first frame of each stream has none
+    time_between_frames = frames.first_time[1:] - frames.last_time[:-1]
+    is_same_stream = np.ones(len(time_between_frames), dtype=np.bool_)
+    is_same_stream[frame_starts[1:] - 1] = False
+    num_compared_to_expected = frames.expected_number_of_packets - frames.num_packets
+
+    def split(values: np.ndarray, starts: np.ndarray) -> List[np.ndarray]:
+        return np.split(values, starts[1:])
+
+    streams: Dict[int, "FrameStatistics"] = {}
+    for (ssrc, times, sizes, within, packets_per_frame, end_times, num_fecs, compared, between) in zip(
+            ssrc_identifier[packet_starts].tolist(),
+            split(columns.timestamp[by_stream], packet_starts),
+            split(columns.packet_size[by_stream], packet_starts),
+            split(time_within_frame, frame_starts),
+            split(frames.num_packets, frame_starts),
+            split(frames.last_time, frame_starts),
+            split(frames.num_fec_packets, frame_starts),
+            split(num_compared_to_expected, frame_starts),
+            split(time_between_frames[is_same_stream], frame_starts - np.arange(len(frame_starts)))):
+        streams[ssrc] = FrameStatistics(
+            times=times,
+            sizes=sizes,
+            time_withinpacket=within,
+            time_betweenpacket=between,
+            num_packets_per_frame=packets_per_frame,
+            time_packet_end=end_times,
+            num_fecs=num_fecs,
+            num_compared_to_expected=compared,
+        )
+    return streams
+
+
+def summarize_streams(columns: "PacketColumns", frames: "FrameColumns") -> List["StreamSummary"]:
+    """
+    Param: frames is the frames of columns (see group_frames)
+
+    Returns the summary of each stream, as FrameAggregator.summarize
+    """
+    if len(frames.ssrc_identifier) == 0:
+        return []
+    ssrc_identifiers, stream_index = np.unique(columns.ssrc_identifier, return_inverse=True)
+    num_streams = len(ssrc_identifiers)
+    frame_stream_index = np.searchsorted(ssrc_identifiers, frames.ssrc_identifier)
+
+    def sum_by_stream(index: np.ndarray, values: np.ndarray) -> np.ndarray:
+        return np.bincount(index, weights=values, minlength=num_streams)
+
+    num_frames = np.bincount(frame_stream_index, minlength=num_streams)
+    num_expected_packets = sum_by_stream(frame_stream_index, np.maximum(frames.expected_number_of_packets, frames.num_packets))
+    num_missing_packets = sum_by_stream(frame_stream_index, np.maximum(frames.expected_number_of_packets - frames.num_packets, 0))
+
+    # skipped frame sequences, by sequence rather than by first packet
+    by_sequence = np.lexsort((frames.frame_sequence, frame_stream_index))
+    sequence_steps = np.diff(frames.frame_sequence[by_sequence])
+    is_skip = (frame_stream_index[by_sequence][1:] == frame_stream_index[by_sequence][:-1]) & (sequence_steps > 1) & (sequence_steps < MAX_MISORDER)
+    num_missing_frames = sum_by_stream(frame_stream_index[by_sequence][1:][is_skip], sequence_steps[is_skip] - 1)
+
+    frame_gaps = frames.first_time[1:] - frames.last_time[:-1]
+    is_same_stream = frame_stream_index[1:] == frame_stream_index[:-1]
+    gap_stream_index = frame_stream_index[1:][is_same_stream]
+    num_frame_gaps = np.bincount(gap_stream_index, minlength=num_streams)
+    frame_gap_sum = sum_by_stream(gap_stream_index, frame_gaps[is_same_stream])
+    max_frame_gap = np.zeros(num_streams)
+    np.maximum.at(max_frame_gap, gap_stream_index, frame_gaps[is_same_stream])
+
+    num_packets = np.bincount(stream_index, minlength=num_streams)
+    num_fec_packets = sum_by_stream(stream_index, columns.is_fec.astype(np.float64))
+    first_time = np.full(num_streams, np.inf)
+    np.minimum.at(first_time, stream_index, columns.timestamp)
+    last_time = np.full(num_streams, -np.inf)
+    np.maximum.at(last_time, stream_index, columns.timestamp)
+    num_bytes = sum_by_stream(stream_index, columns.packet_size.astype(np.float64))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # a skipped frame is counted as at least one packet lost
+        loss_ratio = np.where(num_expected_packets + num_missing_frames > 0, (num_missing_packets + num_missing_frames)/(num_expected_packets + num_missing_frames), 0.0)
+        fec_ratio = np.where(num_packets > 0, num_fec_packets/num_packets, 0.0)
+        mean_frame_gap = np.where(num_frame_gaps > 0, frame_gap_sum/num_frame_gaps, 0.0)
+    return [StreamSummary(*stream) for stream in zip(
+        ssrc_identifiers.tolist(),
+        first_time.tolist(),
+        last_time.tolist(),
+        num_packets.tolist(),
+        num_bytes.astype(np.int64).tolist(),
+        num_frames.tolist(),
+        num_missing_frames.astype(np.int64).tolist(),
+        num_missing_packets.astype(np.int64).tolist(),
+        [0]*num_streams, # no packet is late once the call is over
+        num_fec_packets.astype(np.int64).tolist(),
+        loss_ratio.tolist(),
+        fec_ratio.tolist(),
+        mean_frame_gap.tolist(),
+        max_frame_gap.tolist(),
+    )]
+
+
+def compute_network_statistics(columns: "PacketColumns") -> "NetworkStatistics":
+    """
+    Returns the frames, the per frame statistics and the summary of each stream of the packets
+    """
+    frames = group_frames(columns)
+    return NetworkStatistics(
+        frames=frames,
+        streams=get_stream_statistics(columns, frames),
+        summaries=summarize_streams(columns, frames),
+    )
+
+
+def to_local_datetimes(timestamps: np.ndarray) -> np.ndarray:
+    """
+    Param: timestamps is float64 seconds since the epoch
+
+    Returns the local times as datetime64[us], truncated to microseconds like
+    PacketTime, with the UTC offset of the first of them
+    """
+    microseconds = np.floor(np.asarray(timestamps, dtype=np.float64) * 10**6).astype(np.int64)
+    if len(microseconds) == 0:
+        return microseconds.astype("datetime64[us]")
+    utc_offset = datetime.fromtimestamp(microseconds[0] / 10**6).astimezone().utcoffset()
+    return (microseconds + round(utc_offset.total_seconds() * 10**6)).astype("datetime64[us]")
@@ -0,0 +1,161 @@
+import numpy as np
+import threading
+
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from app.network.parsing.packet_constants import RTPWrapper
+from app.network.parsing.raw_packet import ZoomPacketRecord
+
+
+class PacketColumns(NamedTuple):
+    """
+    A chunk of packets, one NDArray per field, in capture order
+    """
+    timestamp: np.ndarray # float64 seconds since the epoch
+    frame_sequence: np.ndarray # uint16
+    packet_size: np.ndarray # uint32 size of the UDP load
+    expected_number_of_packets: np.ndarray # uint8
+    is_fec: np.ndarray # bool
+    ssrc_identifier: np.ndarray # uint32
+    media_type: np.ndarray # uint8 ZoomMediaWrapper value
+
+PACKET_COLUMN_DTYPES: Dict[str, np.dtype] = {
+    "timestamp": np.dtype(np.float64),
+    "frame_sequence": np.dtype(np.uint16),
+    "packet_size": np.dtype(np.uint32),
+    "expected_number_of_packets": np.dtype(np.uint8),
+    "is_fec": np.dtype(np.bool_),
+    "ssrc_identifier": np.dtype(np.uint32),
+    "media_type": np.dtype(np.uint8),
+}
+
+
+def empty_packet_columns() -> "PacketColumns":
+    return PacketColumns(**{name: np.empty(0, dtype=dtype) for name, dtype in PACKET_COLUMN_DTYPES.items()})
+
+
+def concatenate_packet_columns(chunks: Sequence["PacketColumns"]) -> "PacketColumns":
+    """
+    Returns the packets of the chunks in a single PacketColumns, in order
+    """
+    if len(chunks) == 0:
+        return empty_packet_columns()
+    return PacketColumns(*[np.concatenate(values).astype(dtype, copy=False) for values, dtype in zip(zip(*chunks), PACKET_COLUMN_DTYPES.values())])
+
+
+class PacketStore:
+    """
+    PacketStore holds the parsed packets that have not been drained yet in
+    preallocated columns used as a ring buffer, so storing a packet does not
+    allocate and draining does not move the packets left. The columns double
+    when full and halve once the packets waiting fit in a quarter of them
+    (never below initial_capacity), so the memory used follows the packets
+    waiting, not the length of the call or its largest backlog.
+    Safe to fill and drain from different threads.
+    """
+    def __init__(self, initial_capacity: int = 4096) -> None:
+        self.__initial_capacity = initial_capacity
+        self.__columns: Dict[str, np.ndarray] = {name: np.empty(initial_capacity, dtype=dtype) for name, dtype in PACKET_COLUMN_DTYPES.items()}
+        self.__head = 0 # index of the oldest packet
+        self.__size = 0
+        self.__condition = threading.Condition()
+
+    def __len__(self) -> int:
+        return self.__size
+
+    @property
+    def capacity(self) -> int:
+        return len(self.__columns["timestamp"])
+
+    def __get_slices(self, start: int, num_rows: int) -> List[slice]:
+        # the at most 2 slices of the columns of num_rows rows from start, wrapping around
+        start %= self.capacity
+        end = start + num_rows
+        if end <= self.capacity:
+            return [slice(start, end)]
+        return [slice(start, self.capacity), slice(0, end - self.capacity)]
+
+    def __read(self, column: np.ndarray, num_rows: int) -> np.ndarray:
+        # a copy of the oldest num_rows rows of column
+        return np.concatenate([column[rows] for rows in self.__get_slices(self.__head, num_rows)])
+
+    def __resize(self, capacity: int) -> None:
+        for name, column in self.__columns.items():
+            resized = np.empty(capacity, dtype=column.dtype)
+            resized[:self.__size] = self.__read(column, self.__size)
+            self.__columns[name] = resized
+        self.__head = 0
+
+    def __reserve(self, size: int) -> None:
+        if size <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        self.__resize(capacity)
+
+    def append(self, record: "ZoomPacketRecord") -> None:
+        with self.__condition:
+            self.__reserve(self.__size + 1)
+            i = (self.__head + self.__size) % self.capacity
+            columns = self.__columns
+            columns["timestamp"][i] = record.timestamp
+            columns["frame_sequence"][i] = (record.frame_sequence[0] << 8) | record.frame_sequence[1]
+            columns["packet_size"][i] = record.size
+            columns["expected_number_of_packets"][i] = record.number_of_packets_per_frame
+            columns["is_fec"][i] = record.video_packet_type == RTPWrapper.FEC
+            columns["ssrc_identifier"][i] = record.ssrc_identifier
+            columns["media_type"][i] = record.media_type
+            self.__size += 1
+            self.__condition.notify()
+
+    def extend(self, records: Sequence["ZoomPacketRecord"]) -> None:
+        """
+        Stores a batch of parsed packets at once
+        """
+        if len(records) == 0:
+            return
+        fields = list(zip(*records))
+        self.extend_columns(PacketColumns(
+            timestamp=np.array(fields[0], dtype=np.float64),
+            frame_sequence=np.array([(sequence[0] << 8) | sequence[1] for sequence in fields[2]], dtype=np.uint16),
+            packet_size=np.array(fields[7], dtype=np.uint32),
+            expected_number_of_packets=np.array(fields[3], dtype=np.uint8),
+            is_fec=np.array(fields[5], dtype=np.uint8) == RTPWrapper.FEC,
+            ssrc_identifier=np.array(fields[6], dtype=np.uint32),
+            media_type=np.array(fields[4], dtype=np.uint8),
+        ))
+
+    def extend_columns(self, columns: "PacketColumns") -> None:
+        """
+        Stores a chunk of packets that are already in columns
+        """
+        num_rows = len(columns.timestamp)
+        with self.__condition:
+            self.__reserve(self.__size + num_rows)
+            start = 0
+            for rows in self.__get_slices(self.__head + self.__size, num_rows):
+                end = start + rows.stop - rows.start
+                for name, values in columns._asdict().items():
+                    self.__columns[name][rows] = values[start:end]
+                start = end
+            self.__size += num_rows
+            self.__condition.notify()
+
+    def drain(self, max_rows: Optional[int] = None, timeout: Optional[float] = None) -> "PacketColumns":
+        """
+        Param: max_rows is the most packets returned, None for all of them
+        Param: timeout is how long to wait in seconds if there are no packets, None to not wait
+
+        Removes and returns the oldest packets, the chunk is empty if there are none
+        """
+        with self.__condition:
+            if self.__size == 0 and timeout != None:
+                self.__condition.wait(timeout)
+            num_rows = self.__size if max_rows == None else min(max_rows, self.__size)
+            chunk = PacketColumns(**{name: self.__read(column, num_rows) for name, column in self.__columns.items()})
+            self.__head = (self.__head + num_rows) % self.capacity
+            self.__size -= num_rows
+            if self.capacity > self.__initial_capacity and self.__size <= self.capacity // 4:
+                self.__resize(max(self.__initial_capacity, self.capacity // 2))
+            return chunk
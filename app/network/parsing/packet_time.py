@@ -1,5 +1,4 @@
-import datetime
-import time
+import math
 
 from app.common.data_time import DataTime
 
@@ -10,17 +9,17 @@ PacketTime represents the received time of the packet. This includes
 
 class PacketTime(DataTime):
     def __init__(self, seconds: float):
+        """
+        Param: seconds is the capture time since the epoch, as scapy gives it
+        """
+        super().__init__()
+        # truncated to the microsecond like the capture timestamps
+        self.__nanoseconds = math.floor(seconds * 10**6) * 1000
         self.__original_seconds = seconds
-        self.__second_precision = time.localtime(seconds)
-        self.__microseconds = int((seconds * 10**6) % 10**6)
 
     @property
-    def second_precision(self) -> time.struct_time:
-        return self.__second_precision
-
-    @property
-    def microseconds(self) -> int:
-        return self.__microseconds
+    def nanoseconds(self) -> int:
+        return self.__nanoseconds
     
     @property
     def original_seconds(self) -> float:
@@ -29,14 +28,11 @@ class PacketTime(DataTime):
     def __eq__(self, other) -> bool:
         return (
             type(other) == PacketTime
-            and other.second_precision == self.__second_precision
-            and other.microseconds == self.__microseconds
+            and other.nanoseconds == self.__nanoseconds
         )
 
     def __hash__(self) -> int:
-        return hash((self.__second_precision, self.__microseconds))
+        return hash(self.__nanoseconds)
 
     def __str__(self) -> str:
-        return time.strftime(
-            "%Y-%m-%d %H:%M:%S", self.__second_precision
-        ) + "." + str(self.__microseconds).zfill(6)
+        return self.get_datetime().strftime("%Y-%m-%d %H:%M:%S.%f")
@@ -0,0 +1,129 @@
+import socket
+
+from typing import NamedTuple, Optional
+
+from app.network.parsing.exceptions import PacketException
+from app.network.parsing.packet_constants import ExceptionCodes, RTPWrapper, ZoomMediaWrapper
+
+"""
+Fast path of ZoomPacket.parse that reads the fields straight from the bytes
+of the captured frame instead of the scapy layers
+"""
+
+ETHERNET_HEADER_LENGTH = 14
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+IP_PROTOCOL_UDP = 17
+UDP_HEADER_LENGTH = 8
+ZOOM_SERVER_PORT = 8801 # packets from the Zoom servers have 8 more bytes before the Zoom media header
+RTP_VERSION_2_FIRST_BYTE = 144 # version 2, no padding, extension, no CSRC
+
+# indexed by the byte value, True for the valid types
+IS_ZOOM_MEDIA_TYPE = tuple(value in set(media_type.value for media_type in ZoomMediaWrapper if media_type != ZoomMediaWrapper.INVALID) for value in range(256))
+IS_RTP_PAYLOAD_TYPE = tuple(value in set(payload_type.value for payload_type in RTPWrapper) for value in range(128))
+
+
+class ZoomPacketRecord(NamedTuple):
+    """
+    Fields of a UDP Zoom packet, with the same names as the ZoomPacket properties
+    """
+    timestamp: float # seconds since the epoch the packet was captured
+    src_port: int
+    frame_sequence: bytes
+    number_of_packets_per_frame: int
+    media_type: int # ZoomMediaWrapper value
+    video_packet_type: int # RTPWrapper value
+    ssrc_identifier: int
+    size: int # size of the UDP load
+
+
+def ip_address_to_bytes(ip_address: str) -> bytes:
+    return socket.inet_aton(ip_address)
+
+
+def get_ip_offset(data: bytes, is_ethernet: bool = True) -> int:
+    """
+    Param: data is the captured frame
+    Param: is_ethernet is whether the frame starts with an Ethernet header, otherwise it's an IP packet on its own or behind the 4 byte loopback header
+
+    Returns where the IPv4 header starts, raises PacketException if it's not IPv4
+    """
+    try:
+        if not is_ethernet:
+            return 0 if data[0] >> 4 == 4 else 4
+        ip_offset = ETHERNET_HEADER_LENGTH
+        ethertype = (data[12] << 8) | data[13]
+        if ethertype == ETHERTYPE_VLAN:
+            ip_offset += 4
+            ethertype = (data[16] << 8) | data[17]
+        if ethertype != ETHERTYPE_IPV4:
+            raise PacketException(ExceptionCodes.OTHER, "not an IPv4 packet")
+        return ip_offset
+    except IndexError as e:
+        raise PacketException(ExceptionCodes.NOT_ENOUGH_DATA, str(e))
+
+
+def get_destination_ip_address(data: bytes, ip_offset: int) -> bytes:
+    return bytes(data[ip_offset + 16:ip_offset + 20])
+
+
+def parse_raw_packet(data: bytes, timestamp: float, local_ip_address: Optional[bytes] = None, ip_offset: Optional[int] = None) -> "ZoomPacketRecord":
+    """
+    Param: data is the captured frame
+    Param: timestamp is the capture time in seconds since the epoch
+    Param: local_ip_address is the IPv4 address the packet must be sent to (see ip_address_to_bytes), None to accept any
+    Param: ip_offset is where the IP header starts, None for an Ethernet frame
+
+    Raises PacketException with the same ExceptionCodes as ZoomPacket.parse
+    """
+    try:
+        # Ethernet and IP layers
+        if ip_offset == None:
+            ip_offset = get_ip_offset(data)
+        version_and_length = data[ip_offset]
+        if version_and_length >> 4 != 4 or data[ip_offset + 9] != IP_PROTOCOL_UDP:
+            raise PacketException(ExceptionCodes.OTHER, "not a UDP packet")
+        if local_ip_address != None and data[ip_offset + 16:ip_offset + 20] != local_ip_address:
+            raise PacketException(ExceptionCodes.OTHER, "not the right destination")
+        ip_end = ip_offset + ((data[ip_offset + 2] << 8) | data[ip_offset + 3])
+
+        # UDP layer, the load ends with the IP packet (frames may be padded)
+        udp_offset = ip_offset + (version_and_length & 15) * 4
+        src_port = (data[udp_offset] << 8) | data[udp_offset + 1]
+        load_offset = udp_offset + UDP_HEADER_LENGTH
+        size = ip_end - load_offset
+        if size <= 0:
+            raise PacketException(ExceptionCodes.OTHER, "no UDP load")
+
+        # Zoom Media layer
+        zoom_offset = load_offset + 8 if src_port == ZOOM_SERVER_PORT else load_offset
+        if zoom_offset + 23 >= ip_end:
+            raise PacketException(ExceptionCodes.OTHER, "index out of range")
+        frame_sequence = bytes(data[zoom_offset + 21:zoom_offset + 23])
+        number_of_packets_per_frame = data[zoom_offset + 23]
+        media_type = data[zoom_offset]
+        if not IS_ZOOM_MEDIA_TYPE[media_type]:
+            raise PacketException(ExceptionCodes.INVALID_ZOOM_MEDIA_TYPE)
+
+        # RTP layer
+        rtp_offset = zoom_offset + 24
+        if rtp_offset >= ip_end:
+            raise PacketException(ExceptionCodes.OTHER, "index out of range")
+        if data[rtp_offset] != RTP_VERSION_2_FIRST_BYTE:
+            if zoom_offset + 28 >= ip_end:
+                raise PacketException(ExceptionCodes.OTHER, "index out of range")
+            rtp_offset += 4 if data[zoom_offset + 28] == RTP_VERSION_2_FIRST_BYTE else 2
+        if rtp_offset >= ip_end:
+            raise PacketException(ExceptionCodes.NOT_ENOUGH_DATA)
+        if data[rtp_offset] >> 6 != 2:
+            raise PacketException(ExceptionCodes.INVALID_RTP_VERSION)
+        if rtp_offset + 1 >= ip_end:
+            raise PacketException(ExceptionCodes.OTHER, "index out of range")
+        payload_type = data[rtp_offset + 1] & 127
+        if not IS_RTP_PAYLOAD_TYPE[payload_type]:
+            raise PacketException(ExceptionCodes.UNSUPPORTED_RTP_TYPE)
+        ssrc_identifier = int.from_bytes(data[rtp_offset + 8:min(rtp_offset + 12, ip_end)], byteorder='big', signed=False)
+
+        return ZoomPacketRecord(timestamp, src_port, frame_sequence, number_of_packets_per_frame, media_type, payload_type, ssrc_identifier, size)
+    except IndexError as e:
+        raise PacketException(ExceptionCodes.OTHER, str(e))
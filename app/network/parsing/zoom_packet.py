@@ -1,10 +1,20 @@
 from dataclasses import dataclass
+from functools import lru_cache
 from scapy.all import *
 from scapy.layers.inet import *
 
 from app.network.parsing.exceptions import PacketException
 from app.network.parsing.packet_time import PacketTime
-from app.network.parsing.packet_constants import contains_value, ExceptionCodes, RTPWrapper, ZoomMediaWrapper
+from app.network.parsing.packet_constants import ExceptionCodes, RTPWrapper, ZoomMediaWrapper
+from app.network.parsing.raw_packet import IS_RTP_PAYLOAD_TYPE, IS_ZOOM_MEDIA_TYPE
+
+
+@lru_cache(maxsize=1)
+def get_local_ip_address() -> str:
+    """
+    Returns the IP address of the capture interface, looked up once
+    """
+    return get_if_addr(conf.iface)
 
 
 @dataclass
@@ -40,25 +50,27 @@ class ZoomPacket:
 
         try:
             # UDP Layer
-            udp_layer: "UDPPacketHeader" = UDPPacketHeader(
-                time=PacketTime(float(packet[IP].time)),
-                src_ip_address=packet[IP].src,
-                dst_ip_address=packet[IP].dst,
-                src_port=packet[UDP].sport,
+            ip_layer = packet[IP]
+            udp_layer = packet[UDP]
+            udp_header: "UDPPacketHeader" = UDPPacketHeader(
+                time=PacketTime(float(ip_layer.time)),
+                src_ip_address=ip_layer.src,
+                dst_ip_address=ip_layer.dst,
+                src_port=udp_layer.sport,
             )
 
-            if packet[IP].dst != get_if_addr(conf.iface):
+            if ip_layer.dst != get_local_ip_address():
                 raise PacketException(ExceptionCodes.OTHER, "not the right destination")
 
             # Zoom Media Layer
-            load: bytes = packet[UDP].load
+            load: bytes = udp_layer.load
             zoom_packet_offset = 0
-            if udp_layer.src_port == 8801:
+            if udp_header.src_port == 8801:
                 zoom_packet_offset = 8
 
             frame_seq: bytes = load[21 + zoom_packet_offset: 23 + zoom_packet_offset]
             number_packets_per_frame: int = load[23 + zoom_packet_offset]
-            if not contains_value(ZoomMediaWrapper, load[zoom_packet_offset]):
+            if not IS_ZOOM_MEDIA_TYPE[load[zoom_packet_offset]]:
                 raise PacketException(ExceptionCodes.INVALID_ZOOM_MEDIA_TYPE)
             media_type: "ZoomMediaWrapper" = ZoomMediaWrapper(load[zoom_packet_offset])
 
@@ -86,7 +98,7 @@ class ZoomPacket:
 
             oct2: int = rtp_raw_bytes[1]
             payload_type_val: int = oct2 & 127
-            if not contains_value(RTPWrapper, payload_type_val):
+            if not IS_RTP_PAYLOAD_TYPE[payload_type_val]:
                 raise PacketException(ExceptionCodes.UNSUPPORTED_RTP_TYPE)
             payload_type: "RTPWrapper" = RTPWrapper(payload_type_val)
 
@@ -98,7 +110,7 @@ class ZoomPacket:
             # get unique identifier per participant
 
             return ZoomPacket(
-                udp_layer=udp_layer,
+                udp_layer=udp_header,
                 zoom_media_layer=zoom_media_layer,
                 rtp_layer=rtp_layer,
                 udp_load=load,
@@ -0,0 +1,200 @@
+import mmap
+import struct
+
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+"""
+Streaming reader of recorded captures (.pcap and .pcapng). The file is memory
+mapped and the packets are memoryview slices of it, nothing is copied or
+dissected, so they can be handed to parse_raw_packet directly.
+"""
+
+PCAP_MAGIC_MICROSECONDS = 0xa1b2c3d4
+PCAP_MAGIC_NANOSECONDS = 0xa1b23c4d
+PCAP_HEADER_LENGTH = 24
+PCAP_RECORD_HEADER_LENGTH = 16
+
+PCAPNG_SECTION_HEADER_BLOCK = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_INTERFACE_DESCRIPTION_BLOCK = 1
+PCAPNG_PACKET_BLOCK = 2 # obsolete, still written by old tools
+PCAPNG_ENHANCED_PACKET_BLOCK = 6
+PCAPNG_OPTION_END = 0
+PCAPNG_OPTION_TIMESTAMP_RESOLUTION = 9
+
+# where the IP header starts for each link type, None for Ethernet (see get_ip_offset)
+LINK_TYPE_IP_OFFSETS: Dict[int, Optional[int]] = {
+    0: 4, # BSD loopback
+    1: None, # Ethernet
+    12: 0, # raw IP
+    14: 0, # raw IP on OpenBSD
+    101: 0, # raw IP
+    108: 4, # OpenBSD loopback
+    113: 16, # Linux cooked capture
+}
+
+
+class PcapRecord(NamedTuple):
+    timestamp: float # seconds since the epoch
+    data: memoryview # the captured bytes, valid until the reader is closed
+    ip_offset: Optional[int] # where the IP header starts, None for Ethernet
+
+
+def get_link_ip_offset(link_type: int) -> Optional[int]:
+    if link_type not in LINK_TYPE_IP_OFFSETS:
+        raise ValueError(f"unsupported link type {link_type}")
+    return LINK_TYPE_IP_OFFSETS[link_type]
+
+
+class PcapInterface(NamedTuple):
+    ip_offset: Optional[int]
+    units_per_second: int # timestamps are in 1/units_per_second seconds
+
+
+class MmapPcapReader:
+    """
+    MmapPcapReader iterates the packets of a .pcap or .pcapng file. The
+    records can be read from any record offset, so a file can be split with
+    split and the chunks read in parallel by different processes.
+    """
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.__file = open(filename, "rb")
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__view = memoryview(self.__mmap)
+        self.size = len(self.__mmap)
+        if self.size < 4:
+            raise ValueError(f"{filename} is not a capture")
+
+        magic_little_endian = struct.unpack_from("<I", self.__mmap, 0)[0]
+        magic_big_endian = struct.unpack_from(">I", self.__mmap, 0)[0]
+        self.is_pcapng = magic_little_endian == PCAPNG_SECTION_HEADER_BLOCK
+        self.__interfaces: List["PcapInterface"] = []
+        if self.is_pcapng:
+            self.__endian = "<" if struct.unpack_from("<I", self.__mmap, 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            self.first_record_offset = 0
+            # the interfaces are described before the first packet
+            for block_type, offset, _ in self.__blocks(0, self.size):
+                if block_type == PCAPNG_INTERFACE_DESCRIPTION_BLOCK:
+                    self.__interfaces.append(self.__read_interface(offset))
+                elif block_type != PCAPNG_SECTION_HEADER_BLOCK:
+                    break
+        else:
+            for endian, magic in (("<", magic_little_endian), (">", magic_big_endian)):
+                if magic in (PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS):
+                    self.__endian = endian
+                    break
+            else:
+                raise ValueError(f"{filename} is not a capture")
+            link_type = struct.unpack_from(self.__endian + "I", self.__mmap, 20)[0] & 0xFFFF
+            units_per_second = 10**6 if magic == PCAP_MAGIC_MICROSECONDS else 10**9
+            self.__interfaces.append(PcapInterface(get_link_ip_offset(link_type), units_per_second))
+            self.first_record_offset = PCAP_HEADER_LENGTH
+
+    def __enter__(self) -> "MmapPcapReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        try:
+            self.__view.release()
+            self.__mmap.close()
+        except BufferError:
+            # records are still referenced, the file is unmapped once they are gone
+            pass
+        self.__file.close()
+
+    def __blocks(self, start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+        # (block type, offset, total length) of the pcapng blocks starting in [start, end)
+        header = struct.Struct(self.__endian + "II")
+        offset = start
+        while offset < end and offset + 12 <= self.size:
+            block_type, total_length = header.unpack_from(self.__mmap, offset)
+            if total_length < 12:
+                raise ValueError(f"corrupt block at {offset} of {self.filename}")
+            yield block_type, offset, total_length
+            offset += total_length
+
+    def __read_interface(self, offset: int) -> "PcapInterface":
+        link_type = struct.unpack_from(self.__endian + "H", self.__mmap, offset + 8)[0]
+        total_length = struct.unpack_from(self.__endian + "I", self.__mmap, offset + 4)[0]
+        units_per_second = 10**6
+        option_offset = offset + 16
+        while option_offset + 4 <= offset + total_length - 4:
+            code, length = struct.unpack_from(self.__endian + "HH", self.__mmap, option_offset)
+            if code == PCAPNG_OPTION_END:
+                break
+            if code == PCAPNG_OPTION_TIMESTAMP_RESOLUTION:
+                resolution = self.__mmap[option_offset + 4]
+                units_per_second = 2**(resolution & 0x7F) if resolution & 0x80 else 10**resolution
+            option_offset += 4 + (length + 3) // 4 * 4
+        return PcapInterface(get_link_ip_offset(link_type), units_per_second)
+
+    def __record_offsets(self, start: int, end: int) -> Iterator[int]:
+        if self.is_pcapng:
+            for _, offset, _ in self.__blocks(start, end):
+                yield offset
+            return
+        header = struct.Struct(self.__endian + "IIII")
+        offset = start
+        while offset < end and offset + PCAP_RECORD_HEADER_LENGTH <= self.size:
+            yield offset
+            offset += PCAP_RECORD_HEADER_LENGTH + header.unpack_from(self.__mmap, offset)[2]
+
+    def split(self, num_chunks: int) -> List[Tuple[int, int]]:
+        """
+        Param: num_chunks is the number of chunks wanted
+
+        Returns [start, end) byte ranges of about the same size that start on a
+        record, to read with records. Only the record headers are read.
+        """
+        chunk_size = max(1, (self.size - self.first_record_offset) // max(1, num_chunks))
+        boundaries = [self.first_record_offset]
+        for offset in self.__record_offsets(self.first_record_offset, self.size):
+            if offset - boundaries[-1] >= chunk_size and len(boundaries) < num_chunks:
+                boundaries.append(offset)
+        boundaries.append(self.size)
+        return list(zip(boundaries, boundaries[1:]))
+
+    def records(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator["PcapRecord"]:
+        """
+        Param: start is the offset of the first record, None for the first record of the file
+        Param: end is the offset the last record starts before, None for the end of the file
+
+        Yields the packets in the file order
+        """
+        start = self.first_record_offset if start == None else start
+        end = self.size if end == None else end
+        view = self.__view
+        if not self.is_pcapng:
+            header = struct.Struct(self.__endian + "IIII")
+            ip_offset, units_per_second = self.__interfaces[0]
+            offset = start
+            while offset < end and offset + PCAP_RECORD_HEADER_LENGTH <= self.size:
+                seconds, fraction, captured_length, _ = header.unpack_from(self.__mmap, offset)
+                data_offset = offset + PCAP_RECORD_HEADER_LENGTH
+                # integer division is correctly rounded, like the Decimal time of scapy
+                yield PcapRecord((seconds * units_per_second + fraction) / units_per_second, view[data_offset:data_offset + captured_length], ip_offset)
+                offset = data_offset + captured_length
+            return
+
+        enhanced_header = struct.Struct(self.__endian + "IIIII")
+        obsolete_header = struct.Struct(self.__endian + "HHIIII")
+        for block_type, offset, _ in self.__blocks(start, end):
+            if block_type == PCAPNG_ENHANCED_PACKET_BLOCK:
+                interface_id, timestamp_high, timestamp_low, captured_length, _ = enhanced_header.unpack_from(self.__mmap, offset + 8)
+                data_offset = offset + 28
+            elif block_type == PCAPNG_PACKET_BLOCK:
+                interface_id, _, timestamp_high, timestamp_low, captured_length, _ = obsolete_header.unpack_from(self.__mmap, offset + 8)
+                data_offset = offset + 28
+            else:
+                continue
+            if interface_id >= len(self.__interfaces):
+                raise ValueError(f"packet at {offset} of {self.filename} is on an interface described after the first packet")
+            ip_offset, units_per_second = self.__interfaces[interface_id]
+            yield PcapRecord(((timestamp_high << 32) | timestamp_low) / units_per_second, view[data_offset:data_offset + captured_length], ip_offset)
+
+    def __iter__(self) -> Iterator["PcapRecord"]:
+        return self.records()
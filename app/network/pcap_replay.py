@@ -0,0 +1,152 @@
+import argparse
+import socket
+import time
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.network.packet_store import PacketColumns, PacketStore
+from app.network.parsing.exceptions import PacketException
+from app.network.parsing.packet_constants import ExceptionCodes
+from app.network.parsing.raw_packet import ZOOM_SERVER_PORT, ZoomPacketRecord, get_destination_ip_address, get_ip_offset, parse_raw_packet
+from app.network.pcap_reader import MmapPcapReader, PcapRecord
+
+"""
+Reading recorded captures (.pcap or .pcapng) for the offline mode of network_run.pipeline_run
+"""
+
+
+def read_records(pcap_filenames: List[str], speed: Optional[float] = None) -> Iterator["PcapRecord"]:
+    """
+    Param: pcap_filenames is the captures, read one after the other
+    Param: speed is how much faster than recorded the packets are yielded (1 is real time), None for as fast as they are read
+
+    Yields the packets of the captures with their recorded time
+    """
+    first_packet_time: Optional[float] = None
+    start_time = time.monotonic()
+    for pcap_filename in pcap_filenames:
+        with MmapPcapReader(pcap_filename) as reader:
+            for record in reader:
+                if speed != None:
+                    if first_packet_time == None:
+                        first_packet_time = record.timestamp
+                    delay = start_time + (record.timestamp - first_packet_time)/speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                yield record
+
+
+def parse_record(record: "PcapRecord", local_ip_address: Optional[bytes] = None) -> "ZoomPacketRecord":
+    """
+    Param: local_ip_address is the IPv4 address the packet must be sent to (see ip_address_to_bytes), None to accept any
+
+    Returns ZoomPacketRecord, throws PacketException if it's not a valid Zoom packet
+    """
+    ip_offset = get_ip_offset(record.data) if record.ip_offset == None else record.ip_offset
+    return parse_raw_packet(record.data, record.timestamp, local_ip_address, ip_offset)
+
+
+def decode_chunk(pcap_filename: str, start: int, end: int, local_ip_address: Optional[bytes] = None) -> Tuple["PacketColumns", Dict["ExceptionCodes", int]]:
+    """
+    Param: pcap_filename is the capture
+    Param: start and end is a byte range of MmapPcapReader.split
+    Param: local_ip_address is the IPv4 address the packets must be sent to (see ip_address_to_bytes), None to accept any
+
+    Returns the Zoom packets of the chunk and the number of packets rejected for each reason
+    """
+    packet_store = PacketStore()
+    num_rejected: Dict["ExceptionCodes", int] = {code: 0 for code in ExceptionCodes}
+    batch: List["ZoomPacketRecord"] = []
+    with MmapPcapReader(pcap_filename) as reader:
+        for record in reader.records(start, end):
+            try:
+                batch.append(parse_record(record, local_ip_address))
+            except PacketException as e:
+                num_rejected[e.code] += 1
+            if len(batch) >= 4096:
+                packet_store.extend(batch)
+                batch = []
+    packet_store.extend(batch)
+    return packet_store.drain(), num_rejected
+
+
+def decode_pcap_file(pcap_filename: str, local_ip_address: Optional[bytes] = None, num_processes: int = 1) -> Tuple["PacketColumns", Dict["ExceptionCodes", int]]:
+    """
+    Param: pcap_filename is the capture
+    Param: local_ip_address is the IPv4 address the packets must be sent to (see ip_address_to_bytes), None to accept any
+    Param: num_processes is the number of processes the file is split between
+
+    Returns the Zoom packets of the capture in the file order and the number of packets rejected for each reason
+    """
+    with MmapPcapReader(pcap_filename) as reader:
+        chunks = reader.split(num_processes)
+    if num_processes <= 1:
+        results = [decode_chunk(pcap_filename, start, end, local_ip_address) for start, end in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=num_processes) as executor:
+            results = list(executor.map(decode_chunk, [pcap_filename]*len(chunks), [start for start, _ in chunks], [end for _, end in chunks], [local_ip_address]*len(chunks)))
+
+    packet_store = PacketStore()
+    num_rejected: Dict["ExceptionCodes", int] = {code: 0 for code in ExceptionCodes}
+    for columns, chunk_num_rejected in results:
+        packet_store.extend_columns(columns)
+        for code, count in chunk_num_rejected.items():
+            num_rejected[code] += count
+    return packet_store.drain(), num_rejected
+
+
+def infer_local_ip_address(pcap_filenames: List[str], max_packets: int = 10000) -> Optional[str]:
+    """
+    Param: pcap_filenames is the captures
+    Param: max_packets is the number of packets looked at
+
+    Returns the most common destination of the Zoom packets at the start of the
+    captures, preferring packets sent by the Zoom servers, None if there are none
+    """
+    server_destinations: Counter = Counter()
+    destinations: Counter = Counter()
+    for record in islice(read_records(pcap_filenames), max_packets):
+        try:
+            ip_offset = get_ip_offset(record.data) if record.ip_offset == None else record.ip_offset
+            zoom_packet = parse_raw_packet(record.data, record.timestamp, None, ip_offset)
+        except PacketException:
+            continue
+        destination = get_destination_ip_address(record.data, ip_offset)
+        destinations[destination] += 1
+        if zoom_packet.src_port == ZOOM_SERVER_PORT:
+            server_destinations[destination] += 1
+    for counts in (server_destinations, destinations):
+        if len(counts) > 0:
+            return socket.inet_ntoa(counts.most_common(1)[0][0])
+    return None
+
+
+if __name__ == "__main__":
+    import multiprocessing as mp
+    import queue
+    import app.network.network_run as network
+    from app.common.constants import OutputFormat, TimeFormat
+    from app.common.rolling_window import RollingWindowConfig
+    from app.network.network_config import NetworkPipelineConfig
+
+    parser = argparse.ArgumentParser(description="Writes network.csv from recorded captures")
+    parser.add_argument("csv_filename")
+    parser.add_argument("pcap_filenames", nargs="+")
+    parser.add_argument("--speed", type=float, default=None, help="1 replays in real time, left out replays as fast as possible")
+    parser.add_argument("--local-ip-address", default=None, help="IP address the captures were recorded on, inferred if left out")
+    parser.add_argument("--time-format", choices=[time_format.value for time_format in TimeFormat], default=TimeFormat.DATETIME.value)
+    parser.add_argument("--output-format", choices=[output_format.value for output_format in OutputFormat], default=OutputFormat.CSV.value)
+    parser.add_argument("--frame-metrics", action="store_true", help="also write a row per frame to network_frames.csv and per stream to network_streams.csv")
+    parser.add_argument("--live-metrics", action="store_true", help="also write a row of rolling statistics every second to network_live.csv")
+    args = parser.parse_args()
+
+    log_queue: queue.Queue = queue.Queue()
+    pipeline_config = NetworkPipelineConfig(pcap_files=args.pcap_filenames, replay_speed=args.speed, local_ip_address=args.local_ip_address, time_format=TimeFormat(args.time_format), output_format=OutputFormat(args.output_format), frame_metrics=args.frame_metrics, rolling_window=RollingWindowConfig(enabled=args.live_metrics))
+    start_time = time.monotonic()
+    network.pipeline_run(args.csv_filename, log_queue, mp.Event(), pipeline_config)
+    while not log_queue.empty():
+        print(log_queue.get())
+    print(f"took {time.monotonic() - start_time:.2f} seconds")
@@ -0,0 +1,124 @@
+import argparse
+import logging
+
+# suppressing the scapy warnings!
+logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
+from scapy.all import PcapReader, sniff
+from scapy.arch.common import compile_filter
+
+from typing import Dict, List, Optional, Tuple
+
+from app.network.parsing.exceptions import PacketException
+from app.network.parsing.packet_constants import ZoomMediaWrapper
+from app.network.parsing.raw_packet import ZOOM_SERVER_PORT, UDP_HEADER_LENGTH, ip_address_to_bytes, parse_raw_packet
+
+"""
+BPF filter for the sniffer, so packets that can not be Zoom media are dropped
+by the kernel before they are copied to Python
+"""
+
+ZOOM_MEDIA_TYPES: List[int] = [media_type.value for media_type in ZoomMediaWrapper if media_type != ZoomMediaWrapper.INVALID]
+
+
+def media_type_filter(offset: int) -> str:
+    """
+    Param: offset is where the Zoom media header starts in the UDP load
+
+    Returns a filter matching packets with a Zoom media type byte at offset
+    """
+    media_type_byte = f"udp[{UDP_HEADER_LENGTH + offset}]"
+    return "(" + " or ".join(f"{media_type_byte} == {media_type}" for media_type in ZOOM_MEDIA_TYPES) + ")"
+
+
+def build_zoom_filter(local_ip_address: str, p2p_ports: Optional[List[int]] = None, check_media_type: bool = True) -> str:
+    """
+    Param: local_ip_address is the IP address of the capture interface
+    Param: p2p_ports is the source ports of peer to peer Zoom media, None for any port other than the Zoom server's
+    Param: check_media_type is whether the Zoom media type byte is checked as well as the ports
+
+    Returns the BPF filter expression for the Zoom media packets sent to local_ip_address
+    """
+    server_filter = f"udp src port {ZOOM_SERVER_PORT}"
+    if p2p_ports == None:
+        p2p_filter = f"not udp src port {ZOOM_SERVER_PORT}"
+    else:
+        p2p_filter = "(" + " or ".join(f"udp src port {port}" for port in p2p_ports) + ")"
+    if check_media_type:
+        # packets from the Zoom server have 8 more bytes before the Zoom media header
+        server_filter += " and " + media_type_filter(8)
+        p2p_filter += " and " + media_type_filter(0)
+    if p2p_ports != None and len(p2p_ports) == 0:
+        return f"udp and dst host {local_ip_address} and ({server_filter})"
+    return f"udp and dst host {local_ip_address} and (({server_filter}) or ({p2p_filter}))"
+
+
+def build_fallback_filter(local_ip_address: str) -> str:
+    """
+    Returns the filter of every UDP packet sent to local_ip_address, the
+    sniffer's filter before the Zoom ports and media types were checked
+    """
+    return f"udp and dst host {local_ip_address}"
+
+
+def get_sniff_filter(local_ip_address: str, p2p_ports: Optional[List[int]] = None, check_media_type: bool = True, iface=None) -> Tuple[str, Optional[str]]:
+    """
+    Param: iface is the capture interface the filter is compiled for, None for conf.iface
+
+    Returns the filter of build_zoom_filter, or build_fallback_filter if
+    libpcap can not compile it, and why it was not compiled, None if it was
+    """
+    bpf_filter = build_zoom_filter(local_ip_address, p2p_ports, check_media_type)
+    try:
+        compile_filter(bpf_filter, iface=iface)
+        return bpf_filter, None
+    except Exception as e:
+        return build_fallback_filter(local_ip_address), f"{type(e).__name__}: {e}"
+
+
+def is_zoom_packet(packet, local_ip_bytes: bytes) -> bool:
+    try:
+        parse_raw_packet(packet.original, float(packet.time), local_ip_bytes)
+        return True
+    except PacketException:
+        return False
+
+
+def check_filter(pcap_filename: str, bpf_filter: str, local_ip_address: str) -> Dict[str, int]:
+    """
+    Param: pcap_filename is a recorded capture
+    Param: bpf_filter is the filter to check
+    Param: local_ip_address is the IP address of the machine the capture was recorded on
+
+    Returns the number of packets, of Zoom packets (parsed by parse_raw_packet),
+    of packets matched by the filter and of Zoom packets the filter misses.
+    Needs tcpdump or libpcap to apply the filter.
+    """
+    local_ip_bytes = ip_address_to_bytes(local_ip_address)
+    num_packets = 0
+    num_zoom_packets = 0
+    with PcapReader(pcap_filename) as reader:
+        for packet in reader:
+            num_packets += 1
+            num_zoom_packets += is_zoom_packet(packet, local_ip_bytes)
+    matched = sniff(offline=pcap_filename, filter=bpf_filter)
+    num_zoom_packets_matched = sum(is_zoom_packet(packet, local_ip_bytes) for packet in matched)
+    return {
+        "packets": num_packets,
+        "zoom_packets": num_zoom_packets,
+        "matched_packets": len(matched),
+        "missed_zoom_packets": num_zoom_packets - num_zoom_packets_matched,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the Zoom BPF filter against a recorded capture")
+    parser.add_argument("pcap_filename")
+    parser.add_argument("local_ip_address", help="IP address of the machine the capture was recorded on")
+    parser.add_argument("--p2p-ports", type=int, nargs="*", default=None, help="source ports of peer to peer Zoom media, any port if left out")
+    parser.add_argument("--no-media-type", action="store_true", help="only filter on the ports")
+    args = parser.parse_args()
+
+    bpf_filter = build_zoom_filter(args.local_ip_address, args.p2p_ports, not args.no_media_type)
+    print(bpf_filter)
+    for name, count in check_filter(args.pcap_filename, bpf_filter, args.local_ip_address).items():
+        print(f"{name}: {count}")
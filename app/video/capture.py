@@ -0,0 +1,188 @@
+import cv2
+import numpy as np
+import os
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Optional
+
+try:
+    import Quartz
+    import Quartz.CoreGraphics as cg
+except ImportError: # not on macOS, only the file and synthetic backends can be used
+    Quartz = None
+
+
+def get_zoom_window_id() -> int:
+    """
+    Returns the window ID of Zoom Meeting. Otherwise, -1 if there is no such meeting
+    """
+    windows = Quartz.CGWindowListCopyWindowInfo(Quartz.kCGWindowListExcludeDesktopElements | Quartz.kCGWindowListOptionAll, Quartz.kCGNullWindowID)
+    for win in windows:
+        if win[Quartz.kCGWindowOwnerName] == 'zoom.us' and win.get(Quartz.kCGWindowName, '') == 'Zoom Meeting':
+            return int(win.get(Quartz.kCGWindowNumber, ''))
+    return -1
+
+
+class ChannelOrder(Enum):
+    BGRA = "BGRA"
+    RGBA = "RGBA"
+    BGR = "BGR"
+    GRAY = "GRAY"
+
+# cv2.cvtColor code to grayscale for each channel order
+_TO_GRAY = {
+    ChannelOrder.BGRA: cv2.COLOR_BGRA2GRAY,
+    ChannelOrder.RGBA: cv2.COLOR_RGBA2GRAY,
+    ChannelOrder.BGR: cv2.COLOR_BGR2GRAY,
+}
+
+
+@dataclass
+class CapturedFrame:
+    """
+    CapturedFrame is a NumPy view over the buffer a frame was captured into.
+    Rows may be padded, data.strides[0] is the number of bytes per row.
+    """
+    data: np.ndarray # (height, width, channels) or (height, width) for GRAY
+    channel_order: "ChannelOrder"
+
+    @property
+    def row_stride(self) -> int:
+        return self.data.strides[0]
+
+    def to_gray(self) -> np.ndarray:
+        if self.channel_order == ChannelOrder.GRAY:
+            return self.data
+        return cv2.cvtColor(self.data, _TO_GRAY[self.channel_order])
+
+
+class CaptureBackend(ABC):
+    @abstractmethod
+    def capture(self) -> "CapturedFrame":
+        pass
+
+    def is_closed(self) -> bool:
+        """
+        Returns True once there is nothing left to capture
+        """
+        return False
+
+
+class QuartzCaptureBackend(CaptureBackend):
+    """
+    Captures the Zoom Meeting window on macOS
+
+    https://stackoverflow.com/a/53607100
+    """
+    def __init__(self, window_num: int) -> None:
+        """
+        Param: window_num > 0
+        """
+        self.__window_num = window_num
+
+    def capture(self) -> "CapturedFrame":
+        cg_image = Quartz.CGWindowListCreateImage(Quartz.CGRectNull, Quartz.kCGWindowListOptionIncludingWindow, self.__window_num, Quartz.kCGWindowImageBoundsIgnoreFraming)
+        if cg_image == None: # is fullscreen
+            cg_image = Quartz.CGWindowListCreateImage(Quartz.CGRectNull, Quartz.kCGWindowListOptionIncludingWindow | Quartz.kCGWindowListOptionOnScreenAboveWindow, self.__window_num, Quartz.kCGWindowImageBoundsIgnoreFraming)
+
+        bpr = cg.CGImageGetBytesPerRow(cg_image)
+        width = cg.CGImageGetWidth(cg_image)
+        height = cg.CGImageGetHeight(cg_image)
+
+        cg_dataprovider = cg.CGImageGetDataProvider(cg_image)
+        cg_data = cg.CGDataProviderCopyData(cg_dataprovider)
+
+        # view the 32 bit little endian (BGRA) pixels in place, the array keeps cg_data alive
+        buffer = np.frombuffer(cg_data, dtype=np.uint8)
+        data = buffer[:height*bpr].reshape(height, bpr)[:, :width*4].reshape(height, width, 4)
+        return CapturedFrame(data, ChannelOrder.BGRA)
+
+    def is_closed(self) -> bool:
+        return get_zoom_window_id() == -1
+
+
+class FileCaptureBackend(CaptureBackend):
+    """
+    Replays a video file, or the images of a directory in filename order
+    """
+    def __init__(self, source: str, loop: bool = False) -> None:
+        """
+        Param: source is a video file or a directory of images
+        Param: loop restarts from the first frame instead of closing at the end
+        """
+        self.__loop = loop
+        self.__image_filenames: List[str] = []
+        self.__video: Optional[cv2.VideoCapture] = None
+        self.__source = source
+        self.__index = 0
+        self.__closed = False
+        if os.path.isdir(source):
+            self.__image_filenames = [os.path.join(source, filename) for filename in sorted(os.listdir(source))]
+        else:
+            self.__video = cv2.VideoCapture(source)
+
+    def __next_image(self) -> Optional[np.ndarray]:
+        if self.__video != None:
+            is_read, image = self.__video.read()
+            if not is_read and self.__loop:
+                self.__video = cv2.VideoCapture(self.__source)
+                is_read, image = self.__video.read()
+            return image if is_read else None
+
+        while self.__index < len(self.__image_filenames) or (self.__loop and len(self.__image_filenames) > 0):
+            filename = self.__image_filenames[self.__index % len(self.__image_filenames)]
+            self.__index += 1
+            image = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
+            if image is not None: # not an image
+                return image
+        return None
+
+    def capture(self) -> "CapturedFrame":
+        image = self.__next_image()
+        if image is None:
+            self.__closed = True
+            raise EOFError(f"no frames left in {self.__source}")
+        if image.ndim == 2:
+            return CapturedFrame(image, ChannelOrder.GRAY)
+        return CapturedFrame(image, ChannelOrder.BGRA if image.shape[2] == 4 else ChannelOrder.BGR)
+
+    def is_closed(self) -> bool:
+        return self.__closed
+
+
+class SyntheticCaptureBackend(CaptureBackend):
+    """
+    Generates BGRA frames of smooth noise that scrolls by a pixel per frame
+    """
+    def __init__(self, width: int = 1280, height: int = 720, seed: int = 0) -> None:
+        rng = np.random.default_rng(seed)
+        coarse = rng.integers(0, 256, (height // 16 + 1, 2 * width // 16 + 1, 4), dtype=np.uint8)
+        self.__texture = cv2.resize(coarse, (2 * width, height), interpolation=cv2.INTER_CUBIC)
+        self.__texture[:, :, 3] = 255
+        self.__width = width
+        self.__count = 0
+
+    def capture(self) -> "CapturedFrame":
+        offset = self.__count % self.__width
+        self.__count += 1
+        return CapturedFrame(self.__texture[:, offset:offset + self.__width], ChannelOrder.BGRA)
+
+
+class CaptureBackendType(Enum):
+    QUARTZ = "QUARTZ"
+    FILE = "FILE"
+    SYNTHETIC = "SYNTHETIC"
+
+
+def create_capture_backend(backend_type: "CaptureBackendType", source: Optional[str] = None) -> "CaptureBackend":
+    """
+    Param: backend_type is the kind of backend
+    Param: source is the video file or image directory of the FILE backend
+    """
+    if backend_type == CaptureBackendType.QUARTZ:
+        return QuartzCaptureBackend(get_zoom_window_id())
+    if backend_type == CaptureBackendType.FILE:
+        return FileCaptureBackend(source)
+    return SyntheticCaptureBackend()
@@ -0,0 +1,147 @@
+import threading
+
+from typing import Dict, List, Optional
+
+from app.video.metrics.image_score import MetricType
+from app.video.scoring import METRIC_COST_ORDER
+
+
+class FrameRateController:
+    """
+    FrameRateController adapts the capture rate, and if that is not enough the
+    metrics computed, so that scoring stays within a CPU budget of the scorer workers.
+
+    The writer stage records the scoring latency of every metric with record,
+    the capture stage calls update about once a second and captures at
+    frame_rate with the metrics of next_metrics.
+
+    A dropped metric is not restored on its old latency. When there is room
+    for it, a single frame is scored with it as a probe, and it is restored
+    only if the probe shows it fits. A probe that does not fit doubles the
+    updates before the next one.
+    """
+    def __init__(self, max_frame_rate: float, metric_list: List[MetricType], num_workers: int, cpu_budget: float = 0.8, min_frame_rate: float = 1.0, smoothing: float = 0.2, probe_interval: int = 10, max_probe_interval: int = 640) -> None:
+        """
+        Param: max_frame_rate is the configured FrameRate, never exceeded
+        Param: metric_list is the configured metrics
+        Param: num_workers is the number of scorer processes
+        Param: cpu_budget is the fraction of the scorer processes' time scoring may use
+        Param: min_frame_rate is the rate under which metrics are dropped instead
+        Param: smoothing is the weight of a new sample in the latency moving averages
+        Param: probe_interval is the updates with room for a dropped metric before it is probed
+        Param: max_probe_interval is the most updates between probes of a metric
+        """
+        self.__max_frame_rate = max_frame_rate
+        self.__min_frame_rate = min(min_frame_rate, max_frame_rate)
+        self.__metric_list = metric_list
+        self.__capacity = num_workers * cpu_budget # scoring seconds available per second
+        self.__smoothing = smoothing
+        self.__lock = threading.Lock()
+
+        self.__latencies: Dict[MetricType, Optional[float]] = {metric_type: None for metric_type in metric_list}
+        self.__frame_rate = max_frame_rate
+        self.__active_metrics: List[MetricType] = list(metric_list)
+
+        self.__probe_interval = probe_interval
+        self.__max_probe_interval = max_probe_interval
+        # of each dropped metric, the updates between its probes and the updates left before the next
+        self.__probe_intervals: Dict[MetricType, int] = {}
+        self.__probe_countdowns: Dict[MetricType, int] = {}
+        self.__probe: Optional[MetricType] = None # added to the next frame
+        self.__probing: List[MetricType] = [] # scored on a frame, its latency not recorded yet
+        self.__probed: List[MetricType] = [] # dropped and measured by a probe since
+
+    @property
+    def frame_rate(self) -> float:
+        return self.__frame_rate
+
+    @property
+    def active_metrics(self) -> List[MetricType]:
+        return self.__active_metrics
+
+    def next_metrics(self) -> List[MetricType]:
+        """
+        Returns the metrics to compute on the next frame, active_metrics and the metric probed if any
+        """
+        with self.__lock:
+            if self.__probe == None:
+                return self.__active_metrics
+            probe, self.__probe = self.__probe, None
+            if probe not in self.__probing:
+                self.__probing.append(probe)
+            return [metric_type for metric_type in self.__metric_list if metric_type in self.__active_metrics or metric_type == probe]
+
+    def record(self, latencies: Dict[MetricType, float]) -> None:
+        """
+        Param: latencies is the time in seconds each metric took on a frame
+        """
+        with self.__lock:
+            for metric_type, latency in latencies.items():
+                average = self.__latencies[metric_type]
+                if metric_type in self.__probing:
+                    # the latency of the probe replaces the one measured before the metric was dropped
+                    self.__probing.remove(metric_type)
+                    self.__probed.append(metric_type)
+                    average = None
+                self.__latencies[metric_type] = latency if average == None else (1 - self.__smoothing)*average + self.__smoothing*latency
+
+    def __cost(self, metric_list: List[MetricType]) -> float:
+        # scoring seconds per frame, of the metrics measured so far
+        return sum(self.__latencies[metric_type] or 0 for metric_type in metric_list)
+
+    def __get_measured(self, metric_list: List[MetricType]) -> List[MetricType]:
+        return [metric_type for metric_type in metric_list if self.__latencies[metric_type] != None]
+
+    def update(self) -> List[str]:
+        """
+        Adjusts frame_rate and active_metrics to the measured latencies
+
+        Returns a description of every change made
+        """
+        with self.__lock:
+            changes: List[str] = []
+            cost = self.__cost(self.__active_metrics)
+            if cost == 0:
+                return changes
+            sustainable_rate = self.__capacity / cost
+
+            if self.__frame_rate > sustainable_rate:
+                if self.__frame_rate > self.__min_frame_rate:
+                    # undershoot a little so that the workers can drain their backlog
+                    self.__frame_rate = max(self.__min_frame_rate, 0.9 * sustainable_rate)
+                    changes.append(f"frame rate lowered to {self.__frame_rate:.2f} fps, scoring takes {cost:.3f}s per frame")
+                elif len(self.__active_metrics) > 1 and len(self.__get_measured(self.__active_metrics)) > 0:
+                    # only a measured metric is dropped, it is known to be slow and its latency is kept until a probe measures it again
+                    most_expensive = min(self.__get_measured(self.__active_metrics), key=METRIC_COST_ORDER.index)
+                    self.__active_metrics = [metric_type for metric_type in self.__active_metrics if metric_type != most_expensive]
+                    if most_expensive in self.__probed:
+                        self.__probed.remove(most_expensive)
+                    self.__probe_intervals.setdefault(most_expensive, self.__probe_interval)
+                    self.__probe_countdowns[most_expensive] = self.__probe_intervals[most_expensive]
+                    changes.append(f"dropped {most_expensive.value} at {self.__frame_rate:.2f} fps, it takes {self.__latencies[most_expensive]:.3f}s per frame")
+            elif self.__frame_rate < 0.7 * sustainable_rate:
+                # restore dropped metrics, even at a lower frame rate, before raising the frame rate
+                dropped = self.__get_measured([metric_type for metric_type in self.__metric_list if metric_type not in self.__active_metrics])
+                cheapest_dropped = max(dropped, key=METRIC_COST_ORDER.index) if len(dropped) > 0 else None
+                restored = [metric_type for metric_type in self.__metric_list if metric_type in self.__active_metrics or metric_type == cheapest_dropped]
+                restored_rate = 0.9 * self.__capacity / self.__cost(restored)
+                if cheapest_dropped in self.__probed and restored_rate >= self.__min_frame_rate:
+                    # only after a probe, the latency measured before the drop was too high
+                    self.__active_metrics = restored
+                    self.__frame_rate = min(self.__frame_rate, restored_rate)
+                    self.__probed.remove(cheapest_dropped)
+                    del self.__probe_intervals[cheapest_dropped]
+                    changes.append(f"restored {cheapest_dropped.value} at {self.__frame_rate:.2f} fps")
+                    return changes
+                # a probe lost to backpressure is retried with the next one
+                if cheapest_dropped != None and self.__probe == None:
+                    self.__probe_countdowns[cheapest_dropped] -= 1
+                    if self.__probe_countdowns[cheapest_dropped] <= 0:
+                        self.__probe = cheapest_dropped
+                        self.__probe_intervals[cheapest_dropped] = min(self.__max_probe_interval, 2 * self.__probe_intervals[cheapest_dropped])
+                        self.__probe_countdowns[cheapest_dropped] = self.__probe_intervals[cheapest_dropped]
+                        changes.append(f"probing {cheapest_dropped.value} on a frame, it took {self.__latencies[cheapest_dropped]:.3f}s per frame")
+                if self.__frame_rate < self.__max_frame_rate:
+                    self.__frame_rate = min(self.__max_frame_rate, 1.5 * self.__frame_rate, 0.9 * sustainable_rate)
+                    changes.append(f"frame rate raised to {self.__frame_rate:.2f} fps, scoring takes {cost:.3f}s per frame")
+            return changes
@@ -0,0 +1,94 @@
+import numpy as np
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.common.rolling_window import IntervalClock, RollingWindow, RollingWindowConfig
+from app.video.metrics.image_score import MetricType
+from app.video.stall_detection import StallState
+
+"""
+Rolling statistics of the video while the call happens, a row every interval
+in video_live.csv (see video_run.write_metrics).
+"""
+
+
+def get_live_video_columns(metric_list: List[MetricType]) -> List[Tuple[str, Any]]:
+    """
+    Returns the name and type of the columns of the rows of LiveVideoMetrics
+    """
+    return (
+        [("time", "datetime64[us]"), ("window_seconds", np.float64), ("frames_per_second", np.float64)]
+        + [(f"mean_{metric_type.value}", np.float64) for metric_type in metric_list]
+        + [("stall_ratio", np.float64), ("near_stall_ratio", np.float64)]
+    )
+
+
+class LiveVideoMetrics:
+    """
+    LiveVideoMetrics keeps sliding sums of the scores and stalls of the frames
+    of the last rolling_config.window_seconds and returns a row every
+    rolling_config.interval_seconds of capture time. The mean of a metric is
+    over the frames it was computed for.
+    """
+    def __init__(self, rolling_config: "RollingWindowConfig", metric_list: List[MetricType]) -> None:
+        """
+        Param: rolling_config is the window and the interval of the rows
+        Param: metric_list is the metrics averaged, in the order of the columns
+        """
+        self.__metric_list = metric_list
+        self.__window = RollingWindow(
+            ["frames", "stalled", "near_stalled"]
+            + [f"{metric_type.value}_sum" for metric_type in metric_list]
+            + [f"{metric_type.value}_count" for metric_type in metric_list],
+            rolling_config.window_seconds)
+        self.__clock = IntervalClock(rolling_config.interval_seconds)
+        self.__last_frame_time: Optional[float] = None
+        self.__last_row_time: Optional[float] = None
+
+    def add_frame(self, time: datetime, metrics: Dict[MetricType, float], stall: "StallState") -> List[list]:
+        """
+        Param: time is when the frame was captured, not before the frames added before
+        Param: metrics is the scores of the frame, the metrics left out were not computed
+
+        Returns the rows due before the frame, the time in the first column as a datetime
+        """
+        timestamp = time.timestamp()
+        self.__last_frame_time = timestamp
+        rows = [self.__get_row(due_time) for due_time in self.__clock.due(timestamp)]
+        scores = [metrics.get(metric_type) for metric_type in self.__metric_list]
+        self.__window.add(timestamp,
+            [1.0, 1.0 if stall.is_stalled else 0.0, 1.0 if stall.is_near_stalled else 0.0]
+            + [0.0 if score == None else score for score in scores]
+            + [0.0 if score == None else 1.0 for score in scores])
+        return rows
+
+    def flush(self, end_time: datetime) -> List[list]:
+        """
+        Param: end_time is the time of the last row, not before the frames added
+
+        Returns the rows due up to end_time and a last row at end_time, so the
+        frames after the last row due are in a row too, once the call is over
+        """
+        if self.__last_frame_time == None:
+            return []
+        timestamp = end_time.timestamp()
+        rows = [self.__get_row(due_time) for due_time in self.__clock.due(timestamp)]
+        if self.__last_row_time == None or self.__last_row_time < timestamp:
+            rows.append(self.__get_row(timestamp))
+        return rows
+
+    def __get_row(self, time: float) -> list:
+        self.__last_row_time = time
+        self.__window.advance(time)
+        totals = self.__window.totals
+        window_seconds = self.__window.covered_seconds
+        # statistics of nothing are left empty
+        return (
+            [datetime.fromtimestamp(time), window_seconds, totals["frames"]/window_seconds if window_seconds > 0 else None]
+            + [
+                totals[f"{metric_type.value}_sum"]/totals[f"{metric_type.value}_count"] if totals[f"{metric_type.value}_count"] > 0 else None
+                for metric_type in self.__metric_list
+            ]
+            + [totals[name]/totals["frames"] if totals["frames"] > 0 else None for name in ("stalled", "near_stalled")]
+        )
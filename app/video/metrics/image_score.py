@@ -4,8 +4,11 @@ import os
 
 # from brisque import BRISQUE
 from enum import Enum
-from app.video.metrics.niqe import niqe
-from app.video.metrics.piqe import piqe
+from functools import cached_property
+from typing import Union
+from app.video.capture import ChannelOrder
+from app.video.metrics.niqe import batched_niqe_from_mscn, get_niqe_mscn_levels
+from app.video.metrics.piqe import batched_piqe_from_mscn, calculate_mscn, pad_to_block_size
 
 
 class MetricType(Enum):
@@ -14,6 +17,45 @@ class MetricType(Enum):
     NIQE = "NIQE"
     LAPLACIAN = "LAPLACIAN"
 
+class FrameContext:
+    """
+    Preprocessing of one frame shared by all the metrics in get_no_ref_score.
+    Every field is computed lazily on first use and then cached, so a frame
+    only pays for what the metrics being run need.
+
+    PIQE and NIQE keep their own MSCN maps: PIQE normalizes the frame padded to
+    16x16 blocks, NIQE the frame cropped to 96x96 patches (plus a half scale
+    level) with a zero border, so one cannot stand in for the other without
+    changing the scores.
+    """
+    def __init__(self, image, channel_order: "ChannelOrder" = ChannelOrder.BGR) -> None:
+        """
+        image: NDArray of shape (W, H) or (W, H, C), may be a strided view of a capture buffer
+        channel_order: order of the C channels, BGR also accepts BGRA
+        """
+        self.image = image
+        self.channel_order = channel_order
+
+    @cached_property
+    def gray(self):
+        if len(self.image.shape) == 3:
+            if self.channel_order == ChannelOrder.RGBA:
+                return cv2.cvtColor(self.image, cv2.COLOR_RGBA2GRAY)
+            return cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self.image
+
+    @cached_property
+    def gray_float32(self):
+        return self.gray.astype(np.float32)
+
+    @cached_property
+    def piqe_mscn(self):
+        return calculate_mscn(pad_to_block_size(self.gray_float32, 16))
+
+    @cached_property
+    def niqe_mscn(self):
+        return get_niqe_mscn_levels(self.gray_float32)
+
 def laplacian_blur(img, save_filename: str = None) -> float:
     """
     img: NDArray of shape (W, H) or (W, H, C) where C represents RGB
@@ -21,7 +63,8 @@ def laplacian_blur(img, save_filename: str = None) -> float:
     gray_img = img
     if len(img.shape) == 3:
         gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray_img = gray_img.astype(np.float64)
+    if gray_img.dtype != np.uint8: # uint8 is filtered to CV_64F directly
+        gray_img = gray_img.astype(np.float64)
     
     laplacian = cv2.Laplacian(gray_img, cv2.CV_64F)
     if save_filename != None:
@@ -29,13 +72,18 @@ def laplacian_blur(img, save_filename: str = None) -> float:
 
     return np.var(laplacian)
 
-def get_no_ref_score(im, mode: "MetricType") -> float:
+def get_no_ref_score(im: Union[np.ndarray, "FrameContext"], mode: "MetricType") -> float:
+    """
+    im: NDArray image or its FrameContext. Pass the same FrameContext for every
+    metric of a frame so that the grayscale conversion and MSCN are shared
+    """
+    context = im if isinstance(im, FrameContext) else FrameContext(im)
     score = -1
     if mode == MetricType.PIQE:
-        score, _, _, _ = piqe(im)
+        score, _, _, _ = batched_piqe_from_mscn(context.piqe_mscn, context.gray.shape)
     elif mode == MetricType.NIQE:
-        score = niqe(im)
+        score = batched_niqe_from_mscn(*context.niqe_mscn)
     else:
-        return laplacian_blur(im)
+        return laplacian_blur(context.gray)
     
     return score
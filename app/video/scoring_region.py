@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+
+from enum import Enum
+from typing import Optional, Tuple
+
+from app.video.capture import CapturedFrame
+
+# NIQE needs frames larger than 193x193
+MIN_SCORING_SIZE = 200
+
+
+class ScoringMode(Enum):
+    FULL = "FULL" # the whole captured window
+    FIXED_ROI = "FIXED_ROI" # a configured (x, y, width, height) rectangle
+    VIDEO_TILES = "VIDEO_TILES" # the bounding box of the detected video tiles
+
+
+def flat_line_mask(gray, axis: int, tolerance: int = 3, min_flat_fraction: float = 0.9) -> np.ndarray:
+    """
+    Param: gray is a (downsampled) grayscale NDArray
+    Param: axis is 1 to classify rows, 0 to classify columns
+    Param: tolerance is the gray level difference to the line's median that still counts as flat
+
+    Returns a boolean NDArray, True for the lines where at least min_flat_fraction
+    of the pixels have the line's median value. Letterboxing, toolbars and the
+    gaps between tiles are flat, lines through video are not.
+    """
+    lines = gray if axis == 1 else gray.T
+    medians = np.median(lines, axis=1)[:, np.newaxis]
+    flat_fraction = np.mean(np.abs(lines.astype(np.int16) - medians) <= tolerance, axis=1)
+    return flat_fraction >= min_flat_fraction
+
+
+def sample_gray(frame: "CapturedFrame", step: int) -> np.ndarray:
+    """
+    Returns the grayscale of every step-th pixel of the frame, to detect layouts cheaply
+    """
+    return CapturedFrame(np.ascontiguousarray(frame.data[::step, ::step]), frame.channel_order).to_gray()
+
+
+def detect_video_area(frame: "CapturedFrame", step: int = 4) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Returns the (x, y, width, height) bounding box of the non-flat rows and
+    columns of the frame, None if there are none
+    """
+    gray = sample_gray(frame, step)
+    video_rows = np.flatnonzero(~flat_line_mask(gray, axis=1))
+    if len(video_rows) == 0:
+        return None
+    gray = gray[video_rows[0]:video_rows[-1] + 1]
+    video_columns = np.flatnonzero(~flat_line_mask(gray, axis=0))
+    if len(video_columns) == 0:
+        return None
+    return (int(video_columns[0]) * step, int(video_rows[0]) * step,
+            int(video_columns[-1] - video_columns[0] + 1) * step, int(video_rows[-1] - video_rows[0] + 1) * step)
+
+
+class ScoringRegion:
+    """
+    ScoringRegion picks the part of each frame the metrics are computed on and
+    the resolution they are computed at
+    """
+    def __init__(self, mode: "ScoringMode", roi: Optional[Tuple[int, int, int, int]] = None, max_resolution: Optional[Tuple[int, int]] = None, redetect_every_nth_frame: int = 30) -> None:
+        """
+        Param: mode selects the region
+        Param: roi is the (x, y, width, height) of FIXED_ROI
+        Param: max_resolution is the (width, height) the region is downscaled to fit in, None to keep the resolution
+        Param: redetect_every_nth_frame is how often VIDEO_TILES looks for the tiles again
+        """
+        self.mode = mode
+        self.__roi = roi
+        self.__max_resolution = max_resolution
+        self.__redetect_every_nth_frame = redetect_every_nth_frame
+        self.__count = 0
+
+    def describe(self) -> str:
+        description = self.mode.value
+        if self.mode == ScoringMode.FIXED_ROI:
+            description += f" roi={self.__roi}"
+        if self.__max_resolution != None:
+            description += f" max_resolution={self.__max_resolution[0]}x{self.__max_resolution[1]}"
+        return description
+
+    def crop(self, frame: "CapturedFrame") -> "CapturedFrame":
+        """
+        Returns a view of the region of the frame
+        """
+        if self.mode == ScoringMode.VIDEO_TILES:
+            if self.__count % self.__redetect_every_nth_frame == 0:
+                self.__roi = detect_video_area(frame)
+            self.__count += 1
+        if self.mode == ScoringMode.FULL or self.__roi == None:
+            return frame
+
+        x, y, width, height = self.__roi
+        data = frame.data[y:y + height, x:x + width]
+        if min(data.shape[:2]) < MIN_SCORING_SIZE: # too small to score, e.g. the window was resized
+            return frame
+        return CapturedFrame(data, frame.channel_order)
+
+    def resize(self, gray) -> np.ndarray:
+        """
+        Returns gray downscaled to fit in max_resolution, keeping its aspect ratio
+        """
+        if self.__max_resolution == None:
+            return gray
+        height, width = gray.shape[:2]
+        scale = min(self.__max_resolution[0] / width, self.__max_resolution[1] / height)
+        scale = max(scale, MIN_SCORING_SIZE / min(width, height))
+        if scale >= 1:
+            return gray
+        return cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
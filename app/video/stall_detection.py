@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+import zlib
+
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class FrameFingerprint:
+    """
+    FrameFingerprint stands in for a frame when comparing it to the next one,
+    so the previous frame does not have to be kept
+    """
+    checksum: int # CRC-32 of every grayscale pixel
+    signature: np.ndarray # small grayscale sample of the frame
+
+@dataclass
+class StallState:
+    is_stalled: bool # identical to the previous frame
+    is_near_stalled: bool # identical or only a few small regions changed (cursor, clock)
+    stall_run_length: int # number of frames in a row, including this one, that are near stalled
+
+SIGNATURE_SIZE = (64, 64)
+
+
+def fingerprint_frame(gray) -> "FrameFingerprint":
+    """
+    Param: gray is the grayscale NDArray of the frame
+    """
+    if not gray.flags.c_contiguous:
+        gray = np.ascontiguousarray(gray)
+    # bilinear sampling instead of averaging, it takes microseconds even on 4K frames
+    signature = cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_LINEAR)
+    return FrameFingerprint(zlib.crc32(gray), signature)
+
+
+class StallDetector:
+    """
+    StallDetector compares each frame to the previous one through their FrameFingerprint
+    """
+    def __init__(self, detect_near_stalls: bool = True, pixel_threshold: int = 4, max_changed_fraction: float = 0.005) -> None:
+        """
+        Param: detect_near_stalls also reports frames where only a few signature pixels changed
+        Param: pixel_threshold is the gray level difference for a signature pixel to count as changed
+        Param: max_changed_fraction is the fraction of changed signature pixels up to which a frame is near stalled
+        """
+        self.__detect_near_stalls = detect_near_stalls
+        self.__pixel_threshold = pixel_threshold
+        self.__max_changed_pixels = int(max_changed_fraction * SIGNATURE_SIZE[0] * SIGNATURE_SIZE[1])
+        self.__prev_fingerprint: Optional["FrameFingerprint"] = None
+        self.__stall_run_length = 0
+
+    def update(self, gray) -> "StallState":
+        """
+        Param: gray is the grayscale NDArray of the next frame
+        """
+        fingerprint = fingerprint_frame(gray)
+        prev_fingerprint = self.__prev_fingerprint
+        self.__prev_fingerprint = fingerprint
+
+        is_stalled = bool(
+            prev_fingerprint != None
+            and prev_fingerprint.checksum == fingerprint.checksum
+            and np.array_equal(prev_fingerprint.signature, fingerprint.signature))
+        is_near_stalled = is_stalled
+        if not is_stalled and self.__detect_near_stalls and prev_fingerprint != None:
+            num_changed = np.count_nonzero(cv2.absdiff(prev_fingerprint.signature, fingerprint.signature) > self.__pixel_threshold)
+            is_near_stalled = bool(num_changed <= self.__max_changed_pixels)
+
+        self.__stall_run_length = self.__stall_run_length + 1 if is_near_stalled else 0
+        return StallState(is_stalled, is_near_stalled, self.__stall_run_length)
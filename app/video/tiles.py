@@ -0,0 +1,116 @@
+import numpy as np
+
+from typing import List, Tuple
+
+from app.video.capture import CapturedFrame
+from app.video.metrics.image_score import MetricType
+from app.video.scoring_region import MIN_SCORING_SIZE, flat_line_mask, sample_gray
+
+# (x, y, width, height) of a participant's tile in the captured frame
+Tile = Tuple[int, int, int, int]
+
+
+def _runs(mask) -> List[Tuple[int, int]]:
+    """
+    Returns the [start, end) of every run of True in a boolean NDArray
+    """
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def detect_tiles(frame: "CapturedFrame", step: int = 4, min_tile_size: int = 64) -> List["Tile"]:
+    """
+    Param: frame is the captured Zoom window
+    Param: step is the subsampling of the frame used for detection
+    Param: min_tile_size is the smallest width and height of a tile in pixels
+
+    Returns the tiles in row-major order. Tiles are the non-flat areas between
+    flat rows, split by the flat columns of their band of rows.
+    """
+    gray = sample_gray(frame, step)
+    min_length = max(1, min_tile_size // step)
+    tiles: List["Tile"] = []
+    for row_start, row_end in _runs(~flat_line_mask(gray, axis=1)):
+        if row_end - row_start < min_length:
+            continue
+        band = gray[row_start:row_end]
+        for column_start, column_end in _runs(~flat_line_mask(band, axis=0)):
+            if column_end - column_start < min_length:
+                continue
+            tiles.append((int(column_start) * step, int(row_start) * step,
+                          int(column_end - column_start) * step, int(row_end - row_start) * step))
+    return tiles
+
+
+def get_tile_metric_list(metric_list: List[MetricType], tile_gray) -> List[MetricType]:
+    """
+    Returns metric_list without NIQE if the tile is too small for it
+    """
+    if min(tile_gray.shape[:2]) >= MIN_SCORING_SIZE:
+        return metric_list
+    return [metric_type for metric_type in metric_list if metric_type != MetricType.NIQE]
+
+
+class TileSegmenter:
+    """
+    TileSegmenter keeps the tile layout of the gallery view. Every frame only
+    the middle lines of the gaps between the known tiles are checked, the
+    tiles are detected again when a gap is no longer flat (a participant
+    joined, left or the window was resized) and every redetect_every_nth_frame
+    frames.
+    """
+    def __init__(self, redetect_every_nth_frame: int = 150, check_step: int = 4) -> None:
+        """
+        Param: redetect_every_nth_frame is how often the tiles are detected regardless of the gaps
+        Param: check_step is the subsampling along the gap lines
+        """
+        self.__redetect_every_nth_frame = redetect_every_nth_frame
+        self.__check_step = check_step
+        self.__count = 0
+        self.__frame_shape: Tuple[int, ...] = ()
+        self.__gap_lines: List[Tuple[slice, slice]] = [] # (rows, columns) of a 1 pixel wide line of a gap
+        self.tiles: List["Tile"] = []
+
+    def __find_gap_lines(self) -> None:
+        step = self.__check_step
+        self.__gap_lines = []
+        if len(self.tiles) == 0:
+            return
+        left = min(x for x, _, _, _ in self.tiles)
+        right = max(x + width for x, _, width, _ in self.tiles)
+        bands = sorted(set((y, height) for _, y, _, height in self.tiles))
+        for (y, height), (next_y, _) in zip(bands, bands[1:]):
+            middle = (y + height + next_y) // 2
+            self.__gap_lines.append((slice(middle, middle + 1), slice(left, right, step)))
+        for y, height in bands:
+            band_tiles = sorted(tile for tile in self.tiles if (tile[1], tile[3]) == (y, height))
+            for (x, _, width, _), (next_x, _, _, _) in zip(band_tiles, band_tiles[1:]):
+                middle = (x + width + next_x) // 2
+                self.__gap_lines.append((slice(y, y + height, step), slice(middle, middle + 1)))
+
+    def __is_layout_unchanged(self, frame: "CapturedFrame") -> bool:
+        if frame.data.shape != self.__frame_shape:
+            return False
+        for rows, columns in self.__gap_lines:
+            line = np.ascontiguousarray(frame.data[rows, columns].reshape(1, -1, *frame.data.shape[2:]))
+            if not flat_line_mask(CapturedFrame(line, frame.channel_order).to_gray(), axis=1)[0]:
+                return False
+        return True
+
+    def update(self, frame: "CapturedFrame") -> bool:
+        """
+        Param: frame is the captured Zoom window
+
+        Updates tiles, returns True if the layout changed
+        """
+        self.__count += 1
+        if self.__count % self.__redetect_every_nth_frame != 1 and self.__is_layout_unchanged(frame):
+            return False
+
+        tiles = detect_tiles(frame)
+        self.__frame_shape = frame.data.shape
+        is_changed = tiles != self.tiles
+        self.tiles = tiles
+        self.__find_gap_lines()
+        return is_changed
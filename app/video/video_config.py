@@ -0,0 +1,68 @@
+import os
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from app.common.buffered_writer import FlushPolicy
+from app.common.constants import OutputFormat
+from app.common.rolling_window import RollingWindowConfig
+from app.video.capture import CaptureBackendType
+from app.video.scoring import BackpressurePolicy
+from app.video.scoring_region import ScoringMode
+
+
+def _default_scoring_workers() -> int:
+    # leave cores for Zoom itself and the network process
+    return max(1, min(4, (os.cpu_count() or 1) - 2))
+
+
+def _optional_tuple(value) -> Optional[Tuple[int, ...]]:
+    return None if value == None else tuple(int(x) for x in value)
+
+
+@dataclass
+class VideoPipelineConfig:
+    """
+    Optional settings of video.pipeline_run, read from config.json
+    """
+    capture_backend: "CaptureBackendType" = CaptureBackendType.QUARTZ
+    capture_source: Optional[str] = None
+    scoring_mode: "ScoringMode" = ScoringMode.FULL
+    scoring_roi: Optional[Tuple[int, int, int, int]] = None
+    scoring_max_resolution: Optional[Tuple[int, int]] = None
+    scoring_workers: int = _default_scoring_workers()
+    max_pending_frames: int = 8
+    backpressure_policy: "BackpressurePolicy" = BackpressurePolicy.DEGRADE
+    adaptive_frame_rate: bool = True
+    cpu_budget: float = 0.8
+    min_frame_rate: float = 1.0
+    detect_near_stalls: bool = True
+    per_tile_metrics: bool = False
+    output_format: "OutputFormat" = OutputFormat.CSV
+    flush_policy: "FlushPolicy" = field(default_factory=FlushPolicy)
+    rolling_window: "RollingWindowConfig" = field(default_factory=RollingWindowConfig)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "VideoPipelineConfig":
+        """
+        Param: config is the parsed config.json, missing keys keep their default
+        """
+        default = cls()
+        return cls(
+            capture_backend=CaptureBackendType(config.get("VideoCaptureBackend", default.capture_backend.value)),
+            capture_source=config.get("VideoCaptureSource", default.capture_source),
+            scoring_mode=ScoringMode(config.get("VideoScoringMode", default.scoring_mode.value)),
+            scoring_roi=_optional_tuple(config.get("VideoScoringROI", default.scoring_roi)),
+            scoring_max_resolution=_optional_tuple(config.get("VideoScoringMaxResolution", default.scoring_max_resolution)),
+            scoring_workers=int(config.get("VideoScoringWorkers", default.scoring_workers)),
+            max_pending_frames=int(config.get("VideoMaxPendingFrames", default.max_pending_frames)),
+            backpressure_policy=BackpressurePolicy(config.get("VideoBackpressurePolicy", default.backpressure_policy.value)),
+            adaptive_frame_rate=bool(config.get("AdaptiveFrameRate", default.adaptive_frame_rate)),
+            cpu_budget=float(config.get("VideoCPUBudget", default.cpu_budget)),
+            min_frame_rate=float(config.get("MinFrameRate", default.min_frame_rate)),
+            detect_near_stalls=bool(config.get("DetectNearStalls", default.detect_near_stalls)),
+            per_tile_metrics=bool(config.get("VideoPerTileMetrics", default.per_tile_metrics)),
+            output_format=OutputFormat(config.get("MetricsOutputFormat", default.output_format.value)),
+            flush_policy=FlushPolicy.from_config(config),
+            rolling_window=RollingWindowConfig.from_config(config),
+        )
@@ -1,10 +1,34 @@
-from dataclasses import dataclass
+from concurrent.futures import Future
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List
 
 from app.video.metrics.image_score import MetricType
+from app.video.stall_detection import StallState
+from app.video.tiles import Tile
 
 @dataclass
 class VideoMetrics:
     time: datetime
     metrics: Dict[MetricType, float]
+
+@dataclass
+class PendingTile:
+    """
+    A participant's tile of a captured frame waiting on its scores
+    """
+    index: int # row-major position in the gallery
+    tile: "Tile"
+    metrics: Future # resolves to the scores and latencies of score_frame
+    stall: "StallState"
+
+@dataclass
+class PendingFrame:
+    """
+    A captured frame waiting on its scores, in capture order
+    """
+    time: datetime
+    metrics: Future # resolves to the scores and latencies of score_frame
+    stall: "StallState"
+    frame_rate: float # capture rate when the frame was captured
+    tiles: List["PendingTile"] = field(default_factory=list)
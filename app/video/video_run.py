@@ -1,33 +1,30 @@
-import csv
 import multiprocessing as mp
 import numpy as np
 import os
 import queue
+import threading
 import time
 import traceback
-import Quartz
-import Quartz.CoreGraphics as cg
 
 from collections import defaultdict
+from contextlib import ExitStack
 from datetime import datetime
 from matplotlib import pyplot as plt
-from typing import Dict, List
-from PIL import Image
-
-from app.common.constants import SpecialQueueValues, TIME_FORMAT
-from app.video.metrics.image_score import MetricType, get_no_ref_score
-from app.video.video_metrics import VideoMetrics
-
-def get_zoom_window_id() -> int:
-    """
-    Returns the window ID of Zoom Meeting. Otherwise, -1 if there is no such meeting
-    """
-    windows = Quartz.CGWindowListCopyWindowInfo(Quartz.kCGWindowListExcludeDesktopElements | Quartz.kCGWindowListOptionAll, Quartz.kCGNullWindowID)
-    for win in windows:
-        if win[Quartz.kCGWindowOwnerName] == 'zoom.us' and win.get(Quartz.kCGWindowName, '') == 'Zoom Meeting':
-            return int(win.get(Quartz.kCGWindowNumber, ''))
-    return -1
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.common.buffered_writer import BufferedWriter
+from app.common.columnar import format_time, open_metrics_file
+from app.common.constants import OUTPUT_EXTENSIONS, OutputFormat, SpecialQueueValues
+from app.video.capture import CaptureBackend, CapturedFrame, create_capture_backend, get_zoom_window_id
+from app.video.metrics.image_score import MetricType
+from app.video.frame_rate_controller import FrameRateController
+from app.video.live_metrics import LiveVideoMetrics, get_live_video_columns
+from app.video.scoring import FrameScorer
+from app.video.scoring_region import ScoringRegion
+from app.video.stall_detection import StallDetector, StallState
+from app.video.tiles import TileSegmenter, get_tile_metric_list
+from app.video.video_config import VideoPipelineConfig
+from app.video.video_metrics import PendingFrame, PendingTile
 
 def check_zoom_window_up(log_queue, zoom_meeting_on: mp.Event) -> None:
     """
@@ -56,78 +53,213 @@ def check_zoom_window_up(log_queue, zoom_meeting_on: mp.Event) -> None:
         time.sleep(3)
     log_queue.put(f"finished {__name__}.{check_zoom_window_up.__name__}")
 
-def capture_image(window_num) -> Image.Image:
+def get_metric_columns(metric_list: List[MetricType]) -> List[Tuple[str, Any]]:
     """
-    Param: window_num > 0
-    Gets the raw image data of the window given window_num
-
-    https://stackoverflow.com/a/53607100
+    Returns the name and type of the metric and stall columns of video.csv and video_tiles.csv
+    """
+    return [(metric_type.value, np.float64) for metric_type in metric_list] + [("is_stalled", np.uint8), ("is_near_stalled", np.uint8), ("stall_run_length", np.uint32)]
 
-    Returns PIL Image of the window with window_num
+def write_tile_metrics(tile_csv_writer, pending_frame: "PendingFrame", metric_list: List[MetricType], frame_latencies: Dict[MetricType, float], log_queue, output_format: "OutputFormat" = OutputFormat.CSV) -> None:
     """
-    cg_image = Quartz.CGWindowListCreateImage(Quartz.CGRectNull, Quartz.kCGWindowListOptionIncludingWindow, window_num, Quartz.kCGWindowImageBoundsIgnoreFraming)
-    if cg_image == None: # is fullscreen
-        cg_image = Quartz.CGWindowListCreateImage(Quartz.CGRectNull, Quartz.kCGWindowListOptionIncludingWindow | Quartz.kCGWindowListOptionOnScreenAboveWindow, window_num, Quartz.kCGWindowImageBoundsIgnoreFraming)
-        
-    bpr = cg.CGImageGetBytesPerRow(cg_image)
-    width = cg.CGImageGetWidth(cg_image)
-    height = cg.CGImageGetHeight(cg_image)
+    Param: tile_csv_writer writes the rows of video_tiles.csv
+    Param: pending_frame is the frame the tiles were cut from
+    Param: metric_list is the metrics in the columns of video_tiles.csv
+    Param: frame_latencies is the latency of each metric on the frame, the tiles' latencies are added to it
+    Param: log_queue is mp.Queue that contains a string with log information
+    Param: output_format is the format of video_tiles.csv
+    """
+    for pending_tile in pending_frame.tiles:
+        try:
+            metrics, latencies = pending_tile.metrics.result()
+        except Exception as e:
+            log_queue.put(f"exception in {__name__}.{write_tile_metrics.__name__}: {type(e)}, {e}, {traceback.format_exc()}")
+            continue
+        for metric_type, latency in latencies.items():
+            frame_latencies[metric_type] = frame_latencies.get(metric_type, 0) + latency
+        stall = pending_tile.stall
+        tile_csv_writer.writerow([format_time(pending_frame.time, output_format), pending_tile.index] + list(pending_tile.tile) + [metrics.get(metric_type) for metric_type in metric_list] + [1 if stall.is_stalled else 0, 1 if stall.is_near_stalled else 0, stall.stall_run_length])
 
-    cg_dataprovider = cg.CGImageGetDataProvider(cg_image)
-    cg_data = cg.CGDataProviderCopyData(cg_dataprovider)
+def write_metrics(csv_writer, pending_frames: queue.Queue, metric_list: List[MetricType], frame_rate_controller: "FrameRateController", log_queue, tile_csv_writer = None, output_format: "OutputFormat" = OutputFormat.CSV, live_metrics: Optional["LiveVideoMetrics"] = None, live_csv_writer = None) -> None:
+    """
+    Param: csv_writer writes the rows of video.csv
+    Param: pending_frames contains PendingFrame in capture order, ends with SpecialQueueValues.FINISH
+    Param: metric_list is the metrics in the columns of video.csv
+    Param: frame_rate_controller records the scoring latencies
+    Param: log_queue is mp.Queue that contains a string with log information
+    Param: tile_csv_writer writes the rows of video_tiles.csv, None without per tile metrics
+    Param: output_format is the format of video.csv and video_tiles.csv
+    Param: live_metrics gives a row of rolling statistics every interval, written by live_csv_writer to video_live.csv, None without them
 
-    return Image.frombuffer("RGBA", (width, height), cg_data, "raw", "BGRA", bpr, 1)
+    Writer stage of pipeline_run, rows are written in capture order
+    """
+    last_time: Optional[datetime] = None # of the last frame written
+    while True:
+        pending_frame = pending_frames.get()
+        if type(pending_frame) == SpecialQueueValues and pending_frame == SpecialQueueValues.FINISH:
+            if live_metrics != None and last_time != None:
+                # the frames after the last row due are in a last row
+                live_csv_writer.writerows([[format_time(row[0], output_format)] + row[1:] for row in live_metrics.flush(last_time)])
+            break
+        try:
+            metrics, latencies = pending_frame.metrics.result()
+        except Exception as e:
+            log_queue.put(f"exception in {__name__}.{write_metrics.__name__}: {type(e)}, {e}, {traceback.format_exc()}")
+            continue
+        if tile_csv_writer != None:
+            # the frame rate has to leave time for the tiles as well
+            write_tile_metrics(tile_csv_writer, pending_frame, metric_list, latencies, log_queue, output_format)
+        frame_rate_controller.record(latencies)
+        # metrics left out by the backpressure policy or the frame rate controller are left empty
+        stall = pending_frame.stall
+        csv_writer.writerow([format_time(pending_frame.time, output_format)] + [metrics.get(metric_type) for metric_type in metric_list] + [1 if stall.is_stalled else 0, 1 if stall.is_near_stalled else 0, stall.stall_run_length, round(pending_frame.frame_rate, 3)])
+        last_time = pending_frame.time
+        if live_metrics != None:
+            live_csv_writer.writerows([[format_time(row[0], output_format)] + row[1:] for row in live_metrics.add_frame(pending_frame.time, metrics, stall)])
 
-def pipeline_run(filename: str, frame_rate: float, log_queue, zoom_meeting_on_check: mp.Event(), metric_list = [metric_type for metric_type in MetricType]) -> None:
+def pipeline_run(filename: str, frame_rate: float, log_queue, zoom_meeting_on_check: mp.Event(), metric_list = [metric_type for metric_type in MetricType], pipeline_config: "VideoPipelineConfig" = VideoPipelineConfig()) -> None:
     """
     Param: filename is the name of the file to write the video metrics into
     Param: frame_rate is the rate at which we capture the frames
     Param: log_queue is mp.Queue that contains a string with log information
     Param: zoom_meeting_on_check determines whether Zoom Meeting is still in progress on the user's laptop
+    Param: metric_list is the metrics computed for each frame
+    Param: pipeline_config sets the capture backend, the scoring region, the scorer workers, the backpressure policy, the frame rate adaptation, the per tile metrics and the output format
+
+    Captures frames at frame_rate and hands them to a pool of scorer processes,
+    a writer thread writes their rows in capture order. With adaptive frame rate
+    on, the capture rate (recorded in the frame_rate column) and the metrics
+    computed follow the measured scoring latency. With per tile metrics on,
+    every participant's tile of the gallery is also scored on its own and
+    written to video_tiles.csv (video_tiles.bin in OutputFormat.BINARY) next to filename.
+    With live metrics on, a row of rolling statistics is written to
+    video_live.csv every interval while the call happens.
     """
     zoom_meeting_on_check.wait()
     log_queue.put(f"started {__name__}.{pipeline_run.__name__}")
-    window_num: int = get_zoom_window_id()
+    capture_backend: "CaptureBackend" = create_capture_backend(pipeline_config.capture_backend, pipeline_config.capture_source)
     
-    time_between_frame: float = 1/frame_rate
-
     count_images: int = 0
     num_image_process_print: int = 100
-    # do binary search if really necessary
+
+    frame_rate_controller = FrameRateController(
+        frame_rate, 
+        metric_list, 
+        pipeline_config.scoring_workers, 
+        pipeline_config.cpu_budget, 
+        pipeline_config.min_frame_rate)
+    frame_scorer = FrameScorer(
+        pipeline_config.scoring_workers, 
+        pipeline_config.max_pending_frames, 
+        pipeline_config.backpressure_policy)
+    pending_frames: queue.Queue = queue.Queue(maxsize=pipeline_config.max_pending_frames)
     
-    prev_array_data = np.array([0])
-    with open(filename, mode="w") as csv_file:
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(["time"] + [metric_type.value for metric_type in metric_list] + ["is_stalled"])
+    stall_detector = StallDetector(pipeline_config.detect_near_stalls)
+    scoring_region = ScoringRegion(
+        pipeline_config.scoring_mode, 
+        pipeline_config.scoring_roi, 
+        pipeline_config.scoring_max_resolution)
+    tile_segmenter: Optional["TileSegmenter"] = None
+    tile_stall_detectors: List["StallDetector"] = []
+    output_format = pipeline_config.output_format
+    tile_csv_writer: Optional["BufferedWriter"] = None
+    if pipeline_config.per_tile_metrics:
+        tile_segmenter = TileSegmenter()
+        tile_filename = os.path.join(os.path.dirname(filename), "video_tiles" + OUTPUT_EXTENSIONS[output_format])
+        tile_csv_writer = open_metrics_file(
+            tile_filename,
+            output_format,
+            [("time", "datetime64[us]"), ("tile", np.uint16), ("x", np.uint32), ("y", np.uint32), ("width", np.uint32), ("height", np.uint32)] + get_metric_columns(metric_list),
+            flush_policy=pipeline_config.flush_policy)
+
+    live_metrics: Optional["LiveVideoMetrics"] = None
+    live_csv_writer: Optional["BufferedWriter"] = None
+    if pipeline_config.rolling_window.enabled:
+        live_metrics = LiveVideoMetrics(pipeline_config.rolling_window, metric_list)
+        live_filename = os.path.join(os.path.dirname(filename), "video_live" + OUTPUT_EXTENSIONS[output_format])
+        live_csv_writer = open_metrics_file(live_filename, output_format, get_live_video_columns(metric_list), flush_policy=pipeline_config.flush_policy)
+
+    # the rows are written in batches by a background thread of the writer
+    csv_writer: "BufferedWriter" = open_metrics_file(
+        filename,
+        output_format,
+        [("time", "datetime64[us]")] + get_metric_columns(metric_list) + [("frame_rate", np.float64)],
+        {"scoring_mode": scoring_region.describe()},
+        pipeline_config.flush_policy)
+    log_queue.put(f"in {__name__}.{pipeline_run.__name__}, scoring {scoring_region.describe()}")
+    # closing writes the rows still waiting, every file is closed even if the capture fails
+    with ExitStack() as writers:
+        for writer in [tile_csv_writer, live_csv_writer, csv_writer]:
+            if writer != None:
+                writers.enter_context(writer)
+        writer_thread = threading.Thread(target=write_metrics, args=(csv_writer, pending_frames, metric_list, frame_rate_controller, log_queue, tile_csv_writer, output_format, live_metrics, live_csv_writer))
+        writer_thread.start()
+
+        next_capture_time = time.monotonic()
+        next_adjust_time = next_capture_time + 1
         while zoom_meeting_on_check.is_set(): 
             try:
+                if pipeline_config.adaptive_frame_rate and time.monotonic() >= next_adjust_time:
+                    next_adjust_time = time.monotonic() + 1
+                    for change in frame_rate_controller.update():
+                        log_queue.put(f"in {__name__}.{pipeline_run.__name__}, {change}")
+                current_frame_rate = frame_rate_controller.frame_rate
+
                 image_start_time = datetime.now()
                 # get image data ready to process
-                raw_data: Image.Image = capture_image(window_num)
-                image_data = np.asarray(raw_data)
-
-                # compute metrics
-                metrics= {metric_type: get_no_ref_score(image_data, metric_type) for metric_type in metric_list}
+                captured_frame: "CapturedFrame" = capture_backend.capture()
+                frame: "CapturedFrame" = scoring_region.crop(captured_frame)
+                gray = frame.to_gray()
+                # only fingerprints are compared, the previous frame is not kept
+                stall: "StallState" = stall_detector.update(gray)
 
-                # record metrics
-                csv_writer.writerow([image_start_time.strftime(TIME_FORMAT)] + [metrics[metric_type] for metric_type in metric_list] + [1 if np.array_equal(prev_array_data, image_data) else 0])
-
-                prev_array_data = image_data
+                # only the (downscaled) grayscale frame is sent to the scorer processes
+                num_pending = pending_frames.qsize()
+                metrics = frame_scorer.submit(scoring_region.resize(gray), frame_rate_controller.next_metrics(), num_pending)
+                if metrics != None:
+                    pending_frame = PendingFrame(image_start_time, metrics, stall, current_frame_rate)
+                    if tile_segmenter != None:
+                        if tile_segmenter.update(captured_frame):
+                            log_queue.put(f"in {__name__}.{pipeline_run.__name__}, detected {len(tile_segmenter.tiles)} tiles: {tile_segmenter.tiles}")
+                            tile_stall_detectors = [StallDetector(pipeline_config.detect_near_stalls) for _ in tile_segmenter.tiles]
+                        for index, (x, y, width, height) in enumerate(tile_segmenter.tiles):
+                            # the grayscale of the whole window is only there if the scoring region did not crop it
+                            if frame is captured_frame:
+                                tile_gray = gray[y:y + height, x:x + width]
+                            else:
+                                tile_gray = CapturedFrame(captured_frame.data[y:y + height, x:x + width], captured_frame.channel_order).to_gray()
+                            tile_stall: "StallState" = tile_stall_detectors[index].update(tile_gray)
+                            # the tiles are scored in parallel on the scorer processes, the way the frame is
+                            tile_metrics = frame_scorer.submit_tile(scoring_region.resize(tile_gray), get_tile_metric_list(frame_rate_controller.active_metrics, tile_gray))
+                            if tile_metrics != None:
+                                pending_frame.tiles.append(PendingTile(index, (x, y, width, height), tile_metrics, tile_stall))
+                    pending_frames.put(pending_frame)
 
                 count_images += 1
                 if count_images % num_image_process_print == 0:
-                    log_queue.put(f"processed {count_images} images")
-                image_finish_time = datetime.now()
+                    log_queue.put(f"processed {count_images} images, {frame_scorer.num_dropped} dropped, {frame_scorer.num_degraded} degraded, {frame_scorer.num_dropped_tiles} tiles dropped")
 
-                diff = (image_finish_time - image_start_time).total_seconds()
-                if(diff < time_between_frame):
-                    time.sleep(time_between_frame - diff)
+                # keep the capture cadence, missed captures are skipped instead of caught up
+                next_capture_time += 1/current_frame_rate
+                delay = next_capture_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_capture_time = time.monotonic()
 
             except Exception as e:
-                if get_zoom_window_id() == -1:
+                if capture_backend.is_closed():
                     # faster than checking if zoom_meeting_on_check is updated
-                    log_queue.put(f"in {__name__}.{pipeline_run.__name__}, zoom window does not exist")
+                    log_queue.put(f"in {__name__}.{pipeline_run.__name__}, capture source closed")
                     break
                 log_queue.put(f"exception in {__name__}.{pipeline_run.__name__}: {type(e)}, {e}, {traceback.format_exc()}")
+
+        pending_frames.put(SpecialQueueValues.FINISH)
+        writer_thread.join()
+    log_queue.put(f"in {__name__}.{pipeline_run.__name__}, wrote {os.path.basename(filename)}: {csv_writer.stats.describe()}")
+    if tile_csv_writer != None:
+        log_queue.put(f"in {__name__}.{pipeline_run.__name__}, wrote {os.path.basename(tile_filename)}: {tile_csv_writer.stats.describe()}")
+    if live_csv_writer != None:
+        log_queue.put(f"in {__name__}.{pipeline_run.__name__}, wrote {os.path.basename(live_filename)}: {live_csv_writer.stats.describe()}")
+    frame_scorer.shutdown()
         
     log_queue.put(f"finished {__name__}.{pipeline_run.__name__}")
\ No newline at end of file
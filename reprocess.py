@@ -0,0 +1,188 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import queue
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import fields
+from typing import Any, Dict, List, Optional, Tuple
+
+import app.network.network_run as network
+from app.common.graphing import DecimationMethod, GraphConfig, ReportFormat
+from app.network.network_metrics import FrameStatistics, NetworkMetrics
+from app.network.parsing.raw_packet import ip_address_to_bytes
+from app.network.pcap_replay import decode_pcap_file, infer_local_ip_address
+
+"""
+Reprocesses the network data of many sessions in parallel: every capture
+(.pcap, .pcapng) or network.csv (or network.bin) under a directory is a session. Each session
+gets a directory with its network.csv (for captures) and summary.json, with
+the summary of each stream (SSRC), and
+summary.csv has a row per session. Sessions whose input has not changed since
+they were processed (same SHA-256), with the same options, are skipped.
+"""
+
+CAPTURE_EXTENSIONS = (".pcap", ".pcapng", ".cap")
+NETWORK_CSV_FILENAME = "network.csv"
+NETWORK_FILENAMES = (NETWORK_CSV_FILENAME, "network.bin")
+DONE_FILENAME = "done.json"
+
+
+def find_sessions(input_directory: str) -> List[str]:
+    """
+    Returns the captures and network.csv (or network.bin) files under input_directory
+    """
+    sessions = []
+    for directory, _, filenames in os.walk(input_directory):
+        for filename in sorted(filenames):
+            if filename.endswith(CAPTURE_EXTENSIONS) or filename in NETWORK_FILENAMES:
+                sessions.append(os.path.join(directory, filename))
+    return sorted(sessions)
+
+
+def get_session_name(input_directory: str, session_path: str) -> str:
+    """
+    Returns the path of the session relative to input_directory, with its
+    filename and extension so that a.pcap, a.pcapng and a/network.csv are
+    different sessions, as a directory name
+    """
+    return os.path.relpath(session_path, input_directory).replace(os.sep, "__")
+
+
+def get_session_names(input_directory: str, session_paths: List[str]) -> List[str]:
+    """
+    Returns the name of each session, throws ValueError if two sessions have the same
+    """
+    session_names = [get_session_name(input_directory, session_path) for session_path in session_paths]
+    sessions_by_name: Dict[str, List[str]] = {}
+    for session_name, session_path in zip(session_names, session_paths):
+        sessions_by_name.setdefault(session_name, []).append(session_path)
+    collisions = [session_paths for session_paths in sessions_by_name.values() if len(session_paths) > 1]
+    if len(collisions) > 0:
+        raise ValueError(f"sessions would be written to the same directory: {collisions}")
+    return session_names
+
+
+def hash_file(filename: str, block_size: int = 1 << 20) -> str:
+    content_hash = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def write_json(filename: str, content: Dict[str, Any]) -> None:
+    # written to a temporary file first so an interrupted run never leaves half a file
+    with open(filename + ".tmp", "w") as file:
+        json.dump(content, file, indent=4)
+    os.replace(filename + ".tmp", filename)
+
+
+def process_session(session_path: str, session_directory: str, local_ip_address: Optional[str] = None, force: bool = False, graph_config: Optional["GraphConfig"] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Param: session_path is a capture, a network.csv or a network.bin
+    Param: session_directory is where the outputs of the session are written
+    Param: local_ip_address is the IP address the capture was recorded on, inferred if None
+    Param: force is whether to process the session even if it was processed before
+    Param: graph_config is how the graphs of the session are rendered, None to not render them
+
+    Returns the summary of the session and whether it was skipped
+    """
+    content_hash = hash_file(session_path)
+    # the outputs also depend on the options they were processed with
+    options = {"local_ip_address": local_ip_address, "graph_config": None if graph_config == None else repr(graph_config)}
+    done_filename = os.path.join(session_directory, DONE_FILENAME)
+    if not force and os.path.exists(done_filename):
+        with open(done_filename) as file:
+            done = json.load(file)
+        if done["content_hash"] == content_hash and done.get("options") == options:
+            return done["summary"], True
+
+    os.makedirs(session_directory, exist_ok=True)
+    summary: Dict[str, Any] = {"session": os.path.basename(session_directory), "source": session_path}
+    csv_filename = session_path
+    if session_path.endswith(CAPTURE_EXTENSIONS):
+        if local_ip_address == None:
+            local_ip_address = infer_local_ip_address([session_path])
+        columns, num_rejected = decode_pcap_file(session_path, None if local_ip_address == None else ip_address_to_bytes(local_ip_address))
+        csv_filename = os.path.join(session_directory, NETWORK_CSV_FILENAME)
+        with open(csv_filename, "w") as csv_file:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow([field.name for field in fields(NetworkMetrics)])
+            csv_writer.writerows(network.get_metric_rows(columns))
+        summary["local_ip_address"] = local_ip_address
+        summary["num_rejected_packets"] = sum(num_rejected.values())
+
+    # read_network_statistics logs its progress, which is not needed here
+    network_statistics = network.read_network_statistics(csv_filename, queue.Queue())
+    summary.update(FrameStatistics.merge(network_statistics.streams.values()).summarize())
+    summary["num_streams"] = len(network_statistics.streams)
+    # summary.csv keeps a row per session, the streams are only in summary.json
+    write_json(os.path.join(session_directory, "summary.json"), dict(summary, streams=[
+        dict(stream._asdict(), **network_statistics.streams[stream.ssrc_identifier].summarize())
+        for stream in network_statistics.summaries
+    ]))
+    if graph_config != None:
+        network.render_network_graphs(session_directory, network_statistics, graph_config)
+    write_json(done_filename, {"content_hash": content_hash, "options": options, "summary": summary})
+    return summary, False
+
+
+def write_summary(filename: str, summaries: List[Dict[str, Any]]) -> None:
+    """
+    Writes a row per session, with the columns of every summary
+    """
+    columns: List[str] = []
+    for summary in summaries:
+        columns += [column for column in summary if column not in columns]
+    with open(filename, "w") as csv_file:
+        csv_writer = csv.DictWriter(csv_file, fieldnames=columns)
+        csv_writer.writeheader()
+        csv_writer.writerows(sorted(summaries, key=lambda summary: summary["session"]))
+
+
+def run(input_directory: str, output_directory: str, num_processes: int, local_ip_address: Optional[str] = None, force: bool = False, graph_config: Optional["GraphConfig"] = None) -> None:
+    session_paths = find_sessions(input_directory)
+    print(f"found {len(session_paths)} sessions in {input_directory}")
+    os.makedirs(output_directory, exist_ok=True)
+
+    summaries: List[Dict[str, Any]] = []
+    start_time = time.monotonic()
+    with ProcessPoolExecutor(max_workers=num_processes) as executor:
+        futures = {}
+        for session_path, session_name in zip(session_paths, get_session_names(input_directory, session_paths)):
+            session_directory = os.path.join(output_directory, session_name)
+            futures[executor.submit(process_session, session_path, session_directory, local_ip_address, force, graph_config)] = session_path
+        for count, future in enumerate(as_completed(futures), start=1):
+            session_path = futures[future]
+            try:
+                summary, was_skipped = future.result()
+            except Exception as e:
+                print(f"[{count}/{len(futures)}] {session_path} failed: {type(e)}, {e}")
+                continue
+            summaries.append(summary)
+            status = "already processed" if was_skipped else f"{summary['num_packets']} packets, {summary['num_frames']} frames"
+            print(f"[{count}/{len(futures)}] {session_path}: {status} ({time.monotonic() - start_time:.1f}s elapsed)")
+
+    summary_filename = os.path.join(output_directory, "summary.csv")
+    write_summary(summary_filename, summaries)
+    print(f"wrote {summary_filename}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reprocesses the captures and network.csv files of many sessions")
+    parser.add_argument("input_directory", help="searched for .pcap, .pcapng, network.csv and network.bin files")
+    parser.add_argument("output_directory")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--local-ip-address", default=None, help="IP address the captures were recorded on, inferred per capture if left out")
+    parser.add_argument("--force", action="store_true", help="reprocess sessions that have not changed")
+    parser.add_argument("--graphs", action="store_true", help="also render the network graphs of each session")
+    parser.add_argument("--graph-decimation", choices=[method.value for method in DecimationMethod], default=DecimationMethod.MINMAX.value)
+    parser.add_argument("--graph-report", choices=[report_format.value for report_format in ReportFormat], default=None, help="also write report.html or an .svg per graph")
+    args = parser.parse_args()
+    # the sessions are already processed in parallel, the figures of a session are drawn one after the other
+    graph_config = GraphConfig(decimation=DecimationMethod(args.graph_decimation), num_processes=1, report_format=None if args.graph_report == None else ReportFormat(args.graph_report)) if args.graphs else None
+    run(args.input_directory, args.output_directory, args.processes, args.local_ip_address, args.force, graph_config)
@@ -12,12 +12,15 @@ from typing import List, Tuple
 
 import app.network.network_run as network
 import app.video.video_run as video
+from app.network.network_config import NetworkPipelineConfig
 from app.video.metrics.image_score import MetricType
-from app.common.constants import SpecialQueueValues
+from app.video.video_config import VideoPipelineConfig
+from app.common.constants import OUTPUT_EXTENSIONS, SpecialQueueValues
 
-def open_config() -> Tuple[float,str, str, List[MetricType]]:
+def open_config() -> Tuple[float,str, str, List[MetricType], VideoPipelineConfig, NetworkPipelineConfig]:
     """
-    Returns frame rate, output directory for graphs and logs, key_filepath for remote server
+    Returns frame rate, output directory for graphs and logs, key_filepath for remote server, 
+    video metrics used and the optional video and network pipeline settings
     """
     module_path = dirname(sys.argv[0])
     config = json.load(open(join(module_path, "config.json")))
@@ -26,6 +29,8 @@ def open_config() -> Tuple[float,str, str, List[MetricType]]:
     output_directory: str = config["OutputDirectory"]
     ip_address: str = config["IPAddress"]
     video_metrics_to_use: List[MetricType] = [MetricType(metric_type_str) for metric_type_str in config["VideoFrameMetricsUsed"]]
+    video_pipeline_config: VideoPipelineConfig = VideoPipelineConfig.from_config(config)
+    network_pipeline_config: NetworkPipelineConfig = NetworkPipelineConfig.from_config(config)
     # send_existing_output: bool = "SendOutputToServer" in config
 
     current_time = datetime.now().strftime("%Y-%m-%d_%H_%M")
@@ -35,7 +40,7 @@ def open_config() -> Tuple[float,str, str, List[MetricType]]:
     
     if output_directory[-1] == "/":
         output_directory = output_directory[:-1]
-    return (frame_rate, output_directory, ip_address, video_metrics_to_use)
+    return (frame_rate, output_directory, ip_address, video_metrics_to_use, video_pipeline_config, network_pipeline_config)
 
 def log_information(data_queue, filename: str, num_processes_finished: int = 1, flush_every_nth_line: int = 1):
     """
@@ -109,7 +114,7 @@ def join_processes(*processes) -> None:
 def send_files_to_web_server(website_address, local_directory, log_queue) -> None:
     log_queue.put(f"started  {__name__}.{send_files_to_web_server.__name__}")
     for filename in os.listdir(local_directory):
-        if filename[-3:] == "csv":
+        if filename.endswith(tuple(OUTPUT_EXTENSIONS.values())):
             url = website_address + "/upload"
             files = {'files': open(local_directory + "/" + filename, 'rb')}
             remote_directory = local_directory[local_directory.rindex("/")+1:]
@@ -132,13 +137,13 @@ def delete_all_files(local_directory, log_queue) -> None:
 def run_app2():
     ctx = mp.get_context("spawn")
 
-    frame_rate, output_directory, ip_address, video_metrics_to_use = open_config()
+    frame_rate, output_directory, ip_address, video_metrics_to_use, video_pipeline_config, network_pipeline_config = open_config()
     
     log_queue = mp.JoinableQueue(maxsize=30)
     event_check_zoom_meeting_open = mp.Event()
 
-    video_csv_filename = output_directory + "/video.csv"
-    network_csv_filename = output_directory + "/network.csv"
+    video_csv_filename = output_directory + "/video" + OUTPUT_EXTENSIONS[video_pipeline_config.output_format]
+    network_csv_filename = output_directory + "/network" + OUTPUT_EXTENSIONS[network_pipeline_config.output_format]
     log_filename = output_directory + "/log.txt"
 
     num_process_before_log_finished = 2 # graphing network, graphing video, sending results to server, and deleting on local
@@ -153,11 +158,11 @@ def run_app2():
     
     network_process = ctx.Process(
         target=network.pipeline_run, 
-        args=(network_csv_filename, log_queue, event_check_zoom_meeting_open,))
+        args=(network_csv_filename, log_queue, event_check_zoom_meeting_open, network_pipeline_config))
     
     video_process = ctx.Process(
         target=video.pipeline_run, 
-        args=(video_csv_filename, frame_rate, log_queue, event_check_zoom_meeting_open,video_metrics_to_use))
+        args=(video_csv_filename, frame_rate, log_queue, event_check_zoom_meeting_open,video_metrics_to_use, video_pipeline_config))
 
     start_processes(
         log_process,
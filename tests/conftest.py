@@ -0,0 +1,88 @@
+import logging
+import random
+
+import pytest
+
+from typing import List
+
+logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
+from scapy.layers.inet import IP, UDP
+from scapy.layers.l2 import Ether
+from scapy.packet import Packet, Padding, Raw
+
+from app.network.parsing.packet_constants import RTPWrapper, ZoomMediaWrapper
+from app.network.parsing.raw_packet import ZOOM_SERVER_PORT, RTP_VERSION_2_FIRST_BYTE
+
+LOCAL_IP_ADDRESS = "10.0.0.2"
+START_TIME = 1700000000.123456
+
+MEDIA_TYPES = [media_type.value for media_type in ZoomMediaWrapper if media_type != ZoomMediaWrapper.INVALID]
+PAYLOAD_TYPES = [payload_type.value for payload_type in RTPWrapper]
+
+
+def build_zoom_load(rng: random.Random, ssrc_identifier: int, frame_sequence: int, is_server: bool) -> bytes:
+    """
+    Returns the UDP load of a valid Zoom media packet
+    """
+    offset = 8 if is_server else 0
+    load = bytearray(rng.getrandbits(8) for _ in range(offset + 24 + 12 + rng.randrange(0, 200)))
+    load[offset] = rng.choice(MEDIA_TYPES)
+    load[offset + 21:offset + 23] = frame_sequence.to_bytes(2, "big")
+    load[offset + 23] = rng.randrange(1, 20)
+    load[offset + 24] = RTP_VERSION_2_FIRST_BYTE
+    load[offset + 25] = rng.choice(PAYLOAD_TYPES) | rng.choice([0, 128])
+    load[offset + 32:offset + 36] = ssrc_identifier.to_bytes(4, "big")
+    return bytes(load)
+
+
+def build_random_load(rng: random.Random) -> bytes:
+    """
+    Returns a UDP load with the bytes the parsers look at often, but not always, valid
+    """
+    offset = 8 if rng.random() < 0.5 else 0
+    load = bytearray(rng.getrandbits(8) for _ in range(rng.choice([0, 5, 20, 24, 28, 30, 40, 200])))
+    if len(load) > offset and rng.random() < 0.8:
+        load[offset] = rng.choice(MEDIA_TYPES + [0])
+    for index in (offset + 24, offset + 26, offset + 28):
+        if index < len(load) and rng.random() < 0.4:
+            load[index] = RTP_VERSION_2_FIRST_BYTE
+    for index in (offset + 25, offset + 27, offset + 29, offset + 33):
+        if index < len(load) and rng.random() < 0.5:
+            load[index] = rng.choice(PAYLOAD_TYPES + [PAYLOAD_TYPES[0] | 128, 0])
+    return bytes(load)
+
+
+def build_zoom_frames(num_packets: int = 2000, seed: int = 1) -> List[Packet]:
+    """
+    Returns captured Ethernet frames: Zoom media packets of a few streams to
+    LOCAL_IP_ADDRESS, mixed with malformed loads, padded frames and packets to
+    another address, with packet.time set like a capture
+    """
+    rng = random.Random(seed)
+    frames: List[Packet] = []
+    for index in range(num_packets):
+        is_server = rng.random() < 0.5
+        if rng.random() < 0.6:
+            load = build_zoom_load(rng, rng.choice([11, 22, 33]), (65530 + index//3) % 65536, is_server)
+        else:
+            load = build_random_load(rng)
+            is_server = len(load) > 0 and rng.random() < 0.5
+        destination = LOCAL_IP_ADDRESS if rng.random() < 0.9 else "10.0.0.3"
+        frame = (Ether(src="00:11:22:33:44:55", dst="66:77:88:99:aa:bb")
+                 / IP(src="5.6.7.8", dst=destination)
+                 / UDP(sport=ZOOM_SERVER_PORT if is_server else rng.choice([3478, 50000]), dport=5000)
+                 / Raw(load))
+        if rng.random() < 0.2:
+            # Ethernet padding is not part of the UDP load
+            frame = frame / Padding(b"\0" * 10)
+        frame = Ether(bytes(frame))
+        frame.time = START_TIME + index * 0.001
+        # ZoomPacket.parse reads the time of the IP layer
+        frame[IP].time = frame.time
+        frames.append(frame)
+    return frames
+
+
+@pytest.fixture(scope="session")
+def zoom_frames() -> List[Packet]:
+    return build_zoom_frames()
@@ -0,0 +1,107 @@
+import csv
+import io
+import os
+import threading
+import time
+
+import pytest
+
+import app.network.parsing.zoom_packet as zoom_packet
+
+from app.common.buffered_writer import BufferedWriter, FlushPolicy
+from app.network.network_metrics import NetworkMetrics
+from app.network.network_run import parse_zoom_packet, write_metrics
+from app.network.packet_store import PacketStore
+from app.network.parsing.exceptions import PacketException
+from app.network.parsing.packet_constants import RTPWrapper
+from app.network.parsing.raw_packet import ip_address_to_bytes
+from app.network.parsing.zoom_packet import ZoomPacket
+
+from conftest import LOCAL_IP_ADDRESS
+
+
+def read_rows(filename: str) -> list:
+    with open(filename) as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_close_writes_the_last_batch(tmp_path):
+    filename = os.path.join(tmp_path, "rows.csv")
+    csv_file = open(filename, "w")
+    # nothing is written before close
+    buffered_writer = BufferedWriter(csv_file, csv.writer(csv_file), FlushPolicy(max_rows=10**6, max_seconds=3600))
+    for index in range(5000):
+        buffered_writer.writerow([index, index * 2])
+    assert os.path.getsize(filename) == 0
+    buffered_writer.close()
+    assert read_rows(filename) == [[str(index), str(index * 2)] for index in range(5000)]
+    assert buffered_writer.stats.num_rows == 5000
+    assert buffered_writer.stats.num_batches == 1
+    assert buffered_writer.stats.bytes_written == os.path.getsize(filename)
+
+
+def test_rows_are_written_after_max_seconds(tmp_path):
+    filename = os.path.join(tmp_path, "rows.csv")
+    csv_file = open(filename, "w")
+    with BufferedWriter(csv_file, csv.writer(csv_file), FlushPolicy(max_rows=10**6, max_seconds=0.05)) as buffered_writer:
+        buffered_writer.writerow([1, 2])
+        deadline = time.monotonic() + 5
+        while os.path.getsize(filename) == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert read_rows(filename) == [["1", "2"]]
+
+
+def test_close_raises_the_write_error():
+    class FailingWriter:
+        def writerows(self, rows) -> None:
+            raise OSError("disk full")
+
+    buffered_writer = BufferedWriter(io.StringIO(), FailingWriter(), FlushPolicy(max_rows=1))
+    buffered_writer.writerow([1])
+    with pytest.raises(OSError):
+        buffered_writer.close()
+
+
+def write_legacy_network_csv(filename: str, frames: list) -> None:
+    # network.csv as it was written a row at a time from ZoomPacket
+    with open(filename, "w") as csv_file:
+        csv_writer = csv.writer(csv_file)
+        has_header = False
+        for frame in frames:
+            try:
+                packet = ZoomPacket.parse(frame)
+            except PacketException:
+                continue
+            metrics = NetworkMetrics(
+                frame_sequence_number=packet.frame_sequence,
+                packet_time=packet.time.get_datetime(),
+                packet_size=packet.size,
+                expected_number_of_packets=packet.number_of_packets_per_frame,
+                is_fec=packet.video_packet_type == RTPWrapper.FEC,
+                ssrc_identifier=packet.ssrc_identifier,
+            )
+            if not has_header:
+                has_header = True
+                csv_writer.writerow(metrics.__dict__.keys())
+            csv_writer.writerow(metrics.__dict__.values())
+
+
+def test_network_csv_matches_the_rows_written_one_at_a_time(zoom_frames, tmp_path, monkeypatch):
+    monkeypatch.setattr(zoom_packet, "get_local_ip_address", lambda: LOCAL_IP_ADDRESS)
+    legacy_filename = os.path.join(tmp_path, "legacy.csv")
+    write_legacy_network_csv(legacy_filename, zoom_frames)
+
+    local_ip_address = ip_address_to_bytes(LOCAL_IP_ADDRESS)
+    packet_store = PacketStore()
+    for frame in zoom_frames:
+        try:
+            packet_store.append(parse_zoom_packet(frame, local_ip_address))
+        except PacketException:
+            continue
+    filename = os.path.join(tmp_path, "network.csv")
+    # the call is over, the packets are written in chunks and batches of a few hundred
+    writer_stats = write_metrics(filename, packet_store, threading.Event(), chunk_size=100, flush_policy=FlushPolicy(max_rows=300))
+
+    with open(legacy_filename, "rb") as legacy_file, open(filename, "rb") as file:
+        assert file.read() == legacy_file.read()
+    assert writer_stats.num_rows == len(read_rows(filename))
@@ -0,0 +1,88 @@
+import csv
+import os
+import threading
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.common.buffered_writer import FlushPolicy
+from app.common.columnar import ColumnarWriter, export_csv, iter_chunks, read_columnar
+from app.common.constants import OutputFormat
+from app.network.network_run import read_packet_columns, write_metrics
+from app.network.packet_store import PACKET_COLUMN_DTYPES, PacketColumns, PacketStore
+
+COLUMNS = [("time", "datetime64[us]"), ("count", np.uint16), ("score", np.float64), ("is_fec", np.bool_)]
+
+
+def build_rows(num_rows: int) -> list:
+    start_time = datetime(2023, 11, 14, 22, 13, 20, 123456)
+    return [[start_time + timedelta(microseconds=1001*index), index, None if index % 7 == 0 else index / 3, index % 2 == 0] for index in range(num_rows)]
+
+
+def test_rows_and_columns_round_trip(tmp_path):
+    filename = os.path.join(tmp_path, "video.bin")
+    rows = build_rows(25)
+    extra_columns = {"time": np.array(["2023-11-15T00:00:00"], dtype="datetime64[us]"), "count": np.array([65535]), "score": np.array([1.5]), "is_fec": np.array([True])}
+    with ColumnarWriter(filename, COLUMNS, metadata={"scoring": "full frame"}, chunk_size=10) as columnar_writer:
+        columnar_writer.writerows(rows[:15])
+        # written after the 5 rows still waiting
+        columnar_writer.write_columns(extra_columns)
+        columnar_writer.writerows(rows[15:])
+
+    columnar_file = read_columnar(filename)
+    assert columnar_file.metadata == {"scoring": "full frame"}
+    assert list(columnar_file.columns) == [name for name, _ in COLUMNS]
+    assert [len(chunk["time"]) for chunk in iter_chunks(filename)] == [10, 5, 1, 10]
+    expected_rows = rows[:15] + [[datetime(2023, 11, 15), 65535, 1.5, True]] + rows[15:]
+    assert columnar_file.columns["time"].tolist() == [row[0] for row in expected_rows]
+    assert columnar_file.columns["count"].tolist() == [row[1] for row in expected_rows]
+    np.testing.assert_array_equal(columnar_file.columns["score"], np.array([row[2] for row in expected_rows], dtype=np.float64))
+    assert columnar_file.columns["is_fec"].tolist() == [row[3] for row in expected_rows]
+
+
+def test_file_cut_short_is_read_to_its_last_whole_chunk(tmp_path):
+    filename = os.path.join(tmp_path, "video.bin")
+    with ColumnarWriter(filename, COLUMNS, chunk_size=10) as columnar_writer:
+        columnar_writer.writerows(build_rows(20))
+    with open(filename, "r+b") as file:
+        file.truncate(os.path.getsize(filename) - 3)
+    assert read_columnar(filename).columns["count"].tolist() == list(range(10))
+
+
+def test_export_csv(tmp_path):
+    filename = os.path.join(tmp_path, "video.bin")
+    with ColumnarWriter(filename, COLUMNS, metadata={"scoring": "full frame"}) as columnar_writer:
+        columnar_writer.writerows(build_rows(8))
+    csv_filename = os.path.join(tmp_path, "video.csv")
+    export_csv(filename, csv_filename)
+    with open(csv_filename) as csv_file:
+        rows = list(csv.reader(csv_file))
+    assert rows[0] == ["time", "count", "score", "is_fec"]
+    assert rows[1] == ["2023-11-14 22:13:20.123456", "0", "", "True"]
+    assert rows[2] == ["2023-11-14 22:13:20.124457", "1", str(1 / 3), "False"]
+    assert len(rows) == 9
+
+
+def test_network_packets_round_trip(tmp_path):
+    rng = np.random.default_rng(3)
+    num_packets = 5000
+    columns = PacketColumns(
+        timestamp=1700000000.123456 + np.cumsum(rng.random(num_packets) / 1000),
+        frame_sequence=rng.integers(0, 65536, num_packets),
+        packet_size=rng.integers(0, 1500, num_packets),
+        expected_number_of_packets=rng.integers(1, 20, num_packets),
+        is_fec=rng.random(num_packets) < 0.2,
+        ssrc_identifier=rng.integers(0, 2**32, num_packets),
+        media_type=rng.choice([13, 15, 16], num_packets),
+    )
+    packet_store = PacketStore()
+    packet_store.extend_columns(columns)
+    # the call is over, every packet is written at once
+    filename = os.path.join(tmp_path, "network.bin")
+    write_metrics(filename, packet_store, threading.Event(), output_format=OutputFormat.BINARY, flush_policy=FlushPolicy(max_rows=1000))
+
+    read_columns = read_packet_columns(filename)
+    for name, dtype in PACKET_COLUMN_DTYPES.items():
+        assert getattr(read_columns, name).dtype == dtype
+        np.testing.assert_array_equal(getattr(read_columns, name), getattr(columns, name))
@@ -0,0 +1,25 @@
+from app.network.frame_aggregator import FrameAggregator
+
+
+def test_packet_of_expired_frame_is_late():
+    frame_aggregator = FrameAggregator()
+    finished = []
+    frame_aggregator.add_packet(0.0, 1, 10, 100, 2, False, finished)
+    finished += frame_aggregator.expire(2.0)
+    frame_aggregator.add_packet(2.0, 1, 10, 100, 2, False, finished)
+    finished += frame_aggregator.flush()
+    assert [frame.frame_sequence for frame in finished] == [10]
+    summary = frame_aggregator.summarize()[0]
+    assert (summary.num_frames, summary.num_missing_packets, summary.num_late_packets) == (1, 1, 1)
+
+
+def test_finished_sequences_stay_within_the_reorder_window():
+    frame_aggregator = FrameAggregator(reorder_window=4)
+    finished = []
+    for frame_sequence in [65534, 65535, 0, 1, 2, 3]:
+        frame_aggregator.add_packet(0.0, 1, frame_sequence, 100, 1, False, finished)
+    frame_aggregator.add_packet(0.1, 1, 65535, 100, 1, False, finished)
+    finished += frame_aggregator.flush()
+    assert len(finished) == 6
+    assert frame_aggregator.num_late_packets == 1
+    assert frame_aggregator.streams[1].finished_sequences == {0, 1, 2, 3}
@@ -0,0 +1,61 @@
+from app.video.frame_rate_controller import FrameRateController
+from app.video.metrics.image_score import MetricType
+
+
+def drop_piqe(probe_interval: int = 10) -> "FrameRateController":
+    controller = FrameRateController(10, [MetricType.PIQE, MetricType.LAPLACIAN], 1, 0.8, 1.0, probe_interval=probe_interval)
+    controller.record({MetricType.PIQE: 2.0, MetricType.LAPLACIAN: 0.01})
+    controller.update()
+    assert controller.update()[0].startswith("dropped PIQE")
+    assert controller.active_metrics == [MetricType.LAPLACIAN]
+    return controller
+
+
+def get_probe_updates(controller: "FrameRateController", num_updates: int) -> list:
+    # the updates after which the next frame probes PIQE
+    probe_updates = []
+    for update in range(num_updates):
+        controller.update()
+        if MetricType.PIQE in controller.next_metrics():
+            probe_updates.append(update)
+    return probe_updates
+
+
+def test_unmeasured_metrics_are_not_dropped():
+    controller = FrameRateController(10, [MetricType.LAPLACIAN, MetricType.PIQE, MetricType.NIQE], 1, 0.8, 1.0)
+    controller.record({MetricType.LAPLACIAN: 0.9})
+    assert controller.update() == ["frame rate lowered to 1.00 fps, scoring takes 0.900s per frame"]
+    assert controller.update() == ["dropped LAPLACIAN at 1.00 fps, it takes 0.900s per frame"]
+    assert controller.active_metrics == [MetricType.PIQE, MetricType.NIQE]
+    controller.update()
+
+
+def test_dropped_metric_is_probed_with_backoff():
+    controller = drop_piqe()
+    # a dropped metric is never restored on the latency measured before the drop
+    assert get_probe_updates(controller, 100) == [9, 29, 69]
+    assert controller.active_metrics == [MetricType.LAPLACIAN]
+    assert controller.next_metrics() == [MetricType.LAPLACIAN]
+
+
+def test_probe_that_fits_restores():
+    controller = drop_piqe()
+    assert get_probe_updates(controller, 10) == [9]
+    # the frame probing PIQE is scored
+    controller.record({MetricType.PIQE: 0.3, MetricType.LAPLACIAN: 0.01})
+    assert controller.update()[0].startswith("restored PIQE")
+    assert controller.active_metrics == [MetricType.PIQE, MetricType.LAPLACIAN]
+
+    # dropped again once it is slow
+    for _ in range(10):
+        controller.record({MetricType.PIQE: 2.0, MetricType.LAPLACIAN: 0.01})
+        controller.update()
+    assert controller.active_metrics == [MetricType.LAPLACIAN]
+
+
+def test_probe_that_does_not_fit_waits_longer():
+    controller = drop_piqe()
+    assert get_probe_updates(controller, 10) == [9]
+    controller.record({MetricType.PIQE: 2.0, MetricType.LAPLACIAN: 0.01})
+    assert get_probe_updates(controller, 30) == [19]
+    assert controller.active_metrics == [MetricType.LAPLACIAN]
@@ -0,0 +1,74 @@
+import numpy as np
+
+from app.network.frame_aggregator import FrameAggregator
+from app.network.network_statistics import compute_network_statistics
+from app.network.packet_store import PacketColumns
+
+
+def build_call(num_frames: int = 2300, packets_per_frame: int = 3, seed: int = 5) -> "PacketColumns":
+    """
+    Returns the packets of 3 streams in arrival order, their frame sequences
+    wrapping around, with frames skipped and packets lost
+    """
+    rng = np.random.default_rng(seed)
+    streams = []
+    for stream_index, ssrc_identifier in enumerate([11, 22, 33]):
+        frames = np.arange(num_frames)
+        if stream_index == 1:
+            frames = frames[frames % 97 != 5]
+        sequences = np.repeat((65000 + 300*stream_index + frames) % 65536, packets_per_frame)
+        packet_index = np.tile(np.arange(packets_per_frame), len(frames))
+        timestamps = (1700000000.123456 + 0.01*stream_index + np.repeat(frames * 0.033, packets_per_frame)
+                      + packet_index * 0.001 + rng.random(len(sequences)) * 0.0005)
+        is_received = rng.random(len(sequences)) > (0.05 if stream_index == 2 else 0)
+        streams.append((timestamps[is_received], sequences[is_received], packet_index[is_received], np.full(is_received.sum(), ssrc_identifier)))
+
+    timestamps = np.concatenate([stream[0] for stream in streams])
+    order = np.argsort(timestamps, kind="stable")
+    packet_index = np.concatenate([stream[2] for stream in streams])[order]
+    ssrc_identifier = np.concatenate([stream[3] for stream in streams])[order]
+    return PacketColumns(
+        timestamp=timestamps[order],
+        frame_sequence=np.concatenate([stream[1] for stream in streams])[order].astype(np.uint16),
+        packet_size=(900 + 37*packet_index).astype(np.uint32),
+        expected_number_of_packets=np.full(len(order), packets_per_frame, dtype=np.uint8),
+        is_fec=(packet_index == packets_per_frame - 1) & (ssrc_identifier != 11),
+        ssrc_identifier=ssrc_identifier.astype(np.uint32),
+        media_type=np.full(len(order), 16, dtype=np.uint8),
+    )
+
+
+def test_statistics_match_frame_aggregator():
+    columns = build_call()
+    assert len(columns.timestamp) > 19000
+    assert columns.frame_sequence.min() == 0 and columns.frame_sequence.max() == 65535
+
+    frame_aggregator = FrameAggregator()
+    frames = []
+    for start in range(0, len(columns.timestamp), 1024):
+        frames += frame_aggregator.add_columns(PacketColumns(*[values[start:start + 1024] for values in columns]))
+    frames += frame_aggregator.flush()
+    network_statistics = compute_network_statistics(columns)
+
+    assert sorted(network_statistics.summaries) == sorted(frame_aggregator.summarize())
+    summaries = {summary.ssrc_identifier: summary for summary in network_statistics.summaries}
+    assert summaries[22].num_missing_frames > 0
+    assert summaries[33].num_missing_packets > 0
+    assert summaries[11].num_fec_packets == 0
+
+    # the frame sequences of FrameColumns do not wrap around
+    sequences = np.sort(network_statistics.frames.frame_sequence[network_statistics.frames.ssrc_identifier == 11])
+    assert sequences[0] % 65536 == 65000
+    np.testing.assert_array_equal(sequences, sequences[0] + np.arange(2300))
+
+    vectorized_frames = network_statistics.frames
+    assert sorted(zip(
+        vectorized_frames.ssrc_identifier.tolist(),
+        vectorized_frames.first_time.tolist(),
+        vectorized_frames.last_time.tolist(),
+        vectorized_frames.num_packets.tolist(),
+        vectorized_frames.expected_number_of_packets.tolist(),
+        vectorized_frames.num_fec_packets.tolist(),
+        vectorized_frames.num_bytes.tolist(),
+    )) == sorted((frame.ssrc_identifier, frame.first_time, frame.last_time, frame.num_packets,
+                  frame.expected_number_of_packets, frame.num_fec_packets, frame.num_bytes) for frame in frames)
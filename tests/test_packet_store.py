@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.network.packet_store import PACKET_COLUMN_DTYPES, PacketColumns, PacketStore, concatenate_packet_columns
+
+
+def build_columns(start: int, num_rows: int) -> "PacketColumns":
+    # packets numbered from start, so their order can be checked
+    numbers = np.arange(start, start + num_rows)
+    return PacketColumns(**{name: numbers.astype(dtype) for name, dtype in PACKET_COLUMN_DTYPES.items()})
+
+
+def test_drain_wraps_around_in_order():
+    packet_store = PacketStore(initial_capacity=8)
+    packet_store.extend_columns(build_columns(0, 6))
+    assert list(packet_store.drain(4).timestamp) == [0, 1, 2, 3]
+    # written across the end of the columns, without growing them
+    packet_store.extend_columns(build_columns(6, 5))
+    assert packet_store.capacity == 8
+    chunk = packet_store.drain()
+    assert list(chunk.timestamp) == list(range(4, 11))
+    assert list(chunk.frame_sequence) == list(range(4, 11))
+    assert len(packet_store) == 0
+
+
+def test_capacity_follows_the_packets_waiting():
+    packet_store = PacketStore(initial_capacity=8)
+    packet_store.extend_columns(build_columns(0, 3))
+    packet_store.drain(2)
+    # grows with the wrapped rows kept in order
+    packet_store.extend_columns(build_columns(3, 100))
+    assert packet_store.capacity == 128
+
+    chunks = []
+    while len(packet_store) > 0:
+        chunks.append(packet_store.drain(10))
+    assert packet_store.capacity == 8
+    assert list(concatenate_packet_columns(chunks).timestamp) == list(range(2, 103))
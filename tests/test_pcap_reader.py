@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pytest
+
+from scapy.utils import PcapNgWriter, PcapReader, PcapWriter
+
+from app.network.parsing.raw_packet import ip_address_to_bytes
+from app.network.pcap_reader import MmapPcapReader
+from app.network.pcap_replay import decode_pcap_file
+
+from conftest import LOCAL_IP_ADDRESS
+
+
+def write_capture(frames: list, filename: str) -> None:
+    if filename.endswith(".pcapng"):
+        writer = PcapNgWriter(filename)
+    else:
+        writer = PcapWriter(filename, nano=filename.endswith(".ns.pcap"))
+    for frame in frames:
+        writer.write(frame)
+    writer.close()
+
+
+@pytest.fixture(scope="module", params=["capture.pcap", "capture.ns.pcap", "capture.pcapng"])
+def capture_filename(request, zoom_frames, tmp_path_factory) -> str:
+    filename = os.path.join(tmp_path_factory.mktemp("captures"), request.param)
+    write_capture(zoom_frames, filename)
+    return filename
+
+
+def test_reader_matches_scapy(capture_filename):
+    with PcapReader(capture_filename) as scapy_reader:
+        expected = [(float(packet.time), bytes(packet.original)) for packet in scapy_reader]
+    with MmapPcapReader(capture_filename) as reader:
+        records = [(record.timestamp, bytes(record.data)) for record in reader]
+        chunk_records = [(record.timestamp, bytes(record.data)) for start, end in reader.split(3) for record in reader.records(start, end)]
+    assert len(expected) == 2000
+    assert records == expected
+    assert chunk_records == expected
+
+
+def test_parallel_decode_matches_serial(capture_filename):
+    local_ip_bytes = ip_address_to_bytes(LOCAL_IP_ADDRESS)
+    columns, num_rejected = decode_pcap_file(capture_filename, local_ip_bytes)
+    parallel_columns, parallel_num_rejected = decode_pcap_file(capture_filename, local_ip_bytes, num_processes=3)
+    assert len(columns.timestamp) > 0
+    for values, parallel_values in zip(columns, parallel_columns):
+        np.testing.assert_array_equal(values, parallel_values)
+    assert num_rejected == parallel_num_rejected
@@ -0,0 +1,35 @@
+import app.network.parsing.zoom_packet as zoom_packet
+
+from conftest import LOCAL_IP_ADDRESS
+from app.network.parsing.exceptions import PacketException
+from app.network.parsing.raw_packet import ip_address_to_bytes, parse_raw_packet
+from app.network.parsing.zoom_packet import ZoomPacket
+
+
+def parse_zoom_packet(frame) -> tuple:
+    # the fields of ZoomPacketRecord, or the exception code
+    try:
+        packet = ZoomPacket.parse(frame)
+    except PacketException as e:
+        return (e.code,)
+    return (float(frame.time), packet.src_port, packet.frame_sequence, packet.number_of_packets_per_frame,
+            packet.media_type.value, packet.video_packet_type.value, packet.ssrc_identifier, packet.size)
+
+
+def parse_raw(frame, local_ip_address: bytes) -> tuple:
+    try:
+        return tuple(parse_raw_packet(frame.original, float(frame.time), local_ip_address))
+    except PacketException as e:
+        return (e.code,)
+
+
+def test_raw_parser_matches_zoom_packet_parse(zoom_frames, monkeypatch):
+    monkeypatch.setattr(zoom_packet, "get_local_ip_address", lambda: LOCAL_IP_ADDRESS)
+    local_ip_address = ip_address_to_bytes(LOCAL_IP_ADDRESS)
+    results = [parse_zoom_packet(frame) for frame in zoom_frames]
+    assert [parse_raw(frame, local_ip_address) for frame in zoom_frames] == results
+
+    # both the packets parsed and the exception codes are compared
+    codes = set(result[0] for result in results if len(result) == 1)
+    assert len(codes) >= 3
+    assert sum(len(result) > 1 for result in results) > len(zoom_frames) // 2
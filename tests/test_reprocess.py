@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from scapy.utils import wrpcap
+
+from reprocess import get_session_name, get_session_names, process_session
+
+from conftest import LOCAL_IP_ADDRESS
+
+
+def test_session_names_keep_the_filename():
+    assert get_session_names("in", ["in/a/call.pcap", "in/a/call.pcapng", "in/sess.pcap", "in/sess/network.csv"]) == [
+        "a__call.pcap", "a__call.pcapng", "sess.pcap", "sess__network.csv",
+    ]
+    assert get_session_name("in", "in/network.bin") == "network.bin"
+
+
+def test_session_names_collide():
+    with pytest.raises(ValueError):
+        get_session_names("in", ["in/a/b.pcap", "in/a__b.pcap"])
+
+
+def test_session_is_reprocessed_with_other_options(zoom_frames, tmp_path):
+    pcap_filename = os.path.join(tmp_path, "call.pcap")
+    wrpcap(pcap_filename, zoom_frames)
+    session_directory = os.path.join(tmp_path, "out", "call.pcap")
+
+    summary, was_skipped = process_session(pcap_filename, session_directory, LOCAL_IP_ADDRESS)
+    assert not was_skipped
+    assert process_session(pcap_filename, session_directory, LOCAL_IP_ADDRESS) == (summary, True)
+
+    other_summary, was_skipped = process_session(pcap_filename, session_directory, "10.0.0.3")
+    assert not was_skipped
+    assert other_summary["local_ip_address"] == "10.0.0.3"
+    assert other_summary["num_packets"] < summary["num_packets"]
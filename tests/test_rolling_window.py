@@ -0,0 +1,74 @@
+import numpy as np
+
+from datetime import datetime
+
+from app.common.rolling_window import IntervalClock, RollingWindow, RollingWindowConfig
+from app.network.live_metrics import LiveNetworkMetrics
+from app.network.packet_store import PacketColumns
+from app.video.live_metrics import LiveVideoMetrics
+from app.video.metrics.image_score import MetricType
+from app.video.stall_detection import StallState
+
+START_TIME = 1_700_000_000.0
+
+
+def get_packets(num_packets: int, packets_per_second: float) -> "PacketColumns":
+    # a stream of frames of 2 packets of 1000 bytes
+    return PacketColumns(
+        timestamp=START_TIME + np.arange(num_packets)/packets_per_second,
+        frame_sequence=(np.arange(num_packets)//2 % 65536).astype(np.uint16),
+        packet_size=np.full(num_packets, 1000, dtype=np.uint32),
+        expected_number_of_packets=np.full(num_packets, 2, dtype=np.uint16),
+        is_fec=np.zeros(num_packets, dtype=np.bool_),
+        ssrc_identifier=np.full(num_packets, 7, dtype=np.uint32),
+        media_type=np.zeros(num_packets, dtype=np.uint8),
+    )
+
+
+def test_add_many_covers_the_first_chunk():
+    window = RollingWindow(["n"], 10)
+    window.add_many(START_TIME + np.arange(500)/100, np.ones((500, 1)))
+    assert window.totals == {"n": 500}
+    assert abs(window.covered_seconds - 4.99) < 1e-6
+
+
+def test_window_drops_old_values():
+    window = RollingWindow(["n"], 10)
+    for second in range(30):
+        window.add(START_TIME + second, [1.0])
+    assert window.totals == {"n": 10}
+    # to within a slot of window_seconds/100
+    assert abs(window.covered_seconds - 9.9) < 1e-6
+
+
+def test_interval_clock():
+    clock = IntervalClock(1.0)
+    assert clock.due(10.5) == []
+    assert clock.due(13.2) == [11.0, 12.0, 13.0]
+
+
+def test_packet_rate_from_the_first_chunk():
+    live_metrics = LiveNetworkMetrics(RollingWindowConfig(enabled=True, window_seconds=10.0, interval_seconds=1.0))
+    packets = get_packets(3000, 100)
+    rows = []
+    for start in range(0, 3000, 1024):
+        rows += live_metrics.add_columns(PacketColumns(*[values[start:start + 1024] for values in packets]))
+    assert len(rows) == 29
+    for row in rows:
+        assert abs(row[3] - 100) < 2
+        assert abs(row[4] - 800000) < 16000
+
+
+def test_video_flush_writes_the_last_frames():
+    live_metrics = LiveVideoMetrics(RollingWindowConfig(enabled=True, window_seconds=10.0, interval_seconds=1.0), [MetricType.LAPLACIAN])
+    assert live_metrics.flush(datetime.fromtimestamp(START_TIME)) == []
+    rows = []
+    for index in range(26):
+        rows += live_metrics.add_frame(datetime.fromtimestamp(START_TIME + index/10), {MetricType.LAPLACIAN: float(index)}, StallState(False, False, 0))
+    assert [row[0].timestamp() for row in rows] == [START_TIME + 1, START_TIME + 2]
+
+    # the frames after 2 seconds are only in the last row
+    last_rows = live_metrics.flush(datetime.fromtimestamp(START_TIME + 2.5))
+    assert [row[0].timestamp() for row in last_rows] == [START_TIME + 2.5]
+    assert abs(last_rows[0][2] - 10) < 0.5
+    assert last_rows[0][3] == 12.5
@@ -0,0 +1,73 @@
+import os
+import shutil
+
+import pytest
+
+from scapy.utils import wrpcap
+
+from app.network.zoom_filter import build_fallback_filter, build_zoom_filter, check_filter, get_sniff_filter
+
+from conftest import LOCAL_IP_ADDRESS
+
+# Ethernet link type, so the filter compiles without a capture interface
+DLT_EN10MB = 1
+
+SERVER_MEDIA_TYPE = "(udp[16] == 16 or udp[16] == 15 or udp[16] == 13 or udp[16] == 33 or udp[16] == 21)"
+P2P_MEDIA_TYPE = "(udp[8] == 16 or udp[8] == 15 or udp[8] == 13 or udp[8] == 33 or udp[8] == 21)"
+
+
+def has_libpcap() -> bool:
+    from scapy.arch.common import compile_filter
+    try:
+        compile_filter("udp", linktype=DLT_EN10MB)
+        return True
+    except ImportError:
+        return False
+
+
+def test_default_ports():
+    assert build_zoom_filter(LOCAL_IP_ADDRESS) == (
+        f"udp and dst host {LOCAL_IP_ADDRESS} and "
+        f"((udp src port 8801 and {SERVER_MEDIA_TYPE}) or (not udp src port 8801 and {P2P_MEDIA_TYPE}))"
+    )
+
+
+def test_p2p_ports():
+    assert build_zoom_filter(LOCAL_IP_ADDRESS, [3478, 3479]) == (
+        f"udp and dst host {LOCAL_IP_ADDRESS} and "
+        f"((udp src port 8801 and {SERVER_MEDIA_TYPE}) or ((udp src port 3478 or udp src port 3479) and {P2P_MEDIA_TYPE}))"
+    )
+    assert build_zoom_filter(LOCAL_IP_ADDRESS, []) == f"udp and dst host {LOCAL_IP_ADDRESS} and (udp src port 8801 and {SERVER_MEDIA_TYPE})"
+
+
+def test_without_media_type():
+    assert build_zoom_filter(LOCAL_IP_ADDRESS, check_media_type=False) == (
+        f"udp and dst host {LOCAL_IP_ADDRESS} and ((udp src port 8801) or (not udp src port 8801))"
+    )
+
+
+def test_falls_back_when_the_filter_does_not_compile(monkeypatch):
+    def compile_filter(bpf_filter, iface=None):
+        raise ImportError("libpcap is not available")
+    monkeypatch.setattr("app.network.zoom_filter.compile_filter", compile_filter)
+    bpf_filter, error = get_sniff_filter(LOCAL_IP_ADDRESS)
+    assert bpf_filter == build_fallback_filter(LOCAL_IP_ADDRESS) == f"udp and dst host {LOCAL_IP_ADDRESS}"
+    assert "libpcap" in error
+
+
+@pytest.mark.skipif(not has_libpcap(), reason="libpcap is not installed")
+def test_filters_compile():
+    from scapy.arch.common import compile_filter
+    for p2p_ports in (None, [3478, 3479], []):
+        for check_media_type in (True, False):
+            compile_filter(build_zoom_filter(LOCAL_IP_ADDRESS, p2p_ports, check_media_type), linktype=DLT_EN10MB)
+
+
+@pytest.mark.skipif(shutil.which("tcpdump") == None, reason="tcpdump is needed to filter a capture")
+def test_filter_keeps_every_zoom_packet(zoom_frames, tmp_path):
+    pcap_filename = os.path.join(tmp_path, "zoom.pcap")
+    wrpcap(pcap_filename, zoom_frames)
+    counts = check_filter(pcap_filename, build_zoom_filter(LOCAL_IP_ADDRESS), LOCAL_IP_ADDRESS)
+    assert counts["zoom_packets"] > 0
+    assert counts["missed_zoom_packets"] == 0
+    assert counts["matched_packets"] < counts["packets"]